@@ -0,0 +1,295 @@
+"""
+Walk-forward (rolling-origin) backtesting of the emission forecasters.
+
+    python backtest.py --forecasters naive drift linear lstm-tflite --horizons 5 --workers 8
+
+Every country in `gdp_co2_by_country_v2.csv` is evaluated independently in a
+process pool: at each forecast origin the forecaster only sees the history
+before that year, forecasts `--horizons` years ahead, and is scored against the
+actual CO2 values. Results (MAE / RMSE / MAPE per horizon, plus fit and
+forecast latency) are written as JSON so runs can be compared over time.
+"""
+import os
+import json
+import time
+import logging
+import argparse
+import importlib
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger('CarbonTrack_Backtest')
+
+DEFAULT_DATASET = "gdp_co2_by_country_v2"
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+class NaiveForecaster:
+    """Repeats the last observed value."""
+    name = "naive"
+
+    def fit(self, features: np.ndarray, target: np.ndarray) -> None:
+        self.last = float(target[-1])
+
+    def forecast(self, features: np.ndarray, target: np.ndarray, horizon: int) -> np.ndarray:
+        return np.full(horizon, self.last)
+
+
+class DriftForecaster:
+    """Extrapolates the average year-on-year change over the whole history."""
+    name = "drift"
+
+    def fit(self, features: np.ndarray, target: np.ndarray) -> None:
+        self.last = float(target[-1])
+        self.slope = float((target[-1] - target[0]) / max(len(target) - 1, 1))
+
+    def forecast(self, features: np.ndarray, target: np.ndarray, horizon: int) -> np.ndarray:
+        return self.last + self.slope * np.arange(1, horizon + 1)
+
+
+class LinearTrendForecaster:
+    """Least-squares linear trend over the most recent `window` observations."""
+    name = "linear"
+
+    def __init__(self, window: int = 10):
+        self.window = window
+
+    def fit(self, features: np.ndarray, target: np.ndarray) -> None:
+        recent = target[-self.window:]
+        x = np.arange(len(recent))
+        self.slope, self.intercept = np.polyfit(x, recent, 1) if len(recent) > 1 else (0.0, float(recent[-1]))
+        self.n = len(recent)
+
+    def forecast(self, features: np.ndarray, target: np.ndarray, horizon: int) -> np.ndarray:
+        x = np.arange(self.n, self.n + horizon)
+        return self.intercept + self.slope * x
+
+
+class LSTMForecaster:
+    """
+    Adapter around `CarbonPredictorLSTM.predict_deployment`. Multi-year horizons
+    are produced recursively: each prediction is written into the target column
+    of a copy of the last feature row, which is appended to the input window.
+    """
+    def __init__(self, backend: str = "keras", dataset_name: str = DEFAULT_DATASET):
+        from carbon_emission_forecaster import CarbonPredictorLSTM
+        from data_loader import SCHEMAS
+
+        self.name = "lstm" if backend == "keras" else f"lstm-{backend}"
+        self.predictor = CarbonPredictorLSTM(sequence_length=12, feature_count=21, backend=backend)
+        schema = SCHEMAS[dataset_name]
+        self.target_index = list(schema["columns"]).index(schema["target"])
+        # Load the weights up front so model loading is not billed as forecast latency.
+        self.predictor.predict_deployment(np.zeros((12, 21), dtype=np.float32))
+
+    def fit(self, features: np.ndarray, target: np.ndarray) -> None:
+        # Pre-trained global model: nothing to fit per origin.
+        pass
+
+    def forecast(self, features: np.ndarray, target: np.ndarray, horizon: int) -> np.ndarray:
+        window = np.nan_to_num(np.array(features[-self.predictor.sequence_length:], dtype=np.float32))
+        predictions = []
+        for _ in range(horizon):
+            value = self.predictor.predict_deployment(window)
+            predictions.append(value)
+            next_row = window[-1].copy()
+            next_row[self.target_index] = value
+            window = np.vstack([window[1:], next_row])
+        return np.asarray(predictions)
+
+
+FORECASTERS = {
+    "naive": NaiveForecaster,
+    "drift": DriftForecaster,
+    "linear": LinearTrendForecaster,
+    "lstm": lambda: LSTMForecaster(backend="keras"),
+    "lstm-tflite": lambda: LSTMForecaster(backend="tflite"),
+}
+
+
+def make_forecaster(spec: str):
+    """Instantiate a registered forecaster, or any `module:Class` exposing fit()/forecast()."""
+    if spec in FORECASTERS:
+        return FORECASTERS[spec]()
+    if ":" in spec:
+        module_name, class_name = spec.split(":", 1)
+        forecaster = getattr(importlib.import_module(module_name), class_name)()
+        if not getattr(forecaster, "name", None):
+            forecaster.name = spec
+        return forecaster
+    raise ValueError(f"Unknown forecaster '{spec}'. Registered: {', '.join(FORECASTERS)} (or module:Class)")
+
+
+# Per-process state, populated by the pool initializer so models load once per worker.
+_worker_forecasters: Dict[str, object] = {}
+_worker_dataset = None
+
+
+def _init_worker(dataset_name: str, specs: List[str]) -> None:
+    global _worker_dataset
+    from data_loader import load_dataset
+
+    _worker_dataset = load_dataset(dataset_name)
+    for spec in specs:
+        _worker_forecasters[spec] = make_forecaster(spec)
+
+
+def _empty_accumulator(max_horizon: int) -> dict:
+    return {
+        "n": np.zeros(max_horizon, dtype=np.int64),
+        "abs": np.zeros(max_horizon),
+        "sq": np.zeros(max_horizon),
+        "ape": np.zeros(max_horizon),
+        "n_ape": np.zeros(max_horizon, dtype=np.int64),
+        "fit_s": 0.0,
+        "forecast_s": 0.0,
+        "origins": 0,
+    }
+
+
+def backtest_country(country: str, bounds, max_horizon: int, min_train: int, step: int) -> dict:
+    """Rolling-origin evaluation of every worker forecaster on one country."""
+    start, stop = bounds
+    features = _worker_dataset.feature_matrix()[start:stop]
+    target = np.asarray(_worker_dataset.column(_worker_dataset.target)[start:stop], dtype=np.float64)
+
+    results = {}
+    for spec, forecaster in _worker_forecasters.items():
+        acc = _empty_accumulator(max_horizon)
+        for origin in range(min_train, len(target), step):
+            horizon = min(max_horizon, len(target) - origin)
+            history_features, history_target = features[:origin], target[:origin]
+
+            started = time.perf_counter()
+            forecaster.fit(history_features, history_target)
+            fitted = time.perf_counter()
+            predicted = np.asarray(forecaster.forecast(history_features, history_target, horizon), dtype=np.float64)
+            acc["fit_s"] += fitted - started
+            acc["forecast_s"] += time.perf_counter() - fitted
+            acc["origins"] += 1
+
+            actual = target[origin:origin + horizon]
+            errors = predicted[:horizon] - actual
+            valid = np.isfinite(errors)
+            acc["n"][:horizon] += valid
+            acc["abs"][:horizon] += np.where(valid, np.abs(errors), 0.0)
+            acc["sq"][:horizon] += np.where(valid, errors ** 2, 0.0)
+            nonzero = valid & (actual != 0)
+            acc["ape"][:horizon] += np.where(nonzero, np.abs(errors) / np.where(nonzero, np.abs(actual), 1.0), 0.0)
+            acc["n_ape"][:horizon] += nonzero
+        results[spec] = acc
+    return {"country": country, "results": results}
+
+
+def _summarize(acc: dict) -> dict:
+    horizons = {}
+    for h in range(len(acc["n"])):
+        n = int(acc["n"][h])
+        if n == 0:
+            continue
+        horizons[str(h + 1)] = {
+            "n": n,
+            "mae": float(acc["abs"][h] / n),
+            "rmse": float(np.sqrt(acc["sq"][h] / n)),
+            "mape": float(acc["ape"][h] / acc["n_ape"][h] * 100) if acc["n_ape"][h] else None,
+        }
+    origins = max(acc["origins"], 1)
+    return {
+        "horizons": horizons,
+        "origins": int(acc["origins"]),
+        "latency_ms": {
+            "fit_mean": acc["fit_s"] / origins * 1000,
+            "forecast_mean": acc["forecast_s"] / origins * 1000,
+        },
+    }
+
+
+def run_backtest(specs: List[str], dataset_name: str = DEFAULT_DATASET, max_horizon: int = 5, min_train: int = 20,
+                 step: int = 1, workers: Optional[int] = None, countries: Optional[List[str]] = None,
+                 per_country: bool = False) -> dict:
+    """Evaluate forecasters on every country across a process pool and aggregate the metrics."""
+    from data_loader import load_dataset
+
+    # Build (or validate) the columnar cache once in the parent so workers only memory-map it.
+    dataset = load_dataset(dataset_name)
+    groups = dataset.groups()
+    if countries:
+        groups = {code: bounds for code, bounds in groups.items() if code in countries}
+
+    totals = {spec: _empty_accumulator(max_horizon) for spec in specs}
+    country_results = {}
+    started = time.perf_counter()
+    # "spawn" keeps TensorFlow-backed forecasters safe: no forked TF runtime state.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(dataset_name, specs)) as pool:
+        futures = [
+            pool.submit(backtest_country, code, bounds, max_horizon, min_train, step)
+            for code, bounds in groups.items()
+        ]
+        for future in as_completed(futures):
+            outcome = future.result()
+            for spec, acc in outcome["results"].items():
+                total = totals[spec]
+                for key in ("n", "abs", "sq", "ape", "n_ape"):
+                    total[key] += acc[key]
+                for key in ("fit_s", "forecast_s", "origins"):
+                    total[key] += acc[key]
+                if per_country:
+                    country_results.setdefault(outcome["country"], {})[spec] = _summarize(acc)
+
+    report = {
+        "dataset": dataset_name,
+        "generated_at": datetime.utcnow().isoformat(),
+        "config": {
+            "forecasters": specs,
+            "max_horizon": max_horizon,
+            "min_train": min_train,
+            "step": step,
+            "countries": len(groups),
+        },
+        "wall_time_s": time.perf_counter() - started,
+        "forecasters": {spec: _summarize(acc) for spec, acc in totals.items()},
+    }
+    if per_country:
+        report["per_country"] = country_results
+    return report
+
+
+def _print_report(report: dict) -> None:
+    print(f"{'forecaster':<16}{'h':>3}{'MAE':>14}{'RMSE':>14}{'MAPE %':>10}{'forecast ms':>14}")
+    for spec, summary in report["forecasters"].items():
+        for h, metrics in summary["horizons"].items():
+            mape = f"{metrics['mape']:.2f}" if metrics["mape"] is not None else "-"
+            print(f"{spec:<16}{h:>3}{metrics['mae']:>14.4g}{metrics['rmse']:>14.4g}{mape:>10}"
+                  f"{summary['latency_ms']['forecast_mean']:>14.3f}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest of the emission forecasters.")
+    parser.add_argument("--forecasters", nargs="+", default=["naive", "drift", "linear"],
+                        help=f"Registered forecasters ({', '.join(FORECASTERS)}) or module:Class specs")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET)
+    parser.add_argument("--horizons", type=int, default=5, help="Maximum forecast horizon in years")
+    parser.add_argument("--min-train", type=int, default=20, help="Years of history before the first origin")
+    parser.add_argument("--step", type=int, default=1, help="Years between successive forecast origins")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--countries", nargs="*", help="Restrict to these country codes")
+    parser.add_argument("--per-country", action="store_true", help="Include per-country metrics in the output")
+    parser.add_argument("--output", help="Output JSON path (default: results/backtest_<timestamp>.json)")
+    args = parser.parse_args()
+
+    result = run_backtest(args.forecasters, args.dataset, args.horizons, args.min_train, args.step,
+                          args.workers, args.countries, args.per_country)
+    output = args.output or os.path.join(RESULTS_DIR, f"backtest_{datetime.utcnow():%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as fh:
+        json.dump(result, fh, indent=2)
+    _print_report(result)
+    logger.info(f"Backtest finished in {result['wall_time_s']:.1f}s -> {output}")
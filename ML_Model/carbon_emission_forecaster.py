@@ -1,15 +1,14 @@
 import os
 import sys
 import numpy as np
-import pandas as pd
-import tensorflow as tf
-from tensorflow.keras.models import Sequential, load_model
-from tensorflow.keras.layers import LSTM, Dense, Dropout, Bidirectional, BatchNormalization
-from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint, ReduceLROnPlateau
-from tensorflow.keras.optimizers import Adam
-from sklearn.preprocessing import MinMaxScaler
-import joblib
 import logging
+from typing import TYPE_CHECKING, Dict, Optional
+
+# TensorFlow, Keras, scikit-learn, pandas and joblib are imported lazily inside the
+# methods that need them, so importing this module (e.g. from the backend) stays cheap.
+if TYPE_CHECKING:
+    import pandas as pd
+    from tensorflow.keras.models import Sequential
 
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'  # Reduce TF verbosity
 
@@ -20,13 +19,28 @@ logging.basicConfig(
 )
 logger = logging.getLogger('CarbonTrack_DeepLearning')
 
-# Enable mixed precision for faster GPU training if available
-try:
-    from tensorflow.keras import mixed_precision
-    mixed_precision.set_global_policy('mixed_float16')
-    logger.info("Mixed precision fp16 enabled for TensorCore acceleration.")
-except Exception:
-    pass
+# Architecture / optimizer hyperparameters of the production v2 graph.
+DEFAULT_HPARAMS = {
+    "lstm_units_1": 128,
+    "lstm_units_2": 64,
+    "dropout_1": 0.3,
+    "dropout_2": 0.2,
+    "dense_units": 32,
+    "learning_rate": 0.001,
+}
+
+def enable_mixed_precision() -> bool:
+    """
+    Switch Keras to the mixed_float16 policy. Only worthwhile on GPUs with
+    TensorCores; on CPU the float16 casts make training and inference slower.
+    """
+    try:
+        from tensorflow.keras import mixed_precision
+        mixed_precision.set_global_policy('mixed_float16')
+        logger.info("Mixed precision fp16 enabled for TensorCore acceleration.")
+        return True
+    except Exception:
+        return False
 
 class CarbonPredictorLSTM:
     """
@@ -34,13 +48,48 @@ class CarbonPredictorLSTM:
     Memory (Bi-LSTM) networks. Trained fundamentally on global Gross Domestic Product (GDP) 
     and Population demographic data to forecast CO2 macroeconomic trajectories.
     """
-    def __init__(self, sequence_length: int = 12, feature_count: int = 21):
+    def __init__(self, sequence_length: int = 12, feature_count: int = 21, backend: str = "keras",
+                 hparams: Optional[Dict[str, float]] = None):
+        if backend not in ("keras", "tflite"):
+            raise ValueError(f"Unsupported inference backend '{backend}' (expected 'keras' or 'tflite')")
         self.sequence_length = sequence_length
         self.feature_count = feature_count
+        self.backend = backend
+        self.hparams = {**DEFAULT_HPARAMS, **(hparams or {})}
         self.model = None
-        self.feature_scaler = MinMaxScaler(feature_range=(0, 1))
-        self.target_scaler = MinMaxScaler(feature_range=(0, 1))
-        
+        self._feature_scaler = None
+        self._target_scaler = None
+        self._devices_configured = False
+
+    @property
+    def feature_scaler(self):
+        if self._feature_scaler is None:
+            from sklearn.preprocessing import MinMaxScaler
+            self._feature_scaler = MinMaxScaler(feature_range=(0, 1))
+        return self._feature_scaler
+
+    @feature_scaler.setter
+    def feature_scaler(self, scaler):
+        self._feature_scaler = scaler
+
+    @property
+    def target_scaler(self):
+        if self._target_scaler is None:
+            from sklearn.preprocessing import MinMaxScaler
+            self._target_scaler = MinMaxScaler(feature_range=(0, 1))
+        return self._target_scaler
+
+    @target_scaler.setter
+    def target_scaler(self, scaler):
+        self._target_scaler = scaler
+
+    def _configure_devices(self):
+        """Import TensorFlow and set up GPU acceleration the first time a Keras model is needed."""
+        if self._devices_configured:
+            return
+        import tensorflow as tf
+
+        self._devices_configured = True
         # Check for GPU Accleration
         physical_devices = tf.config.list_physical_devices('GPU')
         if len(physical_devices) > 0:
@@ -49,37 +98,45 @@ class CarbonPredictorLSTM:
                 tf.config.experimental.set_memory_growth(physical_devices[0], True)
             except:
                 pass
+            enable_mixed_precision()
         else:
             logger.warning("No discrete GPU found. Falling back to multi-core CPU execution.")
 
-    def _build_architecture(self) -> Sequential:
+    def _build_architecture(self) -> "Sequential":
         """Construct the computational graph for the Recurrent Neural Network."""
+        import tensorflow as tf
+        from tensorflow.keras.models import Sequential
+        from tensorflow.keras.layers import LSTM, Dense, Dropout, Bidirectional, BatchNormalization
+        from tensorflow.keras.optimizers import Adam
+
+        self._configure_devices()
         logger.info("Initializing neural weights and compiling computational graph...")
         
+        hp = self.hparams
         model = Sequential(name="CarbonTrack_BiLSTM_Forecaster_v2")
         
         # Layer 1: Bidirectional LSTM to capture future and past temporal dependencies
         model.add(Bidirectional(
-            LSTM(units=128, return_sequences=True), 
+            LSTM(units=hp["lstm_units_1"], return_sequences=True), 
             input_shape=(self.sequence_length, self.feature_count),
             name="BiLSTM_Encoder_1"
         ))
         model.add(BatchNormalization(name="BatchNorm_1"))
-        model.add(Dropout(0.3, name="Dropout_Regularization_1"))
+        model.add(Dropout(hp["dropout_1"], name="Dropout_Regularization_1"))
         
         # Layer 2: Deep temporal feature extraction
-        model.add(LSTM(units=64, return_sequences=False, name="LSTM_Encoder_2"))
+        model.add(LSTM(units=hp["lstm_units_2"], return_sequences=False, name="LSTM_Encoder_2"))
         model.add(BatchNormalization(name="BatchNorm_2"))
-        model.add(Dropout(0.2, name="Dropout_Regularization_2"))
+        model.add(Dropout(hp["dropout_2"], name="Dropout_Regularization_2"))
         
         # Layer 3: Dense projection mapping
-        model.add(Dense(32, activation='relu', kernel_initializer='he_normal', name="Dense_Projection"))
+        model.add(Dense(hp["dense_units"], activation='relu', kernel_initializer='he_normal', name="Dense_Projection"))
         
         # Layer 4: Output regressor (Continuous value forecasting)
         model.add(Dense(1, activation='linear', name="Emission_Output_Node"))
         
         # Optimizer with gradient clipping to prevent exploding loss
-        optimizer = Adam(learning_rate=0.001, clipnorm=1.0)
+        optimizer = Adam(learning_rate=hp["learning_rate"], clipnorm=1.0)
         
         model.compile(
             optimizer=optimizer,
@@ -99,13 +156,18 @@ class CarbonPredictorLSTM:
         # Optimize memory layout for TF graph
         return np.array(X, dtype=np.float32), np.array(y, dtype=np.float32)
 
-    def train_graph(self, X_train: np.ndarray, y_train: np.ndarray, X_val: np.ndarray, y_val: np.ndarray, epochs=100, batch_size=32):
+    def train_graph(self, X_train: np.ndarray, y_train: np.ndarray, X_val: np.ndarray, y_val: np.ndarray, epochs=100, batch_size=32,
+                    output_dir: str = "weights", verbose: int = 1):
         """Execute the forward and backward propagation sweeps with aggressive callbacks."""
+        import joblib
+        from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint, ReduceLROnPlateau
+
         self.model = self._build_architecture()
-        self.model.summary(print_fn=logger.info)
+        if verbose:
+            self.model.summary(print_fn=logger.info)
         
         # Ensure checkpoint output directory exists
-        os.makedirs("weights", exist_ok=True)
+        os.makedirs(output_dir, exist_ok=True)
         
         # Dynamic topology callbacks
         callbacks = [
@@ -113,20 +175,20 @@ class CarbonPredictorLSTM:
                 monitor='val_loss', 
                 patience=15, 
                 restore_best_weights=True,
-                verbose=1
+                verbose=verbose
             ),
             ModelCheckpoint(
-                filepath='weights/carbon_lstm_v2_best.keras',
+                filepath=os.path.join(output_dir, 'carbon_lstm_v2_best.keras'),
                 monitor='val_loss',
                 save_best_only=True,
-                verbose=1
+                verbose=verbose
             ),
             ReduceLROnPlateau(
                 monitor='val_loss', 
                 factor=0.2, 
                 patience=5, 
                 min_lr=1e-6,
-                verbose=1
+                verbose=verbose
             )
         ]
         
@@ -139,22 +201,38 @@ class CarbonPredictorLSTM:
             epochs=epochs,
             batch_size=batch_size,
             callbacks=callbacks,
-            verbose=1
+            verbose=verbose
         )
         
         # Save finalized model states
-        logger.info("Saving canonical weights to disk -> weights/carbon_lstm_v2_final.keras")
-        self.model.save("weights/carbon_lstm_v2_final.keras")
-        joblib.dump(self.feature_scaler, "weights/feature_scaler.joblib")
-        joblib.dump(self.target_scaler, "weights/target_scaler.joblib")
+        final_path = os.path.join(output_dir, "carbon_lstm_v2_final.keras")
+        logger.info(f"Saving canonical weights to disk -> {final_path}")
+        self.model.save(final_path)
+        joblib.dump(self.feature_scaler, os.path.join(output_dir, "feature_scaler.joblib"))
+        joblib.dump(self.target_scaler, os.path.join(output_dir, "target_scaler.joblib"))
         
         return history
 
-    def predict_deployment(self, recent_sequence: pd.DataFrame) -> float:
+    def predict_deployment(self, recent_sequence: "pd.DataFrame") -> float:
         """Inference wrapper for production deployment."""
+        if self.backend == "tflite":
+            if self.model is None:
+                logger.info("Loading quantized TFLite graph from disk...")
+                try:
+                    from tflite_backend import TFLiteForecastBackend
+                    self.model = TFLiteForecastBackend()
+                except Exception as e:
+                    logger.error(f"Failed to load .tflite graph: {e}")
+                    sys.exit(1)
+            return self.model.predict(recent_sequence)
+
         if self.model is None:
             logger.info("Loading pre-trained graph weights from disk...")
             try:
+                import joblib
+                from tensorflow.keras.models import load_model
+
+                self._configure_devices()
                 self.model = load_model("weights/carbon_lstm_v2_final.keras")
                 self.feature_scaler = joblib.load("weights/feature_scaler.joblib")
                 self.target_scaler = joblib.load("weights/target_scaler.joblib")
@@ -0,0 +1,84 @@
+"""
+Import-time regression check for the ML modules.
+
+    python check_import_time.py [--budget-ms 250] [module ...]
+
+By default every module in ML_Model/ is checked, so new entry points are
+covered as soon as they land. Each module is imported in a fresh interpreter under `python -X importtime`.
+The check fails (exit code 1) if a module's cumulative import time exceeds the
+budget, or if importing it pulls in a heavy framework that must only load when
+a model is actually built or served.
+"""
+import os
+import re
+import sys
+import glob
+import argparse
+import subprocess
+from typing import Dict, List, Tuple
+
+ML_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Scripts that exist to run TensorFlow directly (and this checker itself).
+UNCHECKED_MODULES = {"check_import_time", "run_tf"}
+
+# Frameworks that must never be imported as a side effect of importing the modules above.
+HEAVY_MODULES = ("tensorflow", "keras", "sklearn", "pandas", "joblib", "tflite_runtime", "ai_edge_litert")
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def discover_modules() -> List[str]:
+    """Every module in ML_DIR except UNCHECKED_MODULES."""
+    names = (os.path.splitext(os.path.basename(path))[0] for path in glob.glob(os.path.join(ML_DIR, "*.py")))
+    return sorted(name for name in names if name not in UNCHECKED_MODULES)
+
+
+def measure_import(module: str, runs: int = 3) -> Tuple[float, List[str]]:
+    """Best-of-N cumulative import time (ms) of `module` and the top-level packages it imported."""
+    best_ms = float("inf")
+    imported: List[str] = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=ML_DIR, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+        cumulative: Dict[str, int] = {}
+        for line in result.stderr.splitlines():
+            match = _IMPORTTIME_LINE.match(line)
+            if match:
+                cumulative[match.group(4)] = int(match.group(2))
+        best_ms = min(best_ms, cumulative.get(module, 0) / 1000)
+        imported = sorted({name.split(".")[0] for name in cumulative})
+    return best_ms, imported
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Fail if ML module imports exceed the time budget.")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("ML_IMPORT_BUDGET_MS", "250")),
+                        help="Maximum cumulative import time per module in milliseconds")
+    parser.add_argument("modules", nargs="*", help="Modules to check (default: all of ML_Model/)")
+    args = parser.parse_args()
+
+    failures = []
+    for module in args.modules or discover_modules():
+        elapsed_ms, imported = measure_import(module)
+        heavy = [name for name in HEAVY_MODULES if name in imported]
+        status = "ok"
+        if heavy:
+            status = "FAIL"
+            failures.append(f"{module} imports heavy frameworks at module level: {', '.join(heavy)}")
+        if elapsed_ms > args.budget_ms:
+            status = "FAIL"
+            failures.append(f"{module} took {elapsed_ms:.1f} ms to import (budget {args.budget_ms:.0f} ms)")
+        print(f"{module:<30}{elapsed_ms:>10.1f} ms  {status}")
+
+    for failure in failures:
+        print(f"  - {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
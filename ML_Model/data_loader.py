@@ -0,0 +1,334 @@
+import os
+import csv
+import json
+import time
+import shutil
+import hashlib
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger('CarbonTrack_DataLoader')
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+CACHE_DIR = os.getenv("CARBON_DATA_CACHE", os.path.join(DATA_DIR, ".cache"))
+
+# Bump when the on-disk cache layout changes so stale caches are rebuilt.
+CACHE_FORMAT_VERSION = 1
+
+# Explicit dtype schema per source file. Column order matches the CSV header.
+# "category" columns are dictionary-encoded to int16 codes; everything else is
+# stored as the given NumPy dtype. Empty numeric cells become NaN.
+_GDP_CO2_COLUMNS = {
+    "Country Name": "category",
+    "Country Code": "category",
+    "Year": "int16",
+    "Population": "float64",
+    "Pop Log": "float32",
+    "Pop Outliers": "category",
+    "Pop Category": "category",
+    "CO2": "float64",
+    "CO2 %": "float32",
+    "Per Capita CO2": "float64",
+    "Cumulative CO2": "float64",
+    "CO2 Log": "float32",
+    "CO2 Outliers": "category",
+    "Emissions Category": "category",
+    "GDP USD": "float64",
+    "GDP USD Log": "float32",
+    "GDP %": "float32",
+    "GDP % Winsor": "float32",
+    "GDP Per Capita": "float64",
+    "GDP Category": "category",
+    "CO2 Per GDP": "float64",
+}
+
+_GDP_CO2_V2_COLUMNS = {
+    name: dtype for name, dtype in _GDP_CO2_COLUMNS.items() if name != "Per Capita CO2"
+}
+_GDP_CO2_V2_COLUMNS["Per Capita CO2 (kg)"] = "float64"
+
+SCHEMAS = {
+    "gdp_co2_by_country": {
+        "file": "gdp_co2_by_country.csv",
+        "columns": _GDP_CO2_COLUMNS,
+        "group_by": "Country Code",
+        "order_by": "Year",
+        "target": "CO2",
+    },
+    "gdp_co2_by_country_v2": {
+        "file": "gdp_co2_by_country_v2.csv",
+        "columns": _GDP_CO2_V2_COLUMNS,
+        "group_by": "Country Code",
+        "order_by": "Year",
+        "target": "CO2",
+    },
+    "global_energy_consumption": {
+        "file": "global_energy_consumption.csv",
+        "columns": {
+            "Country": "category",
+            "Year": "int16",
+            "Total Energy Consumption (TWh)": "float32",
+            "Per Capita Energy Use (kWh)": "float32",
+            "Renewable Energy Share (%)": "float32",
+            "Fossil Fuel Dependency (%)": "float32",
+            "Industrial Energy Use (%)": "float32",
+            "Household Energy Use (%)": "float32",
+            "Carbon Emissions (Million Tons)": "float32",
+            "Energy Price Index (USD/kWh)": "float32",
+        },
+        "group_by": "Country",
+        "order_by": "Year",
+        "target": "Carbon Emissions (Million Tons)",
+    },
+    "co2_emission_life_exp": {
+        "file": "CO2Emission_LifeExp.csv",
+        "columns": {
+            "Country": "category",
+            "Code": "category",
+            "CO2Emissions": "float64",
+            "YearlyChange": "float32",
+            "Percapita": "float32",
+            "Population": "float64",
+            "LifeExpectancy": "float32",
+        },
+        "group_by": None,
+        "order_by": None,
+        "target": "CO2Emissions",
+    },
+}
+
+
+class DatasetCache:
+    """
+    Memory-mapped view over the binary columnar cache of one CSV dataset.
+    Columns are lazily opened as read-only `.npy` memmaps, so loading a dataset
+    only reads the small metadata file until a column is actually touched.
+    """
+    def __init__(self, name: str, path: str, meta: dict):
+        self.name = name
+        self.path = path
+        self.meta = meta
+        self._columns: Dict[str, np.ndarray] = {}
+
+    @property
+    def column_names(self) -> List[str]:
+        return list(self.meta["columns"].keys())
+
+    @property
+    def n_rows(self) -> int:
+        return self.meta["n_rows"]
+
+    @property
+    def target(self) -> Optional[str]:
+        return self.meta.get("target")
+
+    def column(self, name: str) -> np.ndarray:
+        """Raw column array (category columns are returned as int16 codes)."""
+        if name not in self._columns:
+            file_name = self.meta["columns"][name]["file"]
+            self._columns[name] = np.load(os.path.join(self.path, file_name), mmap_mode='r')
+        return self._columns[name]
+
+    def categories(self, name: str) -> List[str]:
+        return self.meta["columns"][name].get("categories", [])
+
+    def decode(self, name: str) -> np.ndarray:
+        """Return a category column as an array of strings."""
+        labels = np.asarray(self.categories(name), dtype=object)
+        return labels[self.column(name)]
+
+    def feature_matrix(self) -> np.ndarray:
+        """
+        Memory-mapped float32 matrix [rows, columns] holding every column in
+        schema order, with category columns represented by their codes.
+        """
+        if "__features__" not in self._columns:
+            self._columns["__features__"] = np.load(os.path.join(self.path, "features.npy"), mmap_mode='r')
+        return self._columns["__features__"]
+
+    def groups(self) -> Dict[str, Tuple[int, int]]:
+        """Contiguous [start, stop) row ranges per group (e.g. per country)."""
+        return {key: (start, stop) for key, start, stop in self.meta.get("groups", [])}
+
+    def to_frame(self):
+        """Materialize the cache as a pandas DataFrame (imports pandas lazily)."""
+        import pandas as pd
+
+        data = {}
+        for name, spec in self.meta["columns"].items():
+            if spec["dtype"] == "category":
+                data[name] = pd.Categorical.from_codes(np.asarray(self.column(name)), categories=spec["categories"])
+            else:
+                data[name] = np.asarray(self.column(name))
+        return pd.DataFrame(data)
+
+
+def _source_path(name: str) -> str:
+    if name not in SCHEMAS:
+        raise KeyError(f"Unknown dataset '{name}'. Known datasets: {', '.join(sorted(SCHEMAS))}")
+    return os.path.join(DATA_DIR, SCHEMAS[name]["file"])
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_meta(cache_path: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(cache_path, "meta.json"), "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _cache_is_fresh(name: str, meta: Optional[dict]) -> bool:
+    """Validate a cache against its source: cheap stat check first, content hash on mismatch."""
+    if not meta or meta.get("format_version") != CACHE_FORMAT_VERSION:
+        return False
+    source = _source_path(name)
+    stat = os.stat(source)
+    if meta.get("source_size") == stat.st_size and meta.get("source_mtime_ns") == stat.st_mtime_ns:
+        return True
+    if meta.get("source_size") != stat.st_size:
+        return False
+    # mtime changed (e.g. fresh git checkout) but the size matches: fall back to the hash.
+    return meta.get("source_sha256") == _file_sha256(source)
+
+
+def _parse_csv(name: str) -> Tuple[Dict[str, np.ndarray], Dict[str, List[str]], int]:
+    """Parse a CSV with its explicit schema into typed NumPy columns."""
+    schema = SCHEMAS[name]["columns"]
+    with open(_source_path(name), "r", encoding="utf-8", newline="") as fh:
+        reader = csv.reader(fh)
+        header = next(reader)
+        missing = [col for col in schema if col not in header]
+        if missing:
+            raise ValueError(f"{SCHEMAS[name]['file']} is missing schema columns: {missing}")
+        index = {col: header.index(col) for col in schema}
+        raw: Dict[str, list] = {col: [] for col in schema}
+        for row in reader:
+            if not row:
+                continue
+            for col, i in index.items():
+                raw[col].append(row[i])
+
+    columns: Dict[str, np.ndarray] = {}
+    categories: Dict[str, List[str]] = {}
+    for col, dtype in schema.items():
+        values = raw[col]
+        if dtype == "category":
+            labels = sorted(set(values))
+            lookup = {label: code for code, label in enumerate(labels)}
+            columns[col] = np.fromiter((lookup[v] for v in values), dtype=np.int16, count=len(values))
+            categories[col] = labels
+        elif np.issubdtype(np.dtype(dtype), np.integer):
+            columns[col] = np.array([int(float(v)) for v in values], dtype=dtype)
+        else:
+            columns[col] = np.array([float(v) if v != "" else np.nan for v in values], dtype=dtype)
+    n_rows = len(next(iter(raw.values()))) if raw else 0
+    return columns, categories, n_rows
+
+
+def build_cache(name: str) -> DatasetCache:
+    """Convert one CSV into its columnar `.npy` cache, replacing any existing cache atomically."""
+    started = time.perf_counter()
+    spec = SCHEMAS[name]
+    source = _source_path(name)
+    columns, categories, n_rows = _parse_csv(name)
+
+    # Sort rows so every group (country) is a contiguous, time-ordered slice.
+    groups = []
+    if spec["group_by"]:
+        keys = [columns[spec["group_by"]]]
+        if spec["order_by"]:
+            keys.insert(0, columns[spec["order_by"]])
+        order = np.lexsort(keys)
+        columns = {col: values[order] for col, values in columns.items()}
+        group_codes = columns[spec["group_by"]]
+        boundaries = np.flatnonzero(np.diff(group_codes)) + 1
+        starts = np.concatenate(([0], boundaries))
+        stops = np.concatenate((boundaries, [n_rows]))
+        labels = categories[spec["group_by"]]
+        groups = [[labels[group_codes[s]], int(s), int(e)] for s, e in zip(starts, stops)]
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    final_path = os.path.join(CACHE_DIR, name)
+    tmp_path = f"{final_path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    meta_columns = {}
+    for i, (col, values) in enumerate(columns.items()):
+        file_name = f"col_{i:02d}.npy"
+        np.save(os.path.join(tmp_path, file_name), values)
+        meta_columns[col] = {"file": file_name, "dtype": spec["columns"][col]}
+        if col in categories:
+            meta_columns[col]["categories"] = categories[col]
+
+    features = np.empty((n_rows, len(columns)), dtype=np.float32)
+    for i, values in enumerate(columns.values()):
+        features[:, i] = values
+    np.save(os.path.join(tmp_path, "features.npy"), features)
+
+    stat = os.stat(source)
+    meta = {
+        "format_version": CACHE_FORMAT_VERSION,
+        "source": spec["file"],
+        "source_sha256": _file_sha256(source),
+        "source_size": stat.st_size,
+        "source_mtime_ns": stat.st_mtime_ns,
+        "n_rows": n_rows,
+        "target": spec["target"],
+        "columns": meta_columns,
+        "groups": groups,
+    }
+    with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as fh:
+        json.dump(meta, fh)
+
+    shutil.rmtree(final_path, ignore_errors=True)
+    os.replace(tmp_path, final_path)
+    logger.info(f"Cached {spec['file']} ({n_rows} rows) in {time.perf_counter() - started:.2f}s")
+    return DatasetCache(name, final_path, meta)
+
+
+def load_dataset(name: str, rebuild: bool = False) -> DatasetCache:
+    """
+    Open the columnar cache for a dataset, converting the CSV first if the cache
+    is missing or its source file changed since it was built.
+    """
+    cache_path = os.path.join(CACHE_DIR, name)
+    meta = None if rebuild else _read_meta(cache_path)
+    if not _cache_is_fresh(name, meta):
+        return build_cache(name)
+    return DatasetCache(name, cache_path, meta)
+
+
+def load_feature_matrix(name: str) -> Tuple[np.ndarray, List[str]]:
+    """Memory-mapped float32 feature matrix and its column names."""
+    dataset = load_dataset(name)
+    return dataset.feature_matrix(), dataset.column_names
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Build or refresh the columnar cache of ML_Model/data CSVs.")
+    parser.add_argument("datasets", nargs="*", default=list(SCHEMAS), help="Datasets to cache (default: all)")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild even if the cache is fresh")
+    args = parser.parse_args()
+
+    for dataset_name in args.datasets:
+        if dataset_name not in SCHEMAS:
+            parser.error(f"unknown dataset '{dataset_name}'")
+        load_dataset(dataset_name, rebuild=args.rebuild)
+        started = time.perf_counter()
+        matrix = load_dataset(dataset_name).feature_matrix()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print(f"{dataset_name}: {matrix.shape[0]} rows x {matrix.shape[1]} cols, warm load {elapsed_ms:.2f} ms")
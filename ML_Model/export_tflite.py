@@ -0,0 +1,205 @@
+"""
+Export the trained Bi-LSTM forecaster to TensorFlow Lite for CPU serving.
+
+    python export_tflite.py --quantization float16 int8
+
+Writes `weights/carbon_lstm_v2_<quantization>.tflite`, the scaler parameters
+(`weights/scalers.json`) used by `TFLiteForecastBackend`, and a comparison
+report (`weights/tflite_export_report.json`) with accuracy deltas, single-window
+latency and peak memory of every exported variant against the Keras model.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import subprocess
+from typing import Dict, List
+
+import numpy as np
+
+logger = logging.getLogger('CarbonTrack_DeepLearning')
+
+QUANTIZATIONS = ("float32", "float16", "int8")
+DEFAULT_KERAS_MODEL = "weights/carbon_lstm_v2_final.keras"
+
+
+def convert_model(model, quantization: str) -> bytes:
+    """Convert a Keras model to a TFLite flatbuffer with the requested weight quantization."""
+    import tensorflow as tf
+
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization '{quantization}'")
+
+    # Freeze the graph through a SavedModel with a fixed batch-1 signature so the
+    # recurrent loops lower to TFLite builtins (no Flex delegate needed at serving time).
+    _, sequence_length, feature_count = model.input_shape
+    input_spec = tf.TensorSpec([1, sequence_length, feature_count], tf.float32)
+    saved_model_dir = tempfile.mkdtemp(prefix="carbon_lstm_savedmodel_")
+    try:
+        try:
+            model.export(saved_model_dir, input_signature=[input_spec])
+        except (AttributeError, TypeError):
+            # tf.keras 2.x: no Model.export(input_signature=...), save a traced signature instead.
+            serving_fn = tf.function(lambda x: model(x, training=False))
+            tf.saved_model.save(model, saved_model_dir, signatures=serving_fn.get_concrete_function(input_spec))
+        converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_dir)
+        if quantization == "float16":
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.target_spec.supported_types = [tf.float16]
+        elif quantization == "int8":
+            # Dynamic-range quantization: int8 weights, float activations, no calibration set needed.
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        return converter.convert()
+    finally:
+        shutil.rmtree(saved_model_dir, ignore_errors=True)
+
+
+def evaluation_windows(sequence_length: int, feature_count: int, limit: int) -> np.ndarray:
+    """Real raw input windows from the cached country panel, used to compare backends."""
+    from data_loader import load_dataset
+
+    dataset = load_dataset("gdp_co2_by_country_v2")
+    features = dataset.feature_matrix()
+    if features.shape[1] != feature_count:
+        raise ValueError(f"Dataset has {features.shape[1]} features, model expects {feature_count}")
+
+    windows = []
+    for start, stop in dataset.groups().values():
+        for i in range(start, stop - sequence_length + 1, sequence_length):
+            windows.append(features[i:i + sequence_length])
+            if len(windows) >= limit:
+                return np.nan_to_num(np.asarray(windows, dtype=np.float32))
+    return np.nan_to_num(np.asarray(windows, dtype=np.float32))
+
+
+def _latency_ms(predict_one, windows: np.ndarray, repeats: int) -> Dict[str, float]:
+    predict_one(windows[0])  # Warm-up (graph tracing / tensor allocation)
+    timings = []
+    for i in range(repeats):
+        started = time.perf_counter()
+        predict_one(windows[i % len(windows)])
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p95_ms": float(np.percentile(timings, 95)),
+    }
+
+
+def _probe_peak_memory(kind: str, model_path: str, scaler_path: str) -> Dict[str, float]:
+    """Load one backend in a fresh interpreter and report its load time and peak RSS."""
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--probe", kind, model_path, scaler_path],
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _run_probe(kind: str, model_path: str, scaler_path: str) -> None:
+    import resource
+
+    started = time.perf_counter()
+    window = np.zeros((1, 12, 21), dtype=np.float32)
+    if kind == "keras":
+        import joblib
+        from tensorflow.keras.models import load_model
+        model = load_model(model_path)
+        joblib.load("weights/feature_scaler.joblib")
+        model.predict(window, verbose=0)
+    else:
+        from tflite_backend import TFLiteForecastBackend
+        backend = TFLiteForecastBackend(model_path, scaler_path)
+        backend.predict_scaled(window)
+    load_s = time.perf_counter() - started
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"load_and_first_predict_s": load_s, "peak_rss_mb": peak_kb / 1024}))
+
+
+def export(model_path: str, output_dir: str, quantizations: List[str], eval_windows: int, repeats: int) -> dict:
+    import joblib
+    from tensorflow.keras.models import load_model
+    from tflite_backend import TFLiteForecastBackend, export_scaler_params
+
+    model = load_model(model_path)
+    feature_scaler = joblib.load(os.path.join(os.path.dirname(model_path), "feature_scaler.joblib"))
+    target_scaler = joblib.load(os.path.join(os.path.dirname(model_path), "target_scaler.joblib"))
+
+    os.makedirs(output_dir, exist_ok=True)
+    scaler_path = os.path.join(output_dir, "scalers.json")
+    export_scaler_params(feature_scaler, target_scaler, scaler_path)
+
+    _, sequence_length, feature_count = model.input_shape
+    windows = evaluation_windows(sequence_length, feature_count, eval_windows)
+    scaled = np.stack([feature_scaler.transform(w) for w in windows]).astype(np.float32)
+    reference = target_scaler.inverse_transform(model.predict(scaled, verbose=0).astype(np.float64)).ravel()
+
+    report = {
+        "source_model": model_path,
+        "evaluation_windows": int(len(windows)),
+        "variants": {
+            "keras": {
+                "size_mb": os.path.getsize(model_path) / 2**20,
+                "latency": _latency_ms(lambda w: model.predict(w[np.newaxis, ...], verbose=0), scaled, repeats),
+                "memory": _probe_peak_memory("keras", model_path, scaler_path),
+            }
+        },
+    }
+
+    for quantization in quantizations:
+        tflite_path = os.path.join(output_dir, f"carbon_lstm_v2_{quantization}.tflite")
+        logger.info(f"Converting {model_path} -> {tflite_path} ({quantization})")
+        with open(tflite_path, "wb") as fh:
+            fh.write(convert_model(model, quantization))
+
+        backend = TFLiteForecastBackend(tflite_path, scaler_path)
+        predictions = np.array([backend.predict(w) for w in windows])
+        abs_error = np.abs(predictions - reference)
+        denom = np.maximum(np.abs(reference), 1e-9)
+        report["variants"][quantization] = {
+            "path": tflite_path,
+            "size_mb": os.path.getsize(tflite_path) / 2**20,
+            "accuracy_delta_vs_keras": {
+                "mae": float(abs_error.mean()),
+                "max_abs": float(abs_error.max()),
+                "mean_relative_pct": float((abs_error / denom).mean() * 100),
+            },
+            "latency": _latency_ms(lambda w: backend.predict_scaled(w[np.newaxis, ...]), scaled, repeats),
+            "memory": _probe_peak_memory("tflite", tflite_path, scaler_path),
+        }
+
+    report_path = os.path.join(output_dir, "tflite_export_report.json")
+    with open(report_path, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    logger.info(f"Export report written to {report_path}")
+    return report
+
+
+def _print_report(report: dict) -> None:
+    print(f"{'variant':<10}{'size MB':>10}{'p50 ms':>10}{'p95 ms':>10}{'peak RSS MB':>14}{'MAE delta':>14}")
+    for name, variant in report["variants"].items():
+        delta = variant.get("accuracy_delta_vs_keras", {}).get("mae", 0.0)
+        print(f"{name:<10}{variant['size_mb']:>10.2f}{variant['latency']['p50_ms']:>10.2f}"
+              f"{variant['latency']['p95_ms']:>10.2f}{variant['memory']['peak_rss_mb']:>14.1f}{delta:>14.4g}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == "--probe":
+        os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+        _run_probe(sys.argv[2], sys.argv[3], sys.argv[4])
+        sys.exit(0)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+    parser = argparse.ArgumentParser(description="Export the Keras forecaster to quantized TFLite models.")
+    parser.add_argument("--model", default=DEFAULT_KERAS_MODEL, help="Path to the trained .keras model")
+    parser.add_argument("--output-dir", default="weights", help="Directory for .tflite files and the report")
+    parser.add_argument("--quantization", nargs="+", choices=QUANTIZATIONS, default=["float16", "int8"])
+    parser.add_argument("--eval-windows", type=int, default=256, help="Number of real windows used for accuracy deltas")
+    parser.add_argument("--repeats", type=int, default=200, help="Single-window predictions timed per backend")
+    args = parser.parse_args()
+
+    _print_report(export(args.model, args.output_dir, args.quantization, args.eval_windows, args.repeats))
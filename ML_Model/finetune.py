@@ -0,0 +1,296 @@
+"""
+Incremental fine-tuning of the panchayat forecaster from submitted MonthlyData.
+
+    python finetune.py --db ../backend/carbontrackhub.db
+
+The served panchayat model lives in `weights/panchayat/`. Each run:
+
+1. reads only `monthly_data` rows updated since the stored watermark and marks
+   their (panchayat, month) periods as pending;
+2. rebuilds the monthly series of the affected panchayats only, and turns the
+   pending periods into training windows (the newest `--holdout` windows per
+   panchayat are reserved for validation);
+3. fine-tunes a copy of the current weights for a few epochs at a low learning
+   rate, and atomically swaps it in only if holdout MAE does not degrade by
+   more than `--tolerance`.
+
+The global GDP model has 21 macro features and cannot consume panchayat activity
+data, so the first run bootstraps this model with a full `train_graph` over the
+existing history; every later run costs time proportional to the new data only.
+"""
+import os
+import json
+import sqlite3
+import logging
+import argparse
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger('CarbonTrack_FineTune')
+
+DEFAULT_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend", "carbontrackhub.db")
+MODEL_DIR = "weights/panchayat"
+MODEL_FILE = "carbon_lstm_panchayat.keras"
+STATE_FILE = "finetune_state.json"
+
+MONTH_ABBR = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+ACTIVITY_COLUMNS = ["electricity_kwh", "diesel_liters", "petrol_liters", "waste_kg",
+                    "water_liters", "solar_units", "trees_planted"]
+# Model input per month: the panchayat's summed activity data plus its total emissions (the target).
+MONTHLY_FEATURES = ACTIVITY_COLUMNS + ["total_emissions"]
+TARGET_INDEX = len(MONTHLY_FEATURES) - 1
+
+DEFAULT_FACTORS = {"electricity": 0.716, "diesel": 2.68, "petrol": 2.32, "waste": 0.586, "water": 0.000344}
+
+Period = Tuple[str, int]  # (panchayat_id, year * 12 + month_index)
+
+
+def _period_index(year: int, month: str) -> int:
+    return int(year) * 12 + MONTH_ABBR.index(month)
+
+
+def _emission_factors(conn: sqlite3.Connection) -> Dict[str, float]:
+    try:
+        row = conn.execute(
+            "SELECT electricity, diesel, petrol, waste, water FROM emission_factors LIMIT 1"
+        ).fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    if not row:
+        return dict(DEFAULT_FACTORS)
+    return dict(zip(["electricity", "diesel", "petrol", "waste", "water"], row))
+
+
+def changed_periods(conn: sqlite3.Connection, watermark: Optional[str]) -> Tuple[Set[Period], Optional[str]]:
+    """Periods touched by rows created or updated after the watermark, and the new watermark."""
+    query = "SELECT panchayat_id, year, month, updated_at FROM monthly_data WHERE panchayat_id IS NOT NULL"
+    params: tuple = ()
+    if watermark:
+        query += " AND updated_at > ?"
+        params = (watermark,)
+    periods, latest = set(), watermark
+    for panchayat_id, year, month, updated_at in conn.execute(query, params):
+        if month not in MONTH_ABBR:
+            continue
+        periods.add((panchayat_id, _period_index(year, month)))
+        if updated_at and (latest is None or str(updated_at) > latest):
+            latest = str(updated_at)
+    return periods, latest
+
+
+def load_monthly_series(conn: sqlite3.Connection, panchayat_ids: Optional[List[str]] = None
+                        ) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """Per-panchayat (period indices, feature matrix) aggregated over all submitting users."""
+    f = _emission_factors(conn)
+    sums = ", ".join(f"SUM({col})" for col in ACTIVITY_COLUMNS)
+    query = f"SELECT panchayat_id, year, month, {sums} FROM monthly_data WHERE panchayat_id IS NOT NULL"
+    params: tuple = ()
+    if panchayat_ids is not None:
+        if not panchayat_ids:
+            return {}
+        query += f" AND panchayat_id IN ({', '.join('?' for _ in panchayat_ids)})"
+        params = tuple(panchayat_ids)
+    query += " GROUP BY panchayat_id, year, month"
+
+    rows: Dict[str, List[Tuple[int, List[float]]]] = {}
+    for panchayat_id, year, month, *activity in conn.execute(query, params):
+        if month not in MONTH_ABBR:
+            continue
+        activity = [float(v or 0) for v in activity]
+        elec, diesel, petrol, waste, water = activity[:5]
+        total = (elec * f["electricity"] + diesel * f["diesel"] + petrol * f["petrol"]
+                 + waste * f["waste"] + water * f["water"])
+        rows.setdefault(panchayat_id, []).append((_period_index(year, month), activity + [total]))
+
+    series = {}
+    for panchayat_id, entries in rows.items():
+        entries.sort(key=lambda e: e[0])
+        series[panchayat_id] = (
+            np.array([e[0] for e in entries], dtype=np.int64),
+            np.array([e[1] for e in entries], dtype=np.float32),
+        )
+    return series
+
+
+def build_windows(series: Dict[str, Tuple[np.ndarray, np.ndarray]], sequence_length: int, holdout: int,
+                  targets: Optional[Set[Period]] = None):
+    """
+    Split each panchayat's windows into (train, holdout). Holdout = its newest
+    `holdout` windows; train = the remaining windows whose target period is in
+    `targets` (all of them when `targets` is None).
+    """
+    train, hold = [], []
+    for panchayat_id, (periods, features) in series.items():
+        positions = np.arange(sequence_length, len(periods))
+        held = set(positions[-holdout:].tolist()) if holdout else set()
+        for pos in positions:
+            sample = (features[pos - sequence_length:pos], features[pos, TARGET_INDEX])
+            if pos in held:
+                hold.append(sample)
+            elif targets is None or (panchayat_id, int(periods[pos])) in targets:
+                train.append(sample)
+
+    def stack(samples):
+        if not samples:
+            return (np.empty((0, sequence_length, len(MONTHLY_FEATURES)), dtype=np.float32),
+                    np.empty((0,), dtype=np.float32))
+        return (np.stack([s[0] for s in samples]).astype(np.float32),
+                np.array([s[1] for s in samples], dtype=np.float32))
+
+    return stack(train), stack(hold)
+
+
+def _scale(feature_scaler, target_scaler, X: np.ndarray, y: np.ndarray):
+    n, steps, width = X.shape
+    X_scaled = feature_scaler.transform(X.reshape(-1, width)).reshape(n, steps, width).astype(np.float32)
+    y_scaled = target_scaler.transform(y.reshape(-1, 1)).astype(np.float32).ravel()
+    return X_scaled, y_scaled
+
+
+def _holdout_mae(model, target_scaler, X_scaled: np.ndarray, y: np.ndarray) -> Optional[float]:
+    if len(X_scaled) == 0:
+        return None
+    predicted = target_scaler.inverse_transform(model.predict(X_scaled, verbose=0).astype(np.float64)).ravel()
+    return float(np.mean(np.abs(predicted - y)))
+
+
+def _read_state(model_dir: str) -> dict:
+    try:
+        with open(os.path.join(model_dir, STATE_FILE), "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_json_atomic(path: str, payload: dict) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump(payload, fh, indent=2)
+    os.replace(tmp_path, path)
+
+
+def bootstrap(conn: sqlite3.Connection, model_dir: str, sequence_length: int, holdout: int, epochs: int) -> dict:
+    """One-off full training over all existing history when no served model exists yet."""
+    from sklearn.preprocessing import MinMaxScaler
+    from carbon_emission_forecaster import CarbonPredictorLSTM
+
+    series = load_monthly_series(conn)
+    (X_train, y_train), (X_hold, y_hold) = build_windows(series, sequence_length, holdout)
+    if len(X_train) == 0 or len(X_hold) == 0:
+        raise RuntimeError(
+            f"Not enough monthly history to bootstrap: need more than {sequence_length + holdout} months per panchayat"
+        )
+
+    all_rows = np.concatenate([f for _, f in series.values()])
+    feature_scaler = MinMaxScaler(feature_range=(0, 1)).fit(all_rows)
+    target_scaler = MinMaxScaler(feature_range=(0, 1)).fit(all_rows[:, TARGET_INDEX:TARGET_INDEX + 1])
+
+    predictor = CarbonPredictorLSTM(sequence_length=sequence_length, feature_count=len(MONTHLY_FEATURES))
+    predictor.feature_scaler = feature_scaler
+    predictor.target_scaler = target_scaler
+    X_train_s, y_train_s = _scale(feature_scaler, target_scaler, X_train, y_train)
+    X_hold_s, y_hold_s = _scale(feature_scaler, target_scaler, X_hold, y_hold)
+    predictor.train_graph(X_train_s, y_train_s, X_hold_s, y_hold_s, epochs=epochs, output_dir=model_dir, verbose=0)
+    os.replace(os.path.join(model_dir, "carbon_lstm_v2_final.keras"), os.path.join(model_dir, MODEL_FILE))
+
+    return {"holdout_mae": _holdout_mae(predictor.model, target_scaler, X_hold_s, y_hold), "trained_windows": len(X_train)}
+
+
+def finetune(db_path: str = DEFAULT_DB, model_dir: str = MODEL_DIR, sequence_length: int = 6, holdout: int = 2,
+             epochs: int = 3, learning_rate: float = 1e-4, tolerance: float = 0.02, bootstrap_epochs: int = 100) -> dict:
+    """Run one incremental update cycle and return a summary of what happened."""
+    os.makedirs(model_dir, exist_ok=True)
+    state = _read_state(model_dir)
+    model_path = os.path.join(model_dir, MODEL_FILE)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        new_periods, watermark = changed_periods(conn, state.get("watermark"))
+        pending = {tuple(p) for p in state.get("pending", [])} | new_periods
+
+        if not os.path.exists(model_path):
+            logger.info("No served panchayat model yet; bootstrapping from full history")
+            outcome = bootstrap(conn, model_dir, sequence_length, holdout, bootstrap_epochs)
+            state = {"watermark": watermark, "pending": [], "holdout_mae": outcome["holdout_mae"],
+                     "sequence_length": sequence_length, "updated_at": datetime.utcnow().isoformat()}
+            _write_json_atomic(os.path.join(model_dir, STATE_FILE), state)
+            return {"action": "bootstrapped", **outcome}
+
+        sequence_length = state.get("sequence_length", sequence_length)
+        affected = sorted({panchayat_id for panchayat_id, _ in pending})
+        series = load_monthly_series(conn, affected)
+    finally:
+        conn.close()
+
+    (X_new, y_new), (X_hold, y_hold) = build_windows(series, sequence_length, holdout, targets=pending)
+    if len(X_new) == 0:
+        # Either nothing changed or every change is still inside the holdout window.
+        state.update({"watermark": watermark, "pending": sorted(list(p) for p in pending)})
+        _write_json_atomic(os.path.join(model_dir, STATE_FILE), state)
+        return {"action": "skipped", "pending_periods": len(pending)}
+
+    import joblib
+    from tensorflow.keras.models import load_model
+    from tensorflow.keras.optimizers import Adam
+
+    feature_scaler = joblib.load(os.path.join(model_dir, "feature_scaler.joblib"))
+    target_scaler = joblib.load(os.path.join(model_dir, "target_scaler.joblib"))
+    X_new_s, y_new_s = _scale(feature_scaler, target_scaler, X_new, y_new)
+    X_hold_s, _ = _scale(feature_scaler, target_scaler, X_hold, y_hold)
+
+    current = load_model(model_path)
+    baseline_mae = _holdout_mae(current, target_scaler, X_hold_s, y_hold)
+
+    candidate = load_model(model_path)
+    candidate.compile(optimizer=Adam(learning_rate=learning_rate, clipnorm=1.0), loss=current.loss, metrics=['mae'])
+    candidate.fit(X_new_s, y_new_s, epochs=epochs, batch_size=min(32, len(X_new_s)), verbose=0)
+    candidate_mae = _holdout_mae(candidate, target_scaler, X_hold_s, y_hold)
+
+    accepted = baseline_mae is None or (candidate_mae is not None and candidate_mae <= baseline_mae * (1 + tolerance))
+    if accepted:
+        tmp_path = os.path.join(model_dir, f"candidate-{os.getpid()}.keras")
+        candidate.save(tmp_path)
+        os.replace(tmp_path, model_path)  # Atomic swap: readers see either the old or the new file.
+        logger.info(f"Swapped in fine-tuned model: holdout MAE {baseline_mae} -> {candidate_mae}")
+    else:
+        logger.warning(f"Rejected fine-tuned model: holdout MAE {baseline_mae} -> {candidate_mae}")
+
+    # Periods still inside the holdout stay pending so they are trained on once newer data arrives.
+    trained = {(pid, int(periods[pos])) for pid, (periods, _) in series.items()
+               for pos in range(sequence_length, len(periods) - holdout)}
+    state.update({
+        "watermark": watermark,
+        "pending": sorted(list(p) for p in pending - trained),
+        "holdout_mae": candidate_mae if accepted else baseline_mae,
+        "updated_at": datetime.utcnow().isoformat(),
+    })
+    _write_json_atomic(os.path.join(model_dir, STATE_FILE), state)
+    return {
+        "action": "swapped" if accepted else "rejected",
+        "trained_windows": int(len(X_new)),
+        "holdout_windows": int(len(X_hold)),
+        "baseline_mae": baseline_mae,
+        "candidate_mae": candidate_mae,
+    }
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+    parser = argparse.ArgumentParser(description="Fine-tune the panchayat forecaster on newly submitted MonthlyData.")
+    parser.add_argument("--db", default=DEFAULT_DB, help="Path to the backend SQLite database")
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--sequence-length", type=int, default=6, help="Months of context (used on bootstrap)")
+    parser.add_argument("--holdout", type=int, default=2, help="Newest windows per panchayat kept for validation")
+    parser.add_argument("--epochs", type=int, default=3, help="Fine-tuning epochs over the new windows")
+    parser.add_argument("--learning-rate", type=float, default=1e-4)
+    parser.add_argument("--tolerance", type=float, default=0.02, help="Allowed relative holdout MAE increase")
+    parser.add_argument("--bootstrap-epochs", type=int, default=100)
+    args = parser.parse_args()
+
+    summary = finetune(args.db, args.model_dir, args.sequence_length, args.holdout, args.epochs,
+                       args.learning_rate, args.tolerance, args.bootstrap_epochs)
+    print(json.dumps(summary, indent=2))
@@ -0,0 +1,275 @@
+"""
+Parallel hyperparameter sweep / per-group training for the Bi-LSTM forecaster.
+
+    python sweep.py --lstm-units-1 64 128 --learning-rate 1e-3 3e-4 --batch-size 32 64 --workers 4
+    python sweep.py --group-by "GDP Category" --workers 3
+
+Every (configuration, group) pair is one trial trained in its own worker
+process. TensorFlow's intra/inter-op thread pools are pinned per worker so N
+workers share the machine's cores instead of each spawning a full-size pool.
+Each trial writes its weights, scalers and `result.json` under
+`<sweep-dir>/<trial-id>/`; re-running the same command skips finished trials,
+so an interrupted sweep resumes where it stopped. Groups in which no country
+has enough history for a single training and validation window are skipped
+up front. The sweep ends by writing `leaderboard.json` / `leaderboard.csv`,
+ranked by validation loss within each group: every group is scaled with its
+own scalers, so losses are only comparable between trials of the same group.
+"""
+import os
+import csv
+import json
+import time
+import hashlib
+import logging
+import argparse
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger('CarbonTrack_Sweep')
+
+DEFAULT_DATASET = "gdp_co2_by_country_v2"
+DEFAULT_SWEEP_DIR = "sweeps/default"
+SEQUENCE_LENGTH = 12
+
+
+def _init_worker(threads_per_worker: int) -> None:
+    """Pin TensorFlow / BLAS thread pools before TensorFlow is imported in this worker."""
+    threads = str(threads_per_worker)
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS",
+                "TF_NUM_INTRAOP_THREADS", "TF_NUM_INTEROP_THREADS"):
+        os.environ[var] = threads
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads_per_worker)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def split_windows(dataset, group_by: Optional[str], group: Optional[str], sequence_length: int,
+                  val_fraction: float) -> Tuple[List[Tuple[int, int]], List[np.ndarray], List[np.ndarray]]:
+    """
+    Row ranges of the group's countries and their training / validation window
+    origins. The last `val_fraction` of each country's windows is held out for
+    validation so the split respects time order.
+    """
+    country_bounds = list(dataset.groups().values())
+    if group_by:
+        labels = dataset.decode(group_by)
+        # A country belongs to the group its most recent row is labelled with.
+        country_bounds = [(start, stop) for start, stop in country_bounds if labels[stop - 1] == group]
+
+    train_idx, val_idx = [], []
+    for start, stop in country_bounds:
+        origins = np.arange(start, stop - sequence_length)
+        if len(origins) < 2:
+            continue
+        n_val = min(len(origins) - 1, max(1, int(round(len(origins) * val_fraction))))
+        train_idx.append(origins[:-n_val])
+        val_idx.append(origins[-n_val:])
+    return country_bounds, train_idx, val_idx
+
+
+def prepare_training_data(dataset_name: str, group_by: Optional[str], group: Optional[str],
+                          sequence_length: int, val_fraction: float):
+    """
+    Build scaled sliding windows per country (see split_windows). Returns (X_train, y_train, X_val, y_val, feature_scaler, target_scaler).
+    """
+    from sklearn.preprocessing import MinMaxScaler
+    from data_loader import load_dataset
+
+    dataset = load_dataset(dataset_name)
+    features = np.nan_to_num(np.asarray(dataset.feature_matrix(), dtype=np.float32))
+    target = np.asarray(dataset.column(dataset.target), dtype=np.float32).reshape(-1, 1)
+
+    country_bounds, train_idx, val_idx = split_windows(dataset, group_by, group, sequence_length, val_fraction)
+    if not train_idx:
+        raise ValueError(f"group {group!r} has no country with more than {sequence_length + 1} rows of history")
+
+    rows = np.concatenate([np.arange(start, stop) for start, stop in country_bounds])
+    feature_scaler = MinMaxScaler(feature_range=(0, 1)).fit(features[rows])
+    target_scaler = MinMaxScaler(feature_range=(0, 1)).fit(target[rows])
+    scaled_features = feature_scaler.transform(features).astype(np.float32)
+    scaled_target = target_scaler.transform(target).astype(np.float32).ravel()
+
+    window = np.arange(sequence_length)
+
+    def windows(starts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return scaled_features[starts[:, None] + window], scaled_target[starts + sequence_length]
+
+    X_train, y_train = windows(np.concatenate(train_idx))
+    X_val, y_val = windows(np.concatenate(val_idx))
+    return X_train, y_train, X_val, y_val, feature_scaler, target_scaler
+
+
+def trial_id(config: Dict, group: Optional[str]) -> str:
+    payload = json.dumps({"config": config, "group": group}, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+
+def run_trial(trial: Dict, sweep_dir: str, dataset_name: str, group_by: Optional[str],
+              epochs: int, val_fraction: float) -> Dict:
+    """Train one configuration in the current worker and persist its result."""
+    from carbon_emission_forecaster import CarbonPredictorLSTM
+
+    trial_dir = os.path.join(sweep_dir, trial["id"])
+    os.makedirs(trial_dir, exist_ok=True)
+    config = dict(trial["config"])
+    batch_size = int(config.pop("batch_size"))
+
+    started = time.perf_counter()
+    X_train, y_train, X_val, y_val, feature_scaler, target_scaler = prepare_training_data(
+        dataset_name, group_by, trial["group"], sequence_length=SEQUENCE_LENGTH, val_fraction=val_fraction
+    )
+    predictor = CarbonPredictorLSTM(sequence_length=SEQUENCE_LENGTH, feature_count=X_train.shape[2], hparams=config)
+    predictor.feature_scaler = feature_scaler
+    predictor.target_scaler = target_scaler
+    history = predictor.train_graph(X_train, y_train, X_val, y_val, epochs=epochs, batch_size=batch_size,
+                                    output_dir=trial_dir, verbose=0)
+
+    val_loss = history.history["val_loss"]
+    best_epoch = int(np.argmin(val_loss))
+    result = {
+        "id": trial["id"],
+        "group": trial["group"],
+        "config": trial["config"],
+        "val_loss": float(val_loss[best_epoch]),
+        "val_mae": float(history.history["val_mae"][best_epoch]),
+        "best_epoch": best_epoch + 1,
+        "epochs_run": len(val_loss),
+        "train_samples": int(len(X_train)),
+        "val_samples": int(len(X_val)),
+        "train_time_s": time.perf_counter() - started,
+    }
+    # Written last and atomically: its presence marks the trial as complete for resume.
+    tmp_path = os.path.join(trial_dir, "result.json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump(result, fh, indent=2)
+    os.replace(tmp_path, os.path.join(trial_dir, "result.json"))
+    return result
+
+
+def expand_trials(grid: Dict[str, List], groups: List[Optional[str]]) -> List[Dict]:
+    keys = sorted(grid)
+    trials = []
+    for values in itertools.product(*(grid[k] for k in keys)):
+        config = dict(zip(keys, values))
+        for group in groups:
+            trials.append({"id": trial_id(config, group), "config": config, "group": group})
+    return trials
+
+
+def load_results(sweep_dir: str) -> List[Dict]:
+    results = []
+    if not os.path.isdir(sweep_dir):
+        return results
+    for entry in sorted(os.listdir(sweep_dir)):
+        path = os.path.join(sweep_dir, entry, "result.json")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as fh:
+                results.append(json.load(fh))
+    return results
+
+
+def write_leaderboard(sweep_dir: str) -> List[Dict]:
+    """
+    Rank the completed trials by validation loss within each group. Each group
+    has its own scalers, so losses of different groups are not comparable.
+    """
+    results = sorted(load_results(sweep_dir), key=lambda r: (r["group"] or "", r["val_loss"]))
+    for r in results:
+        r["rank"] = 1 + sum(1 for other in results if other["group"] == r["group"] and other["val_loss"] < r["val_loss"])
+    with open(os.path.join(sweep_dir, "leaderboard.json"), "w", encoding="utf-8") as fh:
+        json.dump(results, fh, indent=2)
+
+    config_keys = sorted({key for r in results for key in r["config"]})
+    with open(os.path.join(sweep_dir, "leaderboard.csv"), "w", encoding="utf-8", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["rank", "id", "group", *config_keys, "val_loss", "val_mae", "best_epoch", "train_time_s"])
+        for r in results:
+            writer.writerow([r["rank"], r["id"], r["group"] or "", *(r["config"].get(k) for k in config_keys),
+                             r["val_loss"], r["val_mae"], r["best_epoch"], round(r["train_time_s"], 1)])
+    return results
+
+
+def run_sweep(grid: Dict[str, List], sweep_dir: str = DEFAULT_SWEEP_DIR, dataset_name: str = DEFAULT_DATASET,
+              group_by: Optional[str] = None, epochs: int = 100, val_fraction: float = 0.2,
+              workers: Optional[int] = None, threads_per_worker: Optional[int] = None) -> List[Dict]:
+    from data_loader import load_dataset
+
+    dataset = load_dataset(dataset_name)
+    groups: List[Optional[str]] = [None]
+    if group_by:
+        groups = sorted(dataset.categories(group_by))
+    usable = []
+    for group in groups:
+        if split_windows(dataset, group_by, group, SEQUENCE_LENGTH, val_fraction)[1]:
+            usable.append(group)
+        else:
+            logger.warning(f"Skipping group {group!r}: no country has more than {SEQUENCE_LENGTH + 1} rows of "
+                           f"history, so there is no training and validation window")
+    groups = usable
+
+    os.makedirs(sweep_dir, exist_ok=True)
+    trials = expand_trials(grid, groups)
+    done = {r["id"] for r in load_results(sweep_dir)}
+    pending = [t for t in trials if t["id"] not in done]
+    logger.info(f"{len(trials)} trials ({len(done & {t['id'] for t in trials})} already complete, {len(pending)} to run)")
+
+    cores = os.cpu_count() or 1
+    workers = max(1, min(workers or cores, len(pending) or 1))
+    threads_per_worker = threads_per_worker or max(1, cores // workers)
+    logger.info(f"Running on {workers} workers x {threads_per_worker} TF threads")
+
+    if pending:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(threads_per_worker,)) as pool:
+            futures = {
+                pool.submit(run_trial, trial, sweep_dir, dataset_name, group_by, epochs, val_fraction): trial
+                for trial in pending
+            }
+            for future in as_completed(futures):
+                trial = futures[future]
+                try:
+                    result = future.result()
+                    logger.info(f"Trial {trial['id']} (group={trial['group']}) val_loss={result['val_loss']:.5f} "
+                                f"in {result['train_time_s']:.0f}s")
+                except Exception as e:
+                    # Leave no result.json so the trial is retried on the next run.
+                    logger.error(f"Trial {trial['id']} failed: {e}")
+
+    return write_leaderboard(sweep_dir)
+
+
+if __name__ == "__main__":
+    from carbon_emission_forecaster import DEFAULT_HPARAMS
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Parallel hyperparameter sweep for the Bi-LSTM forecaster.")
+    parser.add_argument("--sweep-dir", default=DEFAULT_SWEEP_DIR, help="Trial checkpoints and leaderboard location")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET)
+    parser.add_argument("--group-by", help="Train one model per value of this category column (e.g. 'GDP Category')")
+    parser.add_argument("--epochs", type=int, default=100)
+    parser.add_argument("--val-fraction", type=float, default=0.2)
+    parser.add_argument("--workers", type=int, help="Concurrent trials (default: all cores)")
+    parser.add_argument("--threads-per-worker", type=int, help="TF threads per trial (default: cores / workers)")
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[32])
+    for name, default in DEFAULT_HPARAMS.items():
+        arg_type = float if isinstance(default, float) else int
+        parser.add_argument(f"--{name.replace('_', '-')}", type=arg_type, nargs="+", default=[default])
+    args = parser.parse_args()
+
+    search_grid = {name: getattr(args, name) for name in DEFAULT_HPARAMS}
+    search_grid["batch_size"] = args.batch_size
+
+    leaderboard = run_sweep(search_grid, args.sweep_dir, args.dataset, args.group_by, args.epochs,
+                            args.val_fraction, args.workers, args.threads_per_worker)
+    for r in leaderboard:
+        if r["rank"] <= 10:
+            print(f"{r['rank']:>3}. {r['id']} group={r['group'] or '-':<12} val_loss={r['val_loss']:.5f} "
+                  f"config={r['config']}")
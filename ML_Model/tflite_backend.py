@@ -0,0 +1,80 @@
+import json
+import logging
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger('CarbonTrack_DeepLearning')
+
+DEFAULT_TFLITE_MODEL = "weights/carbon_lstm_v2_float16.tflite"
+DEFAULT_SCALER_PARAMS = "weights/scalers.json"
+
+
+def _interpreter_class():
+    """
+    Resolve the lightest available TFLite interpreter. The standalone runtimes
+    avoid loading the full TensorFlow package; TF itself is the last resort.
+    """
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    import tensorflow as tf
+    return tf.lite.Interpreter
+
+
+def export_scaler_params(feature_scaler, target_scaler, path: str = DEFAULT_SCALER_PARAMS) -> None:
+    """Persist fitted MinMaxScaler parameters as plain JSON so serving does not need sklearn."""
+    params = {
+        "feature_scale": feature_scaler.scale_.tolist(),
+        "feature_min": feature_scaler.min_.tolist(),
+        "target_scale": target_scaler.scale_.tolist(),
+        "target_min": target_scaler.min_.tolist(),
+    }
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(params, fh)
+
+
+class TFLiteForecastBackend:
+    """
+    Lightweight inference backend for the exported forecaster. Runs the
+    quantized `.tflite` graph with NumPy-only pre/post scaling, mirroring the
+    MinMaxScaler transforms applied by `CarbonPredictorLSTM.predict_deployment`.
+    """
+    def __init__(self, model_path: str = DEFAULT_TFLITE_MODEL, scaler_path: str = DEFAULT_SCALER_PARAMS,
+                 num_threads: Optional[int] = None):
+        with open(scaler_path, "r", encoding="utf-8") as fh:
+            params = json.load(fh)
+        self.feature_scale = np.asarray(params["feature_scale"], dtype=np.float32)
+        self.feature_min = np.asarray(params["feature_min"], dtype=np.float32)
+        self.target_scale = float(params["target_scale"][0])
+        self.target_min = float(params["target_min"][0])
+
+        self.interpreter = _interpreter_class()(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        logger.info(f"TFLite backend ready: {model_path} (input {tuple(self._input['shape'])})")
+
+    def predict_scaled(self, tensor_input: np.ndarray) -> np.ndarray:
+        """Run the graph on already-scaled input of shape (batch, seq_len, features)."""
+        outputs = []
+        # The converted graph has a fixed batch dimension of 1.
+        for sample in tensor_input.astype(np.float32, copy=False):
+            self.interpreter.set_tensor(self._input["index"], sample[np.newaxis, ...])
+            self.interpreter.invoke()
+            outputs.append(self.interpreter.get_tensor(self._output["index"])[0])
+        return np.asarray(outputs, dtype=np.float32)
+
+    def predict(self, recent_sequence) -> float:
+        """Forecast the next target value (kg CO2e) from a raw (seq_len, features) window."""
+        window = np.asarray(recent_sequence, dtype=np.float32)
+        scaled_input = window * self.feature_scale + self.feature_min
+        scaled_prediction = self.predict_scaled(scaled_input[np.newaxis, ...])
+        return float((scaled_prediction[0][0] - self.target_min) / self.target_scale)
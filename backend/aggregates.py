@@ -0,0 +1,373 @@
+"""
+Precomputed activity aggregates for comparative analytics.
+
+`activity_aggregates` holds the summed MonthlyData activity columns per
+(panchayat, firm type, year, month). Emissions and offsets are linear in the
+activity data, so any total can be computed from these sums and the current
+EmissionFactors - editing a factor never requires a recompute.
+
+The table is kept current incrementally: ORM flush events on MonthlyData
+(insert/update/delete) and User (firm_type changes) apply the row's delta in
+the same transaction as the write. Bulk loaders that bypass the ORM call
+`apply_deltas` themselves, and
+
+    python aggregates.py --rebuild    # recompute the table from monthly_data
+    python aggregates.py --verify     # compare the table with monthly_data
+
+repairs or checks it.
+"""
+import argparse
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, case, delete, event, func, inspect, literal, select, tuple_, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from cache import AGGREGATES_VERSION, bump_version
+from calculations import calculate_emissions, get_emission_factors
+from models import ActivityAggregate, DataVersion, MonthlyData, Panchayat, User
+
+ACTIVITY_COLUMNS = (
+    "electricity_kwh", "diesel_liters", "petrol_liters", "waste_kg",
+    "water_liters", "solar_units", "trees_planted",
+)
+MONTH_NUMBERS = {
+    "Jan": 1, "Feb": 2, "Mar": 3, "Apr": 4, "May": 5, "Jun": 6,
+    "Jul": 7, "Aug": 8, "Sep": 9, "Oct": 10, "Nov": 11, "Dec": 12,
+}
+# Key value stored for data without a panchayat / users without a firm type
+UNKNOWN = ""
+DIMENSIONS = ("panchayat", "firm_type")
+
+# (panchayat_id, firm_type, year, month)
+AggregateKey = Tuple[str, str, int, str]
+
+aggregates = ActivityAggregate.__table__
+data_versions = DataVersion.__table__
+# data_versions row bumped on every change to activity_aggregates
+VERSION_NAME = AGGREGATES_VERSION
+
+
+def _new_delta() -> List[float]:
+    # one slot per activity column, plus record_count
+    return [0.0] * (len(ACTIVITY_COLUMNS) + 1)
+
+
+def add_row(deltas: Dict[AggregateKey, List[float]], key: AggregateKey, values: dict, sign: int = 1) -> None:
+    """Accumulate one MonthlyData row (as a column -> value mapping) into `deltas`."""
+    delta = deltas.setdefault(key, _new_delta())
+    for i, column in enumerate(ACTIVITY_COLUMNS):
+        delta[i] += sign * (values.get(column) or 0)
+    delta[-1] += sign
+
+
+def make_key(panchayat_id: Optional[str], firm_type: Optional[str], year: int, month: str) -> AggregateKey:
+    return (panchayat_id or UNKNOWN, firm_type or UNKNOWN, year, month)
+
+
+def apply_deltas(conn: Connection, deltas: Dict[AggregateKey, List[float]]) -> None:
+    """Add accumulated deltas to activity_aggregates, creating and dropping key rows as needed."""
+    rows = []
+    for (panchayat_id, firm_type, year, month), delta in deltas.items():
+        if not any(delta):
+            continue
+        row = {
+            "panchayat_id": panchayat_id, "firm_type": firm_type, "year": year, "month": month,
+            "month_number": MONTH_NUMBERS.get(month, 0), "record_count": int(delta[-1]),
+            "updated_at": datetime.utcnow(),
+        }
+        row.update(zip(ACTIVITY_COLUMNS, delta))
+        rows.append(row)
+    if not rows:
+        return
+
+    dialect = conn.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(aggregates)
+        summed = ACTIVITY_COLUMNS + ("record_count",)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["panchayat_id", "firm_type", "year", "month"],
+            set_={**{column: aggregates.c[column] + stmt.excluded[column] for column in summed},
+                  "updated_at": stmt.excluded.updated_at},
+        )
+        conn.execute(stmt, rows)
+    else:
+        for row in rows:
+            key_match = and_(*(aggregates.c[column] == row[column]
+                               for column in ("panchayat_id", "firm_type", "year", "month")))
+            values = {column: aggregates.c[column] + row[column] for column in ACTIVITY_COLUMNS + ("record_count",)}
+            result = conn.execute(update(aggregates).where(key_match).values(updated_at=row["updated_at"], **values))
+            if result.rowcount == 0:
+                conn.execute(aggregates.insert().values(**row))
+
+    # A key whose last record went away (or moved) is removed rather than left at zero; only
+    # the keys just touched are checked, so a write never scans the whole table.
+    key_columns = [aggregates.c[column] for column in ("panchayat_id", "firm_type", "year", "month")]
+    touched = [(row["panchayat_id"], row["firm_type"], row["year"], row["month"]) for row in rows if row["record_count"] < 0]
+    if touched:
+        conn.execute(delete(aggregates).where(aggregates.c.record_count <= 0, tuple_(*key_columns).in_(touched)))
+    bump_data_version(conn)
+
+
+def bump_data_version(conn: Connection) -> None:
+    """Record that activity_aggregates changed, so in-memory rollups reload (in every worker)."""
+    bump_version(conn, VERSION_NAME)
+
+
+def data_version(conn) -> int:
+    """Current aggregate version (0 before the first change); `conn` may be a Connection or Session."""
+    return conn.execute(select(data_versions.c.version).where(data_versions.c.name == VERSION_NAME)).scalar() or 0
+
+
+def _firm_type(conn: Connection, user_id: Optional[str]) -> Optional[str]:
+    if user_id is None:
+        return None
+    return conn.execute(select(User.firm_type).where(User.id == user_id)).scalar()
+
+
+def _old_values(target: MonthlyData) -> dict:
+    """Column values of `target` as they were before the pending flush."""
+    state = inspect(target)
+    values = {}
+    for column in ACTIVITY_COLUMNS + ("user_id", "panchayat_id", "year", "month"):
+        history = state.attrs[column].history
+        values[column] = history.deleted[0] if history.deleted else getattr(target, column)
+    return values
+
+
+def _new_values(target: MonthlyData) -> dict:
+    return {column: getattr(target, column) for column in ACTIVITY_COLUMNS + ("user_id", "panchayat_id", "year", "month")}
+
+
+@event.listens_for(MonthlyData, "after_insert")
+def _monthly_data_inserted(mapper, connection, target):
+    values = _new_values(target)
+    deltas = {}
+    add_row(deltas, make_key(values["panchayat_id"], _firm_type(connection, values["user_id"]),
+                             values["year"], values["month"]), values)
+    apply_deltas(connection, deltas)
+
+
+@event.listens_for(MonthlyData, "after_update")
+def _monthly_data_updated(mapper, connection, target):
+    old, new = _old_values(target), _new_values(target)
+    if old == new:
+        return
+    deltas = {}
+    add_row(deltas, make_key(old["panchayat_id"], _firm_type(connection, old["user_id"]),
+                             old["year"], old["month"]), old, sign=-1)
+    add_row(deltas, make_key(new["panchayat_id"], _firm_type(connection, new["user_id"]),
+                             new["year"], new["month"]), new)
+    apply_deltas(connection, deltas)
+
+
+@event.listens_for(MonthlyData, "after_delete")
+def _monthly_data_deleted(mapper, connection, target):
+    values = _old_values(target)
+    deltas = {}
+    add_row(deltas, make_key(values["panchayat_id"], _firm_type(connection, values["user_id"]),
+                             values["year"], values["month"]), values, sign=-1)
+    apply_deltas(connection, deltas)
+
+
+@event.listens_for(User, "after_update")
+def _user_updated(mapper, connection, target):
+    """Changing a user's firm type moves all of their data to other aggregate keys."""
+    history = inspect(target).attrs.firm_type.history
+    if not history.deleted:
+        return
+    old_type, new_type = history.deleted[0], target.firm_type
+    if (old_type or UNKNOWN) == (new_type or UNKNOWN):
+        return
+    sums = [func.sum(MonthlyData.__table__.c[column]).label(column) for column in ACTIVITY_COLUMNS]
+    result = connection.execute(
+        select(MonthlyData.panchayat_id, MonthlyData.year, MonthlyData.month,
+               func.count().label("record_count"), *sums)
+        .where(MonthlyData.user_id == target.id)
+        .group_by(MonthlyData.panchayat_id, MonthlyData.year, MonthlyData.month)
+    )
+    deltas = {}
+    for row in result.mappings():
+        for firm_type, sign in ((old_type, -1), (new_type, 1)):
+            delta = deltas.setdefault(make_key(row["panchayat_id"], firm_type, row["year"], row["month"]), _new_delta())
+            for i, column in enumerate(ACTIVITY_COLUMNS):
+                delta[i] += sign * (row[column] or 0)
+            delta[-1] += sign * row["record_count"]
+    apply_deltas(connection, deltas)
+
+
+def _grouped_monthly_data(panchayat_prefix: Optional[str] = None):
+    """SELECT computing the aggregate rows straight from monthly_data."""
+    monthly = MonthlyData.__table__
+    panchayat_id = func.coalesce(monthly.c.panchayat_id, literal(UNKNOWN))
+    firm_type = func.coalesce(User.__table__.c.firm_type, literal(UNKNOWN))
+    month_number = case(MONTH_NUMBERS, value=monthly.c.month, else_=0)
+    query = (
+        select(
+            panchayat_id.label("panchayat_id"), firm_type.label("firm_type"),
+            monthly.c.year, monthly.c.month, month_number.label("month_number"),
+            *(func.coalesce(func.sum(monthly.c[column]), 0).label(column) for column in ACTIVITY_COLUMNS),
+            func.count().label("record_count"),
+            literal(datetime.utcnow()).label("updated_at"),
+        )
+        .select_from(monthly.outerjoin(User.__table__, User.__table__.c.id == monthly.c.user_id))
+        .group_by(panchayat_id, firm_type, monthly.c.year, monthly.c.month)
+    )
+    if panchayat_prefix is not None:
+        query = query.where(monthly.c.panchayat_id.like(panchayat_prefix + "%"))
+    return query
+
+
+def rebuild_aggregates(bind: Engine, panchayat_prefix: Optional[str] = None) -> int:
+    """
+    Recompute activity_aggregates from monthly_data; returns the number of
+    aggregate rows written. With `panchayat_prefix` only panchayats whose id
+    starts with it are recomputed (used by bulk loaders).
+    """
+    query = _grouped_monthly_data(panchayat_prefix)
+    columns = [column.name for column in query.selected_columns]
+    with bind.begin() as conn:
+        stale = delete(aggregates)
+        if panchayat_prefix is not None:
+            stale = stale.where(aggregates.c.panchayat_id.like(panchayat_prefix + "%"))
+        conn.execute(stale)
+        written = conn.execute(aggregates.insert().from_select(columns, query)).rowcount
+        bump_data_version(conn)
+        return written
+
+
+def verify_aggregates(bind: Engine, tolerance: float = 1e-6) -> List[str]:
+    """Differences between activity_aggregates and a fresh computation from monthly_data."""
+    compared = ACTIVITY_COLUMNS + ("record_count",)
+    with bind.connect() as conn:
+        expected = {(r.panchayat_id, r.firm_type, r.year, r.month): r for r in conn.execute(_grouped_monthly_data())}
+        stored = {(r.panchayat_id, r.firm_type, r.year, r.month): r for r in conn.execute(select(aggregates))}
+    problems = []
+    for key in sorted(set(expected) | set(stored), key=str):
+        want, have = expected.get(key), stored.get(key)
+        if want is None or have is None:
+            problems.append(f"{key}: {'unexpected' if want is None else 'missing'} aggregate row")
+            continue
+        for column in compared:
+            a, b = getattr(want, column) or 0, getattr(have, column) or 0
+            if abs(a - b) > tolerance * max(1.0, abs(a)):
+                problems.append(f"{key}: {column} is {b}, expected {a}")
+    return problems
+
+
+def get_comparative_footprints(
+    db: Session,
+    year: int,
+    dimension: str = "panchayat",
+    state: Optional[str] = None,
+    district: Optional[str] = None,
+    sort: str = "net",
+) -> dict:
+    """
+    Rank panchayats (or firm types) by net footprint for `year`, with per-capita
+    values and the change against the previous year. Reads only
+    activity_aggregates (one row per key and month), never monthly_data.
+    """
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"dimension must be one of {', '.join(DIMENSIONS)}")
+
+    group_column = ActivityAggregate.panchayat_id if dimension == "panchayat" else ActivityAggregate.firm_type
+    sums = [func.sum(getattr(ActivityAggregate, column)).label(column) for column in ACTIVITY_COLUMNS]
+    query = (
+        db.query(group_column.label("key"), ActivityAggregate.year,
+                 func.sum(ActivityAggregate.record_count).label("record_count"), *sums)
+        .filter(ActivityAggregate.year.in_((year, year - 1)))
+        .group_by(group_column, ActivityAggregate.year)
+    )
+    panchayats = db.query(Panchayat)
+    if state:
+        panchayats = panchayats.filter(Panchayat.state == state)
+    if district:
+        panchayats = panchayats.filter(Panchayat.district == district)
+    panchayats = {p.id: p for p in panchayats.all()}
+    if state or district:
+        query = query.filter(ActivityAggregate.panchayat_id.in_(list(panchayats)))
+
+    emission_factors = get_emission_factors(db)
+    current: Dict[str, dict] = {}
+    previous: Dict[str, float] = {}
+    for row in query.all():
+        totals = calculate_emissions(row, emission_factors)
+        if row.year == year:
+            current[row.key] = {"totals": totals, "record_count": row.record_count}
+        else:
+            previous[row.key] = totals["net_footprint"]
+
+    # Every panchayat in scope is ranked, including those that reported nothing this year.
+    if dimension == "panchayat":
+        for panchayat_id in panchayats:
+            current.setdefault(panchayat_id, None)
+
+    entries = []
+    for key, value in current.items():
+        totals = value["totals"] if value else {"total_emissions": 0.0, "total_offsets": 0.0, "net_footprint": 0.0}
+        entry = {
+            "key": key or None,
+            "name": key or "Unassigned",
+            "state": None,
+            "district": None,
+            "population": None,
+            "record_count": value["record_count"] if value else 0,
+            "total_emissions": totals["total_emissions"],
+            "total_offsets": totals["total_offsets"],
+            "net_footprint": totals["net_footprint"],
+            "per_capita_net": None,
+            "previous_net_footprint": previous.get(key),
+            "yoy_change_pct": None,
+        }
+        panchayat = panchayats.get(key) if dimension == "panchayat" else None
+        if panchayat is not None:
+            entry.update(name=panchayat.name, state=panchayat.state, district=panchayat.district,
+                         population=panchayat.total_population)
+            if panchayat.total_population:
+                entry["per_capita_net"] = totals["net_footprint"] / panchayat.total_population
+        prev = entry["previous_net_footprint"]
+        if prev:
+            entry["yoy_change_pct"] = (totals["net_footprint"] - prev) / abs(prev) * 100
+        entries.append(entry)
+
+    # Rank 1 is the largest footprint; entries without a population have no per-capita rank.
+    for rank, entry in enumerate(sorted(entries, key=lambda e: e["net_footprint"], reverse=True), start=1):
+        entry["rank"] = rank
+    with_population = [e for e in entries if e["per_capita_net"] is not None]
+    for rank, entry in enumerate(sorted(with_population, key=lambda e: e["per_capita_net"], reverse=True), start=1):
+        entry["per_capita_rank"] = rank
+
+    if sort == "per_capita":
+        entries.sort(key=lambda e: (e.get("per_capita_rank") is None, e.get("per_capita_rank") or 0, e["rank"]))
+    else:
+        entries.sort(key=lambda e: e["rank"])
+
+    return {"year": year, "previous_year": year - 1, "dimension": dimension, "entries": entries}
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Maintain the activity_aggregates table.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--rebuild", action="store_true", help="Recompute the table from monthly_data")
+    group.add_argument("--verify", action="store_true", help="Compare the table with monthly_data")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        print(f"✅ Rebuilt activity_aggregates: {rebuild_aggregates(engine)} rows")
+    else:
+        problems = verify_aggregates(engine)
+        for problem in problems[:50]:
+            print(f"  {problem}")
+        if problems:
+            print(f"❌ {len(problems)} aggregate mismatches; run `python aggregates.py --rebuild`")
+            sys.exit(1)
+        print("✅ activity_aggregates matches monthly_data")
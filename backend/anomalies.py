@@ -0,0 +1,237 @@
+"""
+Online anomaly detection for MonthlyData submissions.
+
+Each user keeps running Welford statistics (count, mean, M2) of log1p(value)
+per activity field in `activity_stats`. A submitted value is scored against
+its user's statistics in O(1) - one row per field, no history scan - and
+values more than ANOMALY_Z_THRESHOLD standard deviations away (in log space,
+so a 10x spike or a misplaced digit stands out however large the firm) are
+recorded in `anomaly_flags` for an admin to review. Flagged values stay out of
+the statistics (and out of AI prompts) until an admin marks them valid.
+
+Zero values are neither scored nor counted: many firms legitimately report no
+diesel or solar at all. trees_planted is not scored since planting drives make
+spikes normal.
+
+    python anomalies.py --rebuild    # recompute activity_stats from monthly_data
+"""
+import argparse
+import math
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from metrics import ANOMALY_FLAGS
+from models import ActivityStats, AnomalyFlag, MonthlyData
+
+SCORED_FIELDS = ("electricity_kwh", "diesel_liters", "petrol_liters", "waste_kg", "water_liters", "solar_units")
+Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "4"))
+# Values are only scored once the user has this many earlier values for the field.
+MIN_HISTORY = int(os.getenv("ANOMALY_MIN_HISTORY", "6"))
+# Floor for the standard deviation in log space (about +/-10%), so very regular users are not flagged for noise.
+MIN_STD = 0.1
+
+OPEN, VALID, INVALID = "open", "valid", "invalid"
+# Flag statuses whose value is kept out of the statistics
+EXCLUDED = (OPEN, INVALID)
+
+
+def _transform(value: Optional[float]) -> Optional[float]:
+    return math.log1p(value) if value and value > 0 else None
+
+
+def _add(stats: ActivityStats, x: float) -> None:
+    stats.count += 1
+    delta = x - stats.mean
+    stats.mean += delta / stats.count
+    stats.m2 += delta * (x - stats.mean)
+
+
+def _remove(stats: ActivityStats, x: float) -> None:
+    """Inverse Welford step: take one earlier value back out."""
+    if stats.count <= 1:
+        stats.count, stats.mean, stats.m2 = 0, 0.0, 0.0
+        return
+    previous_mean = (stats.count * stats.mean - x) / (stats.count - 1)
+    stats.m2 = max(0.0, stats.m2 - (x - previous_mean) * (x - stats.mean))
+    stats.mean = previous_mean
+    stats.count -= 1
+
+
+def z_score(stats: Optional[ActivityStats], x: float) -> Optional[float]:
+    """Standardised distance of x from the user's history, or None without enough history."""
+    if stats is None or stats.count < MIN_HISTORY:
+        return None
+    std = math.sqrt(stats.m2 / (stats.count - 1))
+    return (x - stats.mean) / max(std, MIN_STD)
+
+
+def _load_stats(db: Session, user_id: str) -> Dict[str, ActivityStats]:
+    return {stats.field: stats for stats in db.query(ActivityStats).filter(ActivityStats.user_id == user_id)}
+
+
+def _flags_by_field(db: Session, monthly_data_id: str) -> Dict[str, AnomalyFlag]:
+    return {flag.field: flag for flag in db.query(AnomalyFlag).filter(AnomalyFlag.monthly_data_id == monthly_data_id)}
+
+
+def score_entry(db: Session, entry: MonthlyData, previous: Optional[dict] = None) -> List[AnomalyFlag]:
+    """
+    Score a created (or, with `previous` field values, updated) entry and fold
+    its unflagged values into the user's statistics. The entry must have been
+    flushed; changes are added to the session for the caller to commit.
+    """
+    stats = _load_stats(db, entry.user_id)
+    old_flags = _flags_by_field(db, entry.id) if previous is not None else {}
+    flags = []
+    for field in SCORED_FIELDS:
+        value = getattr(entry, field)
+        if previous is not None:
+            if previous.get(field) == value:
+                continue
+            # The old value is replaced: take it out of the statistics and drop its flag.
+            old_flag = old_flags.get(field)
+            old = _transform(previous.get(field))
+            if old is not None and field in stats and (old_flag is None or old_flag.status == VALID):
+                _remove(stats[field], old)
+            if old_flag is not None:
+                db.delete(old_flag)
+
+        x = _transform(value)
+        if x is None:
+            continue
+        field_stats = stats.get(field)
+        if field_stats is None:
+            field_stats = stats[field] = ActivityStats(user_id=entry.user_id, field=field, count=0, mean=0.0, m2=0.0)
+            db.add(field_stats)
+
+        z = z_score(field_stats, x)
+        if z is not None and abs(z) > Z_THRESHOLD:
+            flag = AnomalyFlag(
+                monthly_data_id=entry.id, user_id=entry.user_id, panchayat_id=entry.panchayat_id,
+                field=field, value=value, expected=math.expm1(field_stats.mean), z_score=z, status=OPEN,
+            )
+            db.add(flag)
+            flags.append(flag)
+            ANOMALY_FLAGS.inc(field)
+        else:
+            _add(field_stats, x)
+    return flags
+
+
+def forget_entry(db: Session, entry: MonthlyData) -> None:
+    """Take a deleted entry's values out of the statistics and remove its flags (call before deleting it)."""
+    stats = _load_stats(db, entry.user_id)
+    flags = _flags_by_field(db, entry.id)
+    for field in SCORED_FIELDS:
+        x = _transform(getattr(entry, field))
+        flag = flags.get(field)
+        if x is not None and field in stats and (flag is None or flag.status == VALID):
+            _remove(stats[field], x)
+    # Bulk delete runs immediately, so the flags are gone before the entry itself is deleted.
+    db.query(AnomalyFlag).filter(AnomalyFlag.monthly_data_id == entry.id).delete(synchronize_session=False)
+
+
+def resolve_flag(db: Session, flag: AnomalyFlag, status: str, resolved_by: str) -> AnomalyFlag:
+    """Mark a flag valid (the value is real and joins the statistics) or invalid (a data error)."""
+    if status not in (VALID, INVALID):
+        raise ValueError(f"status must be '{VALID}' or '{INVALID}'")
+    x = _transform(flag.value)
+    if x is not None and (flag.status == VALID) != (status == VALID):
+        stats = _load_stats(db, flag.user_id).get(flag.field)
+        if stats is None:
+            stats = ActivityStats(user_id=flag.user_id, field=flag.field, count=0, mean=0.0, m2=0.0)
+            db.add(stats)
+        if status == VALID:
+            _add(stats, x)
+        else:
+            _remove(stats, x)
+    flag.status = status
+    flag.resolved_by = resolved_by
+    flag.resolved_at = datetime.utcnow()
+    return flag
+
+
+def excluded_entries():
+    """Subquery of MonthlyData ids with an open or invalid flag."""
+    return select(AnomalyFlag.monthly_data_id).where(AnomalyFlag.status.in_(EXCLUDED))
+
+
+def _upsert_stats(conn: Connection, rows: List[dict]) -> None:
+    """Write rebuilt stats rows, overwriting any a concurrent score_entry created for the same key meanwhile."""
+    stats = ActivityStats.__table__
+    dialect = conn.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        stmt = upsert(stats)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "field"],
+            set_={column: stmt.excluded[column] for column in ("count", "mean", "m2", "updated_at")},
+        )
+        conn.execute(stmt, rows)
+        return
+    for row in rows:
+        key_match = (stats.c.user_id == row["user_id"]) & (stats.c.field == row["field"])
+        values = {column: row[column] for column in ("count", "mean", "m2", "updated_at")}
+        if conn.execute(update(stats).where(key_match).values(**values)).rowcount == 0:
+            conn.execute(insert(stats).values(**row))
+
+
+def rebuild_stats(bind: Engine, panchayat_prefix: Optional[str] = None) -> int:
+    """
+    Recompute activity_stats from monthly_data (leaving out flagged values);
+    returns the number of stats rows. With `panchayat_prefix` only users with
+    data in matching panchayats are recomputed (used by bulk loaders), from
+    all of their data, wherever it was submitted.
+    """
+    monthly = MonthlyData.__table__
+    query = select(monthly.c.id, monthly.c.user_id, *(monthly.c[field] for field in SCORED_FIELDS))
+    affected_users = None
+    if panchayat_prefix is not None:
+        affected_users = (select(monthly.c.user_id).distinct()
+                          .where(monthly.c.panchayat_id.like(panchayat_prefix + "%")))
+        query = query.where(monthly.c.user_id.in_(affected_users))
+
+    with bind.begin() as conn:
+        excluded = {tuple(row) for row in conn.execute(
+            select(AnomalyFlag.monthly_data_id, AnomalyFlag.field).where(AnomalyFlag.status.in_(EXCLUDED))
+        )}
+        running: Dict[tuple, List[float]] = {}
+        for row in conn.execution_options(stream_results=True, yield_per=10000).execute(query):
+            for field in SCORED_FIELDS:
+                x = _transform(row._mapping[field])
+                if x is None or (row.id, field) in excluded:
+                    continue
+                acc = running.get((row.user_id, field))
+                if acc is None:
+                    acc = running[(row.user_id, field)] = [0, 0.0, 0.0]
+                acc[0] += 1
+                delta = x - acc[1]
+                acc[1] += delta / acc[0]
+                acc[2] += delta * (x - acc[1])
+
+        stale = delete(ActivityStats.__table__)
+        if affected_users is not None:
+            stale = stale.where(ActivityStats.user_id.in_(affected_users))
+        conn.execute(stale)
+        now = datetime.utcnow()
+        rows = [{"user_id": user_id, "field": field, "count": n, "mean": mean, "m2": m2, "updated_at": now}
+                for (user_id, field), (n, mean, m2) in running.items()]
+        if rows:
+            _upsert_stats(conn, rows)
+    return len(rows)
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Maintain the per-user activity statistics used for anomaly detection.")
+    parser.add_argument("--rebuild", action="store_true", required=True, help="Recompute activity_stats from monthly_data")
+    parser.parse_args()
+    print(f"✅ Rebuilt activity_stats: {rebuild_stats(engine)} rows")
@@ -0,0 +1,8 @@
+"""
+Benchmarks for the CarbonTrackHub backend.
+
+Run from the `backend/` directory so the flat backend modules are importable:
+
+    python -m benchmarks.load_test --panchayats 20 --users 50 --months 24
+    python -m benchmarks.load_test --compare results/a.json results/b.json
+"""
@@ -0,0 +1,281 @@
+"""
+Microbenchmarks for the analytics functions in calculations.py.
+
+    python -m benchmarks.calculations_bench                      # run and check against baselines
+    python -m benchmarks.calculations_bench --sizes small medium
+    python -m benchmarks.calculations_bench --update-baseline    # record new baselines
+
+Each function runs against an in-memory SQLite database populated with the
+synthetic benchmark dataset at several sizes. Each case is timed `--repeats`
+times, interleaved with the other cases and with the cyclic GC disabled, using
+a fresh session per run (as a request would have); memory is the tracemalloc
+peak of one extra, separately traced run. Results are compared with
+`baselines/calculations.json` and the command exits non-zero if the fastest
+run or the memory peak regresses beyond the tolerance.
+
+Timing baselines are normalised with a fixed calibration workload that
+exercises the same stack as the analytics functions - an ORM load of a
+private SQLite table, attribute arithmetic per row and a SQL aggregate - but
+none of the code being measured. It is timed as one more case in each size's
+round-robin, so every size is compared with its baseline relative to a
+reading taken under the same conditions, and a baseline recorded on one
+machine (or SQLAlchemy/SQLite build) can be checked on another.
+"""
+import gc
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import Column, Float, Integer, create_engine, func
+from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from benchmarks.common import BENCH_DIR, environment, write_result
+from benchmarks.dataset import populate
+
+# name -> (panchayats, firms per panchayat, months)
+SIZES: Dict[str, Tuple[int, int, int]] = {
+    "small": (2, 10, 12),
+    "medium": (5, 20, 24),
+    "large": (10, 50, 24),
+}
+BASELINE_PATH = os.path.join(BENCH_DIR, "baselines", "calculations.json")
+DEFAULT_TIME_TOLERANCE = 0.30
+DEFAULT_MEMORY_TOLERANCE = 0.15
+CALIBRATION_ROWS = 2000
+CALIBRATION_CASE = "calibration"
+
+CalibrationBase = declarative_base()
+
+
+class CalibrationRow(CalibrationBase):
+    """A table private to the calibration workload, shaped like monthly_data."""
+    __tablename__ = "calibration_rows"
+
+    id = Column(Integer, primary_key=True)
+    group = Column(Integer, index=True)
+    a = Column(Float)
+    b = Column(Float)
+    c = Column(Float)
+    d = Column(Float)
+    e = Column(Float)
+
+
+def calibration_workload():
+    """
+    A fixed ORM + SQLite workload used to normalise timings: load every row
+    through a fresh session, combine its attributes, and run a GROUP BY
+    aggregate - the same mix of costs as the functions under test.
+
+    Returns (workload, engine); dispose of the engine when done.
+    """
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    CalibrationBase.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(CalibrationRow.__table__.insert(), [
+            {"id": i, "group": i % 24, "a": i * 0.5, "b": i * 0.25, "c": i % 7, "d": i % 13, "e": i * 0.1}
+            for i in range(CALIBRATION_ROWS)
+        ])
+    SessionLocal = sessionmaker(bind=engine)
+
+    def workload() -> float:
+        with SessionLocal() as db:
+            total = 0.0
+            for row in db.query(CalibrationRow).all():
+                total += row.a * 0.716 + row.b * 2.68 + row.c * 2.32 + row.d * 0.586 - row.e * 1.81
+            for _, summed in db.query(CalibrationRow.group, func.sum(CalibrationRow.a)).group_by(CalibrationRow.group):
+                total += summed
+            return total
+
+    return workload, engine
+
+
+def make_database(size: str):
+    """Populate a private in-memory SQLite database; StaticPool shares it across sessions."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    info = populate(engine, *SIZES[size])
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine), info
+
+
+def build_cases(SessionLocal, info: dict) -> Dict[str, Callable[[], object]]:
+    from calculations import calculate_emissions, get_carbon_metrics, get_sector_emissions, get_monthly_trends
+    from models import MonthlyData, EmissionFactors
+
+    # calculate_emissions is pure: load its inputs once and time only the arithmetic.
+    setup_db = SessionLocal()
+    rows = setup_db.query(MonthlyData).all()
+    factors = setup_db.query(EmissionFactors).first()
+    setup_db.expunge_all()
+    setup_db.close()
+
+    latest_year = max(info["years"])
+
+    def with_session(fn: Callable, **filters) -> Callable[[], object]:
+        def run():
+            db = SessionLocal()
+            try:
+                return fn(db, **filters)
+            finally:
+                db.close()
+        return run
+
+    return {
+        "calculate_emissions": lambda: [calculate_emissions(row, factors) for row in rows],
+        "get_carbon_metrics": with_session(get_carbon_metrics),
+        "get_carbon_metrics[panchayat,year]": with_session(
+            get_carbon_metrics, panchayat_id="bench-panchayat-0", year=latest_year),
+        "get_sector_emissions": with_session(get_sector_emissions),
+        "get_monthly_trends": with_session(get_monthly_trends),
+    }
+
+
+def measure(cases: Dict[str, Callable[[], object]], repeats: int, warmup: int = 1) -> Dict[str, Dict[str, float]]:
+    """
+    Time every case `repeats` times, interleaved round-robin so a burst of
+    outside load is spread across cases instead of skewing one of them.
+    """
+    for fn in cases.values():
+        for _ in range(warmup):
+            fn()
+
+    durations: Dict[str, List[float]] = {name: [] for name in cases}
+    # As in timeit: collect up front and keep the cyclic GC out of the timed region.
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeats):
+            for name, fn in cases.items():
+                started = time.perf_counter()
+                fn()
+                durations[name].append(time.perf_counter() - started)
+    finally:
+        gc.enable()
+
+    stats = {}
+    for name, fn in cases.items():
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        stats[name] = {
+            "median_ms": statistics.median(durations[name]) * 1000,
+            "min_ms": min(durations[name]) * 1000,
+            "peak_kib": peak / 1024,
+        }
+    return stats
+
+
+def run_benchmarks(sizes: List[str], repeats: int) -> dict:
+    result = {
+        "benchmark": "calculations",
+        "environment": environment(),
+        "config": {"repeats": repeats, "sizes": {size: SIZES[size] for size in sizes}},
+        "results": {},
+    }
+    workload, calibration_engine = calibration_workload()
+    try:
+        for size in sizes:
+            engine, SessionLocal, info = make_database(size)
+            print(f"[{size}] {info['monthly_data']} MonthlyData rows")
+            cases = build_cases(SessionLocal, info)
+            cases[CALIBRATION_CASE] = workload
+            stats = measure(cases, repeats)
+            size_results = {"rows": info["monthly_data"], "calibration_ms": stats.pop(CALIBRATION_CASE)["min_ms"]}
+            for name, case_stats in stats.items():
+                size_results[name] = case_stats
+                print(f"  {name:<36}{case_stats['median_ms']:>10.2f} ms{case_stats['peak_kib']:>12.1f} KiB")
+            result["results"][size] = size_results
+            engine.dispose()
+    finally:
+        calibration_engine.dispose()
+    return result
+
+
+def check_against_baseline(result: dict, baseline: dict, time_tolerance: float,
+                           memory_tolerance: float) -> List[str]:
+    """Return a message for every case slower or hungrier than the baseline allows."""
+    regressions = []
+    for size, cases in result["results"].items():
+        baseline_cases = baseline["results"].get(size, {})
+        if "calibration_ms" not in baseline_cases:
+            continue
+        # Scale baseline times by how much faster/slower this run was than the baseline's.
+        speed_ratio = cases["calibration_ms"] / baseline_cases["calibration_ms"]
+        for name, stats in cases.items():
+            expected = baseline_cases.get(name)
+            if not isinstance(stats, dict) or expected is None:
+                continue
+            # The fastest run is the least noisy estimate of the code's own cost.
+            time_limit = expected["min_ms"] * speed_ratio * (1 + time_tolerance)
+            memory_limit = expected["peak_kib"] * (1 + memory_tolerance)
+            if stats["min_ms"] > time_limit:
+                regressions.append(f"{size}/{name}: {stats['min_ms']:.2f} ms > limit {time_limit:.2f} ms "
+                                   f"(baseline {expected['min_ms']:.2f} ms x{speed_ratio:.2f} speed)")
+            if stats["peak_kib"] > memory_limit:
+                regressions.append(f"{size}/{name}: peak {stats['peak_kib']:.1f} KiB > limit {memory_limit:.1f} KiB "
+                                   f"(baseline {expected['peak_kib']:.1f} KiB)")
+    return regressions
+
+
+def update_baseline(result: dict, path: str) -> None:
+    """Merge the measured sizes into the baseline file; each size carries its own calibration reading."""
+    baseline = {"results": {}}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        baseline.pop("calibration_s", None)
+        baseline["results"] = {size: cases for size, cases in baseline["results"].items() if "calibration_ms" in cases}
+    baseline["results"].update(result["results"])
+    baseline["environment"] = result["environment"]
+    baseline["config"] = result["config"]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(baseline, fh, indent=2)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Microbenchmarks for calculations.py with regression checks.")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--time-tolerance", type=float, default=DEFAULT_TIME_TOLERANCE,
+                        help="Allowed relative slowdown vs. the (speed-normalised) baseline")
+    parser.add_argument("--memory-tolerance", type=float, default=DEFAULT_MEMORY_TOLERANCE,
+                        help="Allowed relative growth of the tracemalloc peak")
+    parser.add_argument("--update-baseline", action="store_true", help="Record this run as the new baseline")
+    parser.add_argument("--output", help="Also write the full result JSON here")
+    args = parser.parse_args(argv)
+
+    result = run_benchmarks(args.sizes, args.repeats)
+    if args.output:
+        write_result(result, "calculations", args.output)
+
+    if args.update_baseline:
+        update_baseline(result, args.baseline)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one.")
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as fh:
+        baseline = json.load(fh)
+    regressions = check_against_baseline(result, baseline, args.time_tolerance, args.memory_tolerance)
+    if regressions:
+        print("\nRegressions:")
+        for message in regressions:
+            print(f"  {message}")
+        return 1
+    print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""Helpers shared by the benchmark scripts."""
+import os
+import json
+import math
+import platform
+import subprocess
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+DATA_DIR = os.path.join(BENCH_DIR, ".data")
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return float(sorted_values[min(rank, len(sorted_values)) - 1])
+
+
+def latency_summary(samples_s: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/mean/max in milliseconds for a list of durations in seconds."""
+    ordered = sorted(samples_s)
+    return {
+        "p50_ms": percentile(ordered, 50) * 1000,
+        "p95_ms": percentile(ordered, 95) * 1000,
+        "p99_ms": percentile(ordered, 99) * 1000,
+        "mean_ms": (sum(ordered) / len(ordered) * 1000) if ordered else 0.0,
+        "max_ms": (ordered[-1] * 1000) if ordered else 0.0,
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> Dict[str, Optional[str]]:
+    return {
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": str(os.cpu_count()),
+        "generated_at": datetime.utcnow().isoformat(),
+    }
+
+
+def write_result(result: dict, prefix: str, output: Optional[str] = None) -> str:
+    """Write a result document as JSON (default: results/<prefix>_<rev>_<timestamp>.json)."""
+    if output is None:
+        revision = result.get("environment", {}).get("git_revision") or "worktree"
+        output = os.path.join(RESULTS_DIR, f"{prefix}_{revision}_{datetime.utcnow():%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as fh:
+        json.dump(result, fh, indent=2)
+    return output
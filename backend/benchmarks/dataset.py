@@ -0,0 +1,127 @@
+"""
+Deterministic synthetic dataset for benchmarks: panchayats x users x months of
+MonthlyData, written straight into a fresh database with bulk inserts.
+"""
+import os
+import random
+import uuid
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.engine import Engine
+
+from aggregates import rebuild_aggregates
+from database import bootstrap_schema
+from models import User, Panchayat, MonthlyData, EmissionFactors
+
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+FIRM_TYPES = ["school", "industry", "shop", "household", "other"]
+
+BENCH_ADMIN_USERNAME = "bench_admin"
+BENCH_PASSWORD = "bench-password"
+INSERT_CHUNK = 10000
+
+
+def bench_username(panchayat_index: int, user_index: int) -> str:
+    return f"bench_p{panchayat_index}_u{user_index}"
+
+
+def sqlite_url(path: str) -> str:
+    return f"sqlite:///{os.path.abspath(path)}"
+
+
+def build_dataset(path: str, panchayats: int, users: int, months: int, end_year: int = 2025,
+                  seed: int = 42) -> Dict[str, int]:
+    """Create a fresh SQLite database at `path` and populate it (see `populate`)."""
+    if os.path.exists(path):
+        os.remove(path)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    engine = create_engine(sqlite_url(path))
+    try:
+        return populate(engine, panchayats, users, months, end_year, seed)
+    finally:
+        engine.dispose()
+
+
+def populate(engine: Engine, panchayats: int, users: int, months: int, end_year: int = 2025,
+             seed: int = 42) -> Dict[str, int]:
+    """
+    Create the schema on `engine` and insert `panchayats` panchayats, `users`
+    firms per panchayat and `months` consecutive months of MonthlyData per firm
+    (ending in December of `end_year`). All firms share BENCH_PASSWORD.
+    """
+    from auth import get_password_hash
+
+    rng = random.Random(seed)
+    bootstrap_schema(engine)
+    # One hash for every account: argon2 is deliberately slow and the value is identical.
+    hashed_password = get_password_hash(BENCH_PASSWORD)
+    now = datetime.utcnow()
+
+    periods = []
+    for offset in range(months - 1, -1, -1):
+        year, month_index = end_year - offset // 12, 11 - offset % 12
+        periods.append((year, MONTHS[month_index]))
+
+    panchayat_rows: List[dict] = []
+    user_rows: List[dict] = [{
+        "id": str(uuid.uuid4()), "username": BENCH_ADMIN_USERNAME, "email": "bench_admin@example.com",
+        "hashed_password": hashed_password, "role": "admin", "panchayat_id": None,
+        "firm_type": None, "firm_name": None, "is_active": True, "created_at": now, "updated_at": now,
+    }]
+    data_rows: List[dict] = []
+    rows_written = 0
+
+    for p in range(panchayats):
+        panchayat_id = f"bench-panchayat-{p}"
+        panchayat_rows.append({
+            "id": panchayat_id, "name": f"Bench Panchayat {p}", "district": f"District {p % 14}",
+            "state": "Kerala", "total_population": rng.randint(5000, 60000),
+            "created_at": now, "updated_at": now,
+        })
+        for u in range(users):
+            firm_type = FIRM_TYPES[u % len(FIRM_TYPES)]
+            user_rows.append({
+                "id": str(uuid.uuid4()), "username": bench_username(p, u), "email": f"{bench_username(p, u)}@example.com",
+                "hashed_password": hashed_password, "role": "user", "panchayat_id": panchayat_id,
+                "firm_type": firm_type, "firm_name": f"{firm_type.title()} {p}-{u}", "is_active": True,
+                "created_at": now, "updated_at": now,
+            })
+
+    with engine.begin() as conn:
+        conn.execute(insert(EmissionFactors.__table__), [{"id": str(uuid.uuid4()), "created_at": now, "updated_at": now}])
+        conn.execute(insert(Panchayat.__table__), panchayat_rows)
+        conn.execute(insert(User.__table__), user_rows)
+
+        for user in user_rows[1:]:
+            scale = rng.uniform(0.3, 3.0)
+            for year, month in periods:
+                data_rows.append({
+                    "id": str(uuid.uuid4()), "user_id": user["id"], "panchayat_id": user["panchayat_id"],
+                    "month": month, "year": year,
+                    "electricity_kwh": round(rng.uniform(100, 1500) * scale, 2),
+                    "diesel_liters": round(rng.uniform(0, 200) * scale, 2),
+                    "petrol_liters": round(rng.uniform(0, 150) * scale, 2),
+                    "waste_kg": round(rng.uniform(10, 400) * scale, 2),
+                    "water_liters": round(rng.uniform(1000, 40000) * scale, 2),
+                    "solar_units": round(rng.uniform(0, 300), 2),
+                    "trees_planted": rng.randint(0, 5),
+                    "created_at": now, "updated_at": now,
+                })
+            if len(data_rows) >= INSERT_CHUNK:
+                conn.execute(insert(MonthlyData.__table__), data_rows)
+                rows_written += len(data_rows)
+                data_rows = []
+        if data_rows:
+            conn.execute(insert(MonthlyData.__table__), data_rows)
+            rows_written += len(data_rows)
+    rebuild_aggregates(engine)
+
+    return {
+        "panchayats": panchayats,
+        "users": panchayats * users,
+        "monthly_data": rows_written,
+        "years": sorted({year for year, _ in periods}),
+    }
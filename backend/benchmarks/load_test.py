@@ -0,0 +1,354 @@
+"""
+Reproducible load test for the API.
+
+    python -m benchmarks.load_test --panchayats 20 --users 50 --months 24 --requests 2000 --concurrency 8
+    python -m benchmarks.load_test --target uvicorn --uvicorn-workers 2
+    python -m benchmarks.load_test --compare results/load_test_a.json results/load_test_b.json
+
+A synthetic dataset (panchayats x users x months of MonthlyData) is generated
+into a fresh SQLite database, and the real FastAPI app is driven with a seeded,
+weighted mix of login, `/data/` listing, data entry and analytics calls -
+in-process through an ASGI transport and/or over HTTP against a uvicorn
+subprocess. Each target starts from an identical copy of the database. The JSON
+result holds throughput and p50/p95/p99 latency per endpoint, tagged with the
+git revision so runs can be compared between commits.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import subprocess
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from benchmarks.common import DATA_DIR, environment, latency_summary, write_result
+from benchmarks.dataset import (
+    BENCH_ADMIN_USERNAME, BENCH_PASSWORD, MONTHS, bench_username, build_dataset, sqlite_url
+)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Relative weights of each operation in the request mix.
+SCENARIO = {
+    "login": 5,
+    "list_data": 35,
+    "create_data": 15,
+    "metrics": 15,
+    "sectors": 15,
+    "trends": 15,
+}
+
+ENDPOINTS = {
+    "login": "POST /auth/login",
+    "list_data": "GET /data/",
+    "create_data": "POST /data/",
+    "metrics": "GET /analytics/metrics",
+    "sectors": "GET /analytics/sectors",
+    "trends": "GET /analytics/trends",
+}
+
+
+class VirtualUser:
+    """One simulated client session: an account, its bearer token and its own RNG."""
+    def __init__(self, username: str, is_admin: bool, seed: int):
+        self.username = username
+        self.is_admin = is_admin
+        self.rng = random.Random(seed)
+        self.headers: Dict[str, str] = {}
+
+    async def login(self, client):
+        response = await client.post("/auth/login", json={"username": self.username, "password": BENCH_PASSWORD})
+        if response.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        return response
+
+    async def perform(self, client, op: str, dataset: dict):
+        rng = self.rng
+        year = rng.choice(dataset["years"])
+        params = {"year": year}
+        if self.is_admin and rng.random() < 0.5:
+            params["panchayat_id"] = f"bench-panchayat-{rng.randrange(dataset['panchayats'])}"
+
+        if op == "login":
+            return await self.login(client)
+        if op == "list_data":
+            params.update({"page": rng.randint(1, 5), "size": 50})
+            return await client.get("/data/", params=params, headers=self.headers)
+        if op == "create_data":
+            payload = {
+                "user_id": "ignored-by-server", "month": rng.choice(MONTHS), "year": year,
+                "electricity_kwh": round(rng.uniform(100, 1500), 2), "diesel_liters": round(rng.uniform(0, 200), 2),
+                "petrol_liters": round(rng.uniform(0, 150), 2), "waste_kg": round(rng.uniform(10, 400), 2),
+                "water_liters": round(rng.uniform(1000, 40000), 2), "solar_units": round(rng.uniform(0, 300), 2),
+                "trees_planted": rng.randint(0, 5),
+            }
+            return await client.post("/data/", json=payload, headers=self.headers)
+        if op == "metrics":
+            return await client.get("/analytics/metrics", params=params, headers=self.headers)
+        if op == "sectors":
+            return await client.get("/analytics/sectors", params=params, headers=self.headers)
+        if op == "trends":
+            return await client.get("/analytics/trends", params=params, headers=self.headers)
+        raise ValueError(f"Unknown operation '{op}'")
+
+
+def _virtual_users(concurrency: int, dataset: dict, admin_ratio: float, seed: int) -> List[VirtualUser]:
+    rng = random.Random(seed)
+    admins = max(1, round(concurrency * admin_ratio)) if admin_ratio > 0 else 0
+    users = []
+    for i in range(concurrency):
+        if i < admins:
+            users.append(VirtualUser(BENCH_ADMIN_USERNAME, True, seed + i))
+        else:
+            username = bench_username(rng.randrange(dataset["panchayats"]), rng.randrange(dataset["users_per_panchayat"]))
+            users.append(VirtualUser(username, False, seed + i))
+    return users
+
+
+async def _run_phase(client, vus: List[VirtualUser], plan: List[str], dataset: dict, samples, errors) -> None:
+    """Each virtual user pulls the next operation from the shared plan until it is exhausted."""
+    ops = iter(plan)
+
+    async def worker(vu: VirtualUser):
+        for op in ops:
+            started = time.perf_counter()
+            try:
+                response = await vu.perform(client, op, dataset)
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            elapsed = time.perf_counter() - started
+            if samples is not None:
+                samples[op].append(elapsed)
+                if failed:
+                    errors[op] += 1
+
+    await asyncio.gather(*(worker(vu) for vu in vus))
+
+
+async def drive(client, dataset: dict, requests: int, warmup: int, concurrency: int, admin_ratio: float,
+                seed: int) -> dict:
+    """Log every virtual user in, run the warm-up, then the measured request mix."""
+    rng = random.Random(seed)
+    ops, weights = zip(*SCENARIO.items())
+    warmup_plan = rng.choices(ops, weights, k=warmup)
+    plan = rng.choices(ops, weights, k=requests)
+
+    vus = _virtual_users(concurrency, dataset, admin_ratio, seed)
+    for vu in vus:
+        response = await vu.login(client)
+        if response.status_code != 200:
+            raise RuntimeError(f"Login failed for {vu.username}: {response.status_code} {response.text}")
+
+    await _run_phase(client, vus, warmup_plan, dataset, None, None)
+
+    samples: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    started = time.perf_counter()
+    await _run_phase(client, vus, plan, dataset, samples, errors)
+    wall_time = time.perf_counter() - started
+
+    endpoints = {}
+    for op, durations in sorted(samples.items()):
+        endpoints[ENDPOINTS[op]] = {
+            "count": len(durations),
+            "errors": errors[op],
+            "throughput_rps": len(durations) / wall_time,
+            **latency_summary(durations),
+        }
+    all_durations = [d for durations in samples.values() for d in durations]
+    return {
+        "wall_time_s": wall_time,
+        "requests": len(all_durations),
+        "errors": sum(errors.values()),
+        "throughput_rps": len(all_durations) / wall_time,
+        "latency": latency_summary(all_durations),
+        "endpoints": endpoints,
+    }
+
+
+def _bench_env(db_path: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": sqlite_url(db_path),
+        # The startup seed syncs the admin account from these, so point them at the bench admin.
+        "ADMIN_USERNAME": BENCH_ADMIN_USERNAME,
+        "ADMIN_PASSWORD": BENCH_PASSWORD,
+    })
+    return env
+
+
+def _inprocess_child(drive_kwargs: dict) -> dict:
+    import httpx
+    from main import app
+
+    async def run():
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+                return await drive(client, **drive_kwargs)
+
+    return asyncio.run(run())
+
+
+def run_inprocess(db_path: str, **drive_kwargs) -> dict:
+    """
+    Drive the app through httpx's ASGI transport, including its startup handlers.
+    The app runs in a freshly spawned interpreter so `database` binds to the
+    benchmark DATABASE_URL rather than whatever this process imported first.
+    """
+    saved_env = dict(os.environ)
+    os.environ.update(_bench_env(db_path))
+    try:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            return pool.submit(_inprocess_child, drive_kwargs).result()
+    finally:
+        os.environ.clear()
+        os.environ.update(saved_env)
+
+
+def run_uvicorn(db_path: str, port: int, workers: int, **drive_kwargs) -> dict:
+    """Drive a uvicorn subprocess serving the app over real HTTP."""
+    import httpx
+
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(workers), "--log-level", "warning", "--no-access-log"]
+    server = subprocess.Popen(command, cwd=BACKEND_DIR, env=_bench_env(db_path))
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+            try:
+                if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError("uvicorn did not become healthy within 60s")
+            time.sleep(0.2)
+
+        async def run():
+            limits = httpx.Limits(max_connections=drive_kwargs["concurrency"])
+            async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+                return await drive(client, **drive_kwargs)
+
+        return asyncio.run(run())
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def run_load_test(panchayats: int = 10, users: int = 20, months: int = 24, requests: int = 2000,
+                  warmup: int = 100, concurrency: int = 8, admin_ratio: float = 0.25, targets=("inprocess", "uvicorn"),
+                  port: int = 8765, uvicorn_workers: int = 1, seed: int = 42) -> dict:
+    template = os.path.join(DATA_DIR, f"load_{panchayats}x{users}x{months}_seed{seed}.db")
+    started = time.perf_counter()
+    info = build_dataset(template, panchayats, users, months, seed=seed)
+    info["users_per_panchayat"] = users
+    info["build_time_s"] = time.perf_counter() - started
+    print(f"Dataset: {info['panchayats']} panchayats, {info['users']} users, "
+          f"{info['monthly_data']} MonthlyData rows in {info['build_time_s']:.1f}s")
+
+    drive_kwargs = dict(dataset=info, requests=requests, warmup=warmup, concurrency=concurrency,
+                        admin_ratio=admin_ratio, seed=seed)
+    result = {
+        "benchmark": "load_test",
+        "environment": environment(),
+        "config": {
+            "requests": requests, "warmup": warmup, "concurrency": concurrency, "admin_ratio": admin_ratio,
+            "scenario": SCENARIO, "uvicorn_workers": uvicorn_workers, "seed": seed,
+        },
+        "dataset": info,
+        "targets": {},
+    }
+    for target in targets:
+        # Every target starts from the same pristine copy: the run itself inserts data.
+        db_path = os.path.join(DATA_DIR, f"run_{target}.db")
+        shutil.copyfile(template, db_path)
+        print(f"Running {requests} requests against {target} ...")
+        if target == "inprocess":
+            result["targets"][target] = run_inprocess(db_path, **drive_kwargs)
+        else:
+            result["targets"][target] = run_uvicorn(db_path, port, uvicorn_workers, **drive_kwargs)
+    return result
+
+
+def print_report(result: dict) -> None:
+    for target, summary in result["targets"].items():
+        print(f"\n[{target}] {summary['requests']} requests in {summary['wall_time_s']:.2f}s "
+              f"-> {summary['throughput_rps']:.1f} req/s, {summary['errors']} errors")
+        print(f"  {'endpoint':<26}{'count':>7}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for endpoint, stats in summary["endpoints"].items():
+            print(f"  {endpoint:<26}{stats['count']:>7}{stats['throughput_rps']:>9.1f}{stats['p50_ms']:>10.2f}"
+                  f"{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['errors']:>8}")
+
+
+def compare(baseline_path: str, candidate_path: str) -> None:
+    """Print per-endpoint throughput and latency changes between two result files."""
+    with open(baseline_path, "r", encoding="utf-8") as fh:
+        baseline = json.load(fh)
+    with open(candidate_path, "r", encoding="utf-8") as fh:
+        candidate = json.load(fh)
+
+    def change(old: float, new: float) -> str:
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    print(f"baseline  {baseline['environment'].get('git_revision')}  ({baseline_path})")
+    print(f"candidate {candidate['environment'].get('git_revision')}  ({candidate_path})")
+    for target, new_summary in candidate["targets"].items():
+        old_summary = baseline["targets"].get(target)
+        if old_summary is None:
+            continue
+        print(f"\n[{target}] throughput {old_summary['throughput_rps']:.1f} -> {new_summary['throughput_rps']:.1f} "
+              f"req/s ({change(old_summary['throughput_rps'], new_summary['throughput_rps'])})")
+        for endpoint, new in new_summary["endpoints"].items():
+            old = old_summary["endpoints"].get(endpoint)
+            if old is None:
+                continue
+            print(f"  {endpoint:<26} p50 {old['p50_ms']:8.2f} -> {new['p50_ms']:8.2f} ({change(old['p50_ms'], new['p50_ms'])})"
+                  f"   p95 {old['p95_ms']:8.2f} -> {new['p95_ms']:8.2f} ({change(old['p95_ms'], new['p95_ms'])})")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Load-test the CarbonTrackHub API on a synthetic dataset.")
+    parser.add_argument("--panchayats", type=int, default=10)
+    parser.add_argument("--users", type=int, default=20, help="Firms per panchayat")
+    parser.add_argument("--months", type=int, default=24, help="Months of MonthlyData per firm")
+    parser.add_argument("--requests", type=int, default=2000, help="Measured requests per target")
+    parser.add_argument("--warmup", type=int, default=100, help="Unmeasured requests before measuring")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent virtual users")
+    parser.add_argument("--admin-ratio", type=float, default=0.25, help="Share of virtual users logged in as admin")
+    parser.add_argument("--target", choices=["inprocess", "uvicorn", "both"], default="both")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--uvicorn-workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Result JSON path (default: benchmarks/results/load_test_<rev>_<ts>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"),
+                        help="Compare two result files instead of running")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    targets = ("inprocess", "uvicorn") if args.target == "both" else (args.target,)
+    result = run_load_test(args.panchayats, args.users, args.months, args.requests, args.warmup, args.concurrency,
+                           args.admin_ratio, targets, args.port, args.uvicorn_workers, args.seed)
+    print_report(result)
+    print(f"\nResults written to {write_result(result, 'load_test', args.output)}")
+
+
+if __name__ == "__main__":
+    main()
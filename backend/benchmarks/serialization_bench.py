@@ -0,0 +1,127 @@
+"""
+Benchmark for large /data/ pages: serialization CPU and bytes on the wire.
+
+    python -m benchmarks.serialization_bench
+    python -m benchmarks.serialization_bench --pages 1000 10000 --repeats 5
+
+For each page size two response paths are timed (CPU time, best of
+`--repeats`) against an in-memory copy of the synthetic benchmark dataset:
+
+- orm_pydantic: ORM objects -> MonthlyDataSchema.from_orm -> jsonable_encoder
+  -> JSONResponse, as /data/ worked before the fast path;
+- columns_orjson: column tuples -> dicts -> ORJSONResponse, as it works now.
+
+The rendered body is then compressed with gzip at several levels and, if the
+brotli package is installed, with Brotli, to report wire size and the CPU cost
+of each encoding.
+"""
+import argparse
+import gzip
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from benchmarks.common import environment, write_result
+from benchmarks.dataset import populate
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def best_cpu(func: Callable[[], object], repeats: int) -> Tuple[float, object]:
+    """Best-of-N process CPU time of func() in seconds, and its last result."""
+    best, result = float("inf"), None
+    for _ in range(repeats):
+        started = time.process_time()
+        result = func()
+        best = min(best, time.process_time() - started)
+    return best, result
+
+
+def build_paths(SessionLocal, size: int) -> Dict[str, Callable[[], bytes]]:
+    from fastapi.encoders import jsonable_encoder
+    from starlette.responses import JSONResponse
+
+    from models import MonthlyData, User
+    from schemas import MonthlyData as MonthlyDataSchema
+    from serialization import ORJSONResponse, row_dicts
+
+    def orm_pydantic() -> bytes:
+        with SessionLocal() as db:
+            rows = db.query(MonthlyData).join(User, MonthlyData.user_id == User.id).limit(size).all()
+            body = {"items": [MonthlyDataSchema.from_orm(row) for row in rows], "total": len(rows)}
+            return JSONResponse(jsonable_encoder(body)).body
+
+    def columns_orjson() -> bytes:
+        columns = [getattr(User if field in ("username", "firm_type", "firm_name") else MonthlyData, field)
+                   for field in MonthlyDataSchema.model_fields]
+        with SessionLocal() as db:
+            rows = db.query(*columns).join(User, MonthlyData.user_id == User.id).limit(size).all()
+            return ORJSONResponse({"items": row_dicts(rows), "total": len(rows)}).body
+
+    return {"orm_pydantic": orm_pydantic, "columns_orjson": columns_orjson}
+
+
+def encodings() -> Dict[str, Callable[[bytes], bytes]]:
+    result = {
+        "identity": lambda body: body,
+        "gzip-1": lambda body: gzip.compress(body, compresslevel=1),
+        "gzip-5": lambda body: gzip.compress(body, compresslevel=5),
+        "gzip-9": lambda body: gzip.compress(body, compresslevel=9),
+    }
+    if brotli is not None:
+        result["br-4"] = lambda body: brotli.compress(body, quality=4)
+    return result
+
+
+def run(pages: List[int], repeats: int, panchayats: int, users: int, months: int) -> dict:
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    info = populate(engine, panchayats, users, months)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    print(f"{info['monthly_data']} MonthlyData rows")
+
+    results = {}
+    for size in pages:
+        print(f"\n[page size {size}]")
+        page = results[str(size)] = {"paths": {}, "encodings": {}}
+        body = b""
+        for name, path in build_paths(SessionLocal, size).items():
+            path()  # warm up
+            seconds, body = best_cpu(path, repeats)
+            page["paths"][name] = {"cpu_ms": seconds * 1000, "bytes": len(body)}
+            print(f"  {name:<16}{seconds * 1000:>10.1f} ms CPU{len(body):>12,} bytes")
+        for name, encode in encodings().items():
+            seconds, encoded = best_cpu(lambda: encode(body), repeats)
+            page["encodings"][name] = {"cpu_ms": seconds * 1000, "bytes": len(encoded),
+                                       "ratio": len(encoded) / len(body)}
+            print(f"  {name:<16}{seconds * 1000:>10.1f} ms CPU{len(encoded):>12,} bytes ({len(encoded) / len(body):.1%})")
+    engine.dispose()
+    return {
+        "environment": environment(),
+        "config": {"pages": pages, "repeats": repeats, "panchayats": panchayats, "users": users, "months": months},
+        "dataset": info,
+        "results": results,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Serialization CPU and wire size of large /data/ pages.")
+    parser.add_argument("--pages", type=int, nargs="+", default=[1000, 10000], help="Page sizes to measure")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--panchayats", type=int, default=10)
+    parser.add_argument("--users", type=int, default=50, help="Firms per panchayat")
+    parser.add_argument("--months", type=int, default=24, help="Months of MonthlyData per firm")
+    parser.add_argument("--output", help="Result JSON path (default: benchmarks/results/serialization_<rev>_<ts>.json)")
+    args = parser.parse_args(argv)
+
+    result = run(args.pages, args.repeats, args.panchayats, args.users, args.months)
+    print(f"\nResults written to {write_result(result, 'serialization', args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+"""
+Result cache shared by all API workers, with invalidation through data_versions.
+
+The backend is chosen with CACHE_BACKEND:
+
+- "local" (default): an LRU dict in this process (CACHE_MAX_ENTRIES). Right
+  for a single worker; with several, each keeps its own copy.
+- "sqlite": a cache file (CACHE_SQLITE_PATH) shared by every worker on the
+  host, in WAL mode so readers never wait for writers.
+- "redis": a Redis server (REDIS_URL), shared across hosts. REDIS_URL=memory://
+  uses an in-process stand-in (for tests, no server needed). If the redis
+  package is not installed the SQLite backend is used instead.
+
+Entries are never deleted to invalidate them. Every key includes the current
+counters from the `data_versions` table that the cached value depends on:
+
+    activity_aggregates  bumped with every MonthlyData change (aggregates.py)
+    emission_factors     bumped when the emission factors change
+
+The counters are bumped in the same transaction as the write, so once it
+commits every worker - on any host sharing the database - builds new keys and
+misses; stale entries simply age out (CACHE_TTL). All counters are read with a
+single query per session transaction. Entries that depend on no counter (the
+authenticated user, see dependencies.py) cost no query at all and are only
+bounded by their TTL.
+
+Values are pickled, so a caller can never mutate a cached object in place. A
+failing backend only costs the cache: the value is computed directly.
+
+The backend also carries a small event log (publish/poll) that live.py uses to
+relay dashboard updates between workers.
+"""
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from metrics import CACHE_REQUESTS
+from models import DataVersion, EmissionFactors
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "local")
+# Upper bound on an entry's life; correctness comes from the version counters
+CACHE_TTL = float(os.getenv("CACHE_TTL", "300"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache.sqlite3"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Relayed events are kept this many seconds (SQLite) / this many per topic (Redis)
+EVENT_RETENTION = 60.0
+EVENT_MAX = 10000
+
+AGGREGATES_VERSION = "activity_aggregates"
+FACTORS_VERSION = "emission_factors"
+
+logger = logging.getLogger("carbontrackhub.cache")
+
+data_versions = DataVersion.__table__
+
+MISS = object()
+_VERSIONS = "cache_versions"
+
+
+class CacheBackend(ABC):
+    """Byte-oriented key/value store with expiry, plus an append-only event log per topic."""
+
+    # Whether other worker processes see the same entries and events
+    shared = False
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        """The stored value, or None if missing or expired."""
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: float = CACHE_TTL) -> None:
+        """Store `value` under `key` for `ttl` seconds."""
+
+    @abstractmethod
+    def publish(self, topic: str, message: bytes) -> None:
+        """Append `message` to the event log of `topic`."""
+
+    @abstractmethod
+    def poll(self, topic: str, cursor: Any = None) -> Tuple[Any, List[bytes]]:
+        """Messages published after `cursor` and the new cursor; with None, just the current position."""
+
+
+class LocalCache(CacheBackend):
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._events: Dict[str, deque] = {}
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, ttl=CACHE_TTL):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def publish(self, topic, message):
+        with self._lock:
+            self._sequence += 1
+            self._events.setdefault(topic, deque(maxlen=EVENT_MAX)).append((self._sequence, message))
+
+    def poll(self, topic, cursor=None):
+        with self._lock:
+            if cursor is None:
+                return self._sequence, []
+            events = [(seq, message) for seq, message in self._events.get(topic, ()) if seq > cursor]
+        return (events[-1][0] if events else cursor), [message for _, message in events]
+
+
+class SQLiteCache(CacheBackend):
+    """A cache file shared by the workers on one host; one connection per thread."""
+
+    shared = True
+
+    def __init__(self, path: str = CACHE_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache_entries "
+                         "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache_events "
+                         "(seq INTEGER PRIMARY KEY AUTOINCREMENT, topic TEXT NOT NULL, "
+                         "message BLOB NOT NULL, created REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_events_topic ON cache_events (topic, seq)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute("SELECT value, expires FROM cache_entries WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    def set(self, key, value, ttl=CACHE_TTL):
+        conn = self._connect()
+        now = time.time()
+        conn.execute("INSERT OR REPLACE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)",
+                     (key, value, now + ttl))
+        self._writes += 1
+        if self._writes % 500 == 0:
+            conn.execute("DELETE FROM cache_entries WHERE expires < ?", (now,))
+
+    def publish(self, topic, message):
+        conn = self._connect()
+        now = time.time()
+        conn.execute("INSERT INTO cache_events (topic, message, created) VALUES (?, ?, ?)", (topic, message, now))
+        self._writes += 1
+        if self._writes % 100 == 0:
+            conn.execute("DELETE FROM cache_events WHERE created < ?", (now - EVENT_RETENTION,))
+
+    def poll(self, topic, cursor=None):
+        conn = self._connect()
+        if cursor is None:
+            return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM cache_events").fetchone()[0], []
+        rows = conn.execute("SELECT seq, message FROM cache_events WHERE topic = ? AND seq > ? ORDER BY seq",
+                            (topic, cursor)).fetchall()
+        return (rows[-1][0] if rows else cursor), [message for _, message in rows]
+
+
+class RedisCache(CacheBackend):
+    """Entries as Redis strings with an expiry, events as a capped Redis stream per topic."""
+
+    shared = True
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl=CACHE_TTL):
+        self.client.set(key, value, px=int(ttl * 1000))
+
+    def publish(self, topic, message):
+        self.client.xadd(topic, {b"m": message}, maxlen=EVENT_MAX, approximate=True)
+
+    def poll(self, topic, cursor=None):
+        if cursor is None:
+            last = self.client.xrevrange(topic, count=1)
+            return (last[0][0] if last else b"0-0"), []
+        entries = self.client.xrange(topic, min=b"(" + cursor)
+        return (entries[-1][0] if entries else cursor), [fields[b"m"] for _, fields in entries]
+
+
+class LocalRedis:
+    """In-process stand-in for the few Redis commands RedisCache uses (REDIS_URL=memory://)."""
+
+    def __init__(self):
+        self._values: Dict[bytes, Tuple[bytes, float]] = {}
+        self._streams: Dict[bytes, List[Tuple[bytes, dict]]] = {}
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _bytes(value) -> bytes:
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._values.get(self._bytes(key))
+        if entry is None or entry[1] < time.monotonic():
+            return None
+        return entry[0]
+
+    def set(self, key, value, px=None):
+        expires = time.monotonic() + px / 1000 if px else float("inf")
+        with self._lock:
+            self._values[self._bytes(key)] = (self._bytes(value), expires)
+
+    def xadd(self, name, fields, maxlen=None, approximate=True):
+        with self._lock:
+            self._sequence += 1
+            entry_id = f"{int(time.time() * 1000)}-{self._sequence}".encode()
+            stream = self._streams.setdefault(self._bytes(name), [])
+            stream.append((entry_id, {self._bytes(k): self._bytes(v) for k, v in fields.items()}))
+            if maxlen is not None and len(stream) > maxlen:
+                del stream[:len(stream) - maxlen]
+            return entry_id
+
+    @staticmethod
+    def _sequence_of(entry_id: bytes) -> int:
+        return int(entry_id.split(b"-")[1])
+
+    def xrange(self, name, min=b"-", max=b"+", count=None):
+        with self._lock:
+            stream = list(self._streams.get(self._bytes(name), ()))
+        if min.startswith(b"("):
+            after = self._sequence_of(min[1:])
+            stream = [entry for entry in stream if self._sequence_of(entry[0]) > after]
+        return stream[:count] if count else stream
+
+    def xrevrange(self, name, max=b"+", min=b"-", count=None):
+        with self._lock:
+            stream = list(reversed(self._streams.get(self._bytes(name), ())))
+        return stream[:count] if count else stream
+
+
+def create_backend(kind: str = CACHE_BACKEND) -> CacheBackend:
+    if kind == "local":
+        return LocalCache()
+    if kind == "sqlite":
+        return SQLiteCache()
+    if kind == "redis":
+        if REDIS_URL == "memory://":
+            return RedisCache(LocalRedis())
+        try:
+            import redis
+        except ImportError:  # optional: pip install redis
+            logger.warning("CACHE_BACKEND=redis but the redis package is not installed; using %s", CACHE_SQLITE_PATH)
+            return SQLiteCache()
+        return RedisCache(redis.Redis.from_url(REDIS_URL))
+    raise ValueError(f"CACHE_BACKEND must be 'local', 'sqlite' or 'redis', not '{kind}'")
+
+
+backend = create_backend()
+
+
+def bump_version(conn: Connection, name: str) -> None:
+    """Increment the data_versions counter `name`, creating it on first use."""
+    result = conn.execute(
+        update(data_versions).where(data_versions.c.name == name)
+        .values(version=data_versions.c.version + 1, updated_at=datetime.utcnow())
+    )
+    if result.rowcount == 0:
+        conn.execute(data_versions.insert().values(name=name, version=1, updated_at=datetime.utcnow()))
+
+
+def versions(db: Session) -> Dict[str, int]:
+    """All data_versions counters, read once per transaction of `db`."""
+    current = db.info.get(_VERSIONS)
+    if current is None:
+        current = db.info[_VERSIONS] = dict(db.execute(select(data_versions.c.name, data_versions.c.version)).all())
+    return current
+
+
+def cached(
+    db: Session,
+    namespace: str,
+    key: Iterable,
+    compute: Callable[[], Any],
+    depends: Tuple[str, ...] = (AGGREGATES_VERSION, FACTORS_VERSION),
+    ttl: float = CACHE_TTL,
+) -> Any:
+    """compute() from the shared cache while the `depends` counters are unchanged (or for `ttl` without any)."""
+    current = versions(db) if depends else {}
+    full_key = f"{namespace}:{tuple(key)!r}:{tuple(current.get(name, 0) for name in depends)!r}"
+    try:
+        value = backend.get(full_key)
+    except Exception as e:
+        logger.warning("Cache read failed: %s", e)
+        CACHE_REQUESTS.inc(namespace, "error")
+        return compute()
+    if value is not None:
+        CACHE_REQUESTS.inc(namespace, "hit")
+        return pickle.loads(value)
+
+    CACHE_REQUESTS.inc(namespace, "miss")
+    result = compute()
+    try:
+        backend.set(full_key, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), ttl)
+    except Exception as e:
+        logger.warning("Cache write failed: %s", e)
+    return result
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _forget_versions(session):
+    session.info.pop(_VERSIONS, None)
+
+
+def _bumps(name: str):
+    def listener(mapper, connection, target):
+        bump_version(connection, name)
+    return listener
+
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    event.listen(EmissionFactors, _event, _bumps(FACTORS_VERSION))
@@ -1,6 +1,8 @@
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 from datetime import datetime
+from contextlib import contextmanager
+import time
 
 from models import MonthlyData, EmissionFactors, CarbonMetrics, User, Panchayat
 from schemas import (
@@ -9,8 +11,10 @@ from schemas import (
     MonthlyDataUpdate,
     CarbonMetricsResponse,
     SectorEmission,
-    MonthlyTrend
+    MonthlyTrend,
+    EmissionFactors as EmissionFactorsSchema
 )
+import cache
 
 def calculate_emissions(monthly_data: MonthlyData, emission_factors: EmissionFactors) -> Dict[str, float]:
     """
@@ -66,6 +70,19 @@ def calculate_emissions(monthly_data: MonthlyData, emission_factors: EmissionFac
         }
     }
 
+def _load_emission_factors(db: Session) -> EmissionFactorsSchema:
+    emission_factors = db.query(EmissionFactors).first()
+    if not emission_factors:
+        emission_factors = EmissionFactors()
+        db.add(emission_factors)
+        db.commit()
+    return EmissionFactorsSchema.from_orm(emission_factors)
+
+def get_emission_factors(db: Session) -> EmissionFactorsSchema:
+    """Get the emission factors in use (a read-only snapshot), creating the defaults if none exist."""
+    return cache.cached(db, "emission_factors", (), lambda: _load_emission_factors(db),
+                        depends=(cache.FACTORS_VERSION,))
+
 def get_carbon_metrics(
     db: Session, 
     user_id: Optional[str] = None,
@@ -269,69 +286,135 @@ def get_monthly_trends(
     
     return trends
 
-def seed_initial_data(db: Session):
-    """Seed database with initial emission factors and sample data."""
+def get_prediction_history(db: Session, user: User) -> List[Dict[str, Any]]:
+    """Historical entries (with calculated emissions) sent to the AI forecast for `user`."""
+    from anomalies import excluded_entries
+
+    query = db.query(MonthlyData)
+
+    # Filter by user or panchayat based on role
+    if user.role == "user":
+        query = query.filter(MonthlyData.user_id == user.id)
+    elif user.role == "admin" and user.panchayat_id:
+        query = query.filter(MonthlyData.panchayat_id == user.panchayat_id)
+    # Entries flagged as anomalous (and not confirmed valid) would skew the forecast
+    query = query.filter(MonthlyData.id.not_in(excluded_entries()))
+
+    data = query.order_by(MonthlyData.year, MonthlyData.month).all() # Simple ordering
+
+    # Get emission factors
+    emission_factors = db.query(EmissionFactors).first()
+    if not emission_factors:
+        emission_factors = EmissionFactors()
+
+    # Convert to list of dicts with calculated emissions
+    historical_data = []
+    for d in data:
+        data_dict = MonthlyDataSchema.from_orm(d).dict()
+        calc_result = calculate_emissions(d, emission_factors)
+        data_dict["calculated_total_emission_kg"] = calc_result["total_emissions"]
+        data_dict["calculated_net_footprint_kg"] = calc_result["net_footprint"]
+        historical_data.append(data_dict)
+    return historical_data
+
+@contextmanager
+def _timed(timings: Dict[str, float], phase: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = time.perf_counter() - started
+
+def seed_initial_data(db: Session) -> Dict[str, float]:
+    """
+    Seed database with initial emission factors and sample data.
+
+    Idempotent and cheap on an already-seeded database: existence checks are
+    single-row lookups, the admin password is only re-hashed when the stored
+    hash no longer matches ADMIN_PASSWORD, and nothing is committed unless
+    something changed. Returns the time spent in each step, in seconds.
+    """
     import os
-    
+    from auth import get_password_hash, verify_password, pwd_context
+
+    timings: Dict[str, float] = {}
+    seeded = False
+
     # Check if emission factors exist
-    existing_factors = db.query(EmissionFactors).first()
-    if not existing_factors:
-        emission_factors = EmissionFactors()
-        db.add(emission_factors)
-        db.commit()
-    
+    with _timed(timings, "seed_emission_factors"):
+        if db.query(EmissionFactors.id).first() is None:
+            db.add(EmissionFactors())
+            db.flush()
+            seeded = True
+
     # Check if sample panchayats exist
-    existing_panchayats = db.query(Panchayat).count()
-    if existing_panchayats == 0:
-        print("Seeding Anjarakandi Panchayat...")
-        panchayat = Panchayat(
-            id="anjarakandi-id",
-            name="Gram Panchayat Anjarakandi",
-            district="Kannur",
-            state="Kerala",
-            total_population=20000
-        )
-        db.add(panchayat)
-        db.commit()
-        print("Anjarakandi seeded successfully.")
-    
-    # Always sync admin credentials from .env (create or update)
-    from auth import get_password_hash
+    with _timed(timings, "seed_panchayat"):
+        if db.query(Panchayat.id).first() is None:
+            print("Seeding Anjarakandi Panchayat...")
+            panchayat = Panchayat(
+                id="anjarakandi-id",
+                name="Gram Panchayat Anjarakandi",
+                district="Kannur",
+                state="Kerala",
+                total_population=20000
+            )
+            db.add(panchayat)
+            db.flush()
+            seeded = True
+            print("Anjarakandi seeded successfully.")
 
+    # Always sync admin credentials from .env (create or update)
     admin_username = os.getenv("ADMIN_USERNAME", "admin")
     admin_password = os.getenv("ADMIN_PASSWORD", "admin123")
 
-    existing_admin = db.query(User).filter(User.role == "admin").first()
-    if existing_admin:
-        # Update credentials to always match .env
-        existing_admin.username       = admin_username
-        existing_admin.hashed_password = get_password_hash(admin_password)
-        db.commit()
-        print(f"✅ Admin credentials synced from .env (username: {admin_username})")
-    else:
-        admin_user = User(
-            username=admin_username,
-            email="admin@carbontrackhub.com",
-            hashed_password=get_password_hash(admin_password),
-            role="admin",
-            is_active=True
-        )
-        db.add(admin_user)
-        db.commit()
-        print(f"✅ Admin user created from .env (username: {admin_username})")
+    with _timed(timings, "seed_admin"):
+        existing_admin = db.query(User).filter(User.role == "admin").first()
+        if existing_admin:
+            changed = False
+            if existing_admin.username != admin_username:
+                existing_admin.username = admin_username
+                changed = True
+            # Verifying costs one argon2 computation; re-hashing also costs a write at every boot.
+            try:
+                password_matches = verify_password(admin_password, existing_admin.hashed_password)
+            except ValueError:  # unrecognised legacy hash format
+                password_matches = False
+            if not password_matches or pwd_context.needs_update(existing_admin.hashed_password):
+                existing_admin.hashed_password = get_password_hash(admin_password)
+                changed = True
+            if changed:
+                seeded = True
+                print(f"✅ Admin credentials synced from .env (username: {admin_username})")
+        else:
+            admin_user = User(
+                username=admin_username,
+                email="admin@carbontrackhub.com",
+                hashed_password=get_password_hash(admin_password),
+                role="admin",
+                is_active=True
+            )
+            db.add(admin_user)
+            db.flush()
+            seeded = True
+            print(f"✅ Admin user created from .env (username: {admin_username})")
 
     # Seed demo_user only on first run (no regular users yet)
-    first_panchayat = db.query(Panchayat).first()
-    panchayat_id = first_panchayat.id if first_panchayat else None
-    if db.query(User).filter(User.role == "user").count() == 0:
-        user1 = User(
-            username="demo_user",
-            email="demo@example.com",
-            hashed_password=get_password_hash("password123"),
-            role="user",
-            is_active=True,
-            panchayat_id=panchayat_id
-        )
-        db.add(user1)
-        db.commit()
+    with _timed(timings, "seed_demo_user"):
+        if db.query(User.id).filter(User.role == "user").first() is None:
+            first_panchayat = db.query(Panchayat.id).first()
+            user1 = User(
+                username="demo_user",
+                email="demo@example.com",
+                hashed_password=get_password_hash("password123"),
+                role="user",
+                is_active=True,
+                panchayat_id=first_panchayat.id if first_panchayat else None
+            )
+            db.add(user1)
+            db.flush()
+            seeded = True
 
+    if seeded:
+        with _timed(timings, "seed_commit"):
+            db.commit()
+    return timings
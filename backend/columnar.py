@@ -0,0 +1,108 @@
+"""
+Columnar response format for large listings and time series (`format=columnar`).
+
+Instead of a list of objects that repeats every key for every row, a columnar
+payload holds one array per field:
+
+    {"format": "columnar", "count": 3,
+     "columns": {"month": ["Jan 2025", "Feb 2025", "Mar 2025"], "net": [10.5, 12.25, 11.0], ...},
+     "encoding": {}}
+
+With `delta=true`, numeric columns are sent as integer deltas at `precision`
+decimal places: the first value followed by the differences between
+neighbours, all multiplied by 10**precision and rounded (integer columns are
+not scaled). Slowly changing series then become short integers. `encoding`
+names every encoded column and its scale; a client decodes with a running sum
+divided by the scale:
+
+    "encoding": {"net": {"type": "delta", "scale": 100}}  ->  [1050, 175, -125] -> [10.5, 12.25, 11.0]
+
+Columns are built straight from query result tuples; no per-row dicts or
+pydantic objects are created.
+"""
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from aggregates import ACTIVITY_COLUMNS, MONTH_NUMBERS
+from calculations import calculate_emissions, get_emission_factors
+from models import MonthlyData
+
+MAX_PRECISION = 6
+
+
+def to_columns(rows: Sequence[tuple], fields: Sequence[str]) -> Dict[str, list]:
+    """Query result tuples -> {field: [values...]}."""
+    if not rows:
+        return {field: [] for field in fields}
+    return {field: list(values) for field, values in zip(fields, zip(*rows))}
+
+
+def delta_encode(values: Sequence[float], scale: int) -> List[int]:
+    """Scaled, rounded values as first value + successive differences (exact on the integer grid)."""
+    encoded, previous = [], 0
+    for value in values:
+        current = round(value * scale)
+        encoded.append(current - previous)
+        previous = current
+    return encoded
+
+
+def _is_numeric(values: list) -> bool:
+    return bool(values) and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values)
+
+
+def columnar_payload(columns: Dict[str, list], delta: bool = False, precision: int = 2, **extra) -> dict:
+    """The columnar response body; with `delta`, every all-numeric column is delta-encoded."""
+    if not 0 <= precision <= MAX_PRECISION:
+        raise ValueError(f"precision must be between 0 and {MAX_PRECISION}")
+    encoding = {}
+    if delta:
+        for field, values in columns.items():
+            if _is_numeric(values):
+                # integer columns (year, trees_planted) need no scaling
+                scale = 1 if all(isinstance(v, int) for v in values) else 10 ** precision
+                columns[field] = delta_encode(values, scale)
+                encoding[field] = {"type": "delta", "scale": scale}
+    count = len(next(iter(columns.values()))) if columns else 0
+    return {"format": "columnar", "count": count, "columns": columns, "encoding": encoding, **extra}
+
+
+def trend_columns(
+    db: Session,
+    user_id: Optional[str] = None,
+    panchayat_id: Optional[str] = None,
+    year: Optional[int] = None
+) -> Dict[str, list]:
+    """
+    calculations.get_monthly_trends as columns (month, emissions, offsets, net).
+    Activity is summed per month in SQL and the emission factors applied once
+    per month, instead of once per record.
+    """
+    query = db.query(
+        MonthlyData.year, MonthlyData.month,
+        *(func.sum(getattr(MonthlyData, column)).label(column) for column in ACTIVITY_COLUMNS),
+    )
+    if user_id:
+        query = query.filter(MonthlyData.user_id == user_id)
+    if panchayat_id:
+        query = query.filter(MonthlyData.panchayat_id == panchayat_id)
+    if year:
+        query = query.filter(MonthlyData.year == year)
+    rows = sorted(query.group_by(MonthlyData.year, MonthlyData.month).all(),
+                  key=lambda row: (row.year, MONTH_NUMBERS.get(row.month, 0)))
+
+    columns = {"month": [], "emissions": [], "offsets": [], "net": []}
+    if not rows:
+        return columns
+    emission_factors = get_emission_factors(db)
+    for row in rows:
+        activity = SimpleNamespace(**{column: getattr(row, column) or 0 for column in ACTIVITY_COLUMNS})
+        result = calculate_emissions(activity, emission_factors)
+        columns["month"].append(f"{row.month} {row.year}")
+        columns["emissions"].append(result["total_emissions"])
+        columns["offsets"].append(result["total_offsets"])
+        columns["net"].append(result["net_footprint"])
+    return columns
@@ -1,23 +1,44 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from typing import List, Optional
+from datetime import datetime
+import importlib
 import os
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATABASE_URL = f"sqlite:///{os.path.join(BASE_DIR, 'carbontrackhub.db')}"
+# DATABASE_URL may be overridden, e.g. to point benchmarks at a throwaway database
+DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{os.path.join(BASE_DIR, 'carbontrackhub.db')}")
 
 # Create engine
 engine = create_engine(
     DATABASE_URL, 
-    connect_args={"check_same_thread": False}  # SQLite specific
+    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}  # SQLite specific
 )
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# Create base for models
+# Create base for models (the single metadata source: models.py declares its tables on it)
 Base = declarative_base()
 
+# Bump whenever models.py changes the database schema.
+# 2: activity_aggregates
+# 3: data_versions
+# 4: activity_stats, anomaly_flags
+# 5: jobs
+# 6: index on otp_verifications.expires_at
+# 7: index on monthly_data.user_id
+SCHEMA_VERSION = 7
+
+# Tables derived from other data: when bootstrap_schema creates one of these in
+# an existing database it calls "module.function"(bind) to fill it.
+TABLE_BACKFILLS = {
+    "activity_aggregates": "aggregates.rebuild_aggregates",
+    "activity_stats": "anomalies.rebuild_stats",
+}
+
 # Dependency to get database session
 def get_db():
     db = SessionLocal()
@@ -26,6 +47,121 @@ def get_db():
     finally:
         db.close()
 
+class SchemaError(RuntimeError):
+    """The database schema is missing or does not match the models."""
+
+
+def _registered_metadata():
+    import models  # noqa: F401 - registers every table on Base.metadata
+    return Base.metadata
+
+
+def _stamped_version(bind: Engine) -> Optional[int]:
+    with bind.connect() as conn:
+        return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+
+
+def _schema_problems(bind: Engine) -> List[str]:
+    """Tables or columns the models expect but the database lacks."""
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    problems = []
+    for table in _registered_metadata().sorted_tables:
+        if table.name not in existing_tables:
+            problems.append(f"missing table '{table.name}'")
+            continue
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        missing = [column.name for column in table.columns if column.name not in existing_columns]
+        if missing:
+            problems.append(f"table '{table.name}' is missing columns {', '.join(missing)}")
+    return problems
+
+
+def check_schema(bind: Engine = engine) -> int:
+    """
+    Read-only startup check: the database must have been bootstrapped at
+    SCHEMA_VERSION and contain every table/column the models use. Raises
+    SchemaError with instructions instead of issuing DDL.
+    """
+    inspector = inspect(bind)
+    tables = set(inspector.get_table_names())
+    if "schema_version" not in tables:
+        if not tables:
+            raise SchemaError(
+                f"Database {bind.url!r} has no tables. Run `python init_db.py` once per deployment to create them."
+            )
+        raise SchemaError(
+            f"Database {bind.url!r} predates schema versioning. "
+            "Run `python init_db.py` once to verify and stamp it."
+        )
+
+    version = _stamped_version(bind)
+    if version is None:
+        raise SchemaError(
+            f"Database {bind.url!r} has a schema_version table but no version stamp "
+            "(bootstrap interrupted?). Run `python init_db.py` once to initialise and stamp it."
+        )
+    if version < SCHEMA_VERSION:
+        raise SchemaError(
+            f"Database schema version is {version}, but this build expects {SCHEMA_VERSION}. "
+            "Run `python init_db.py` once to upgrade it before starting the API."
+        )
+    if version != SCHEMA_VERSION:
+        raise SchemaError(
+            f"Database schema version is {version}, but this build expects {SCHEMA_VERSION}. "
+            "Deploy a build that matches the database before starting the API."
+        )
+
+    problems = _schema_problems(bind)
+    if problems:
+        raise SchemaError(f"Database schema does not match the models: {'; '.join(problems)}")
+    return version
+
+
+def bootstrap_schema(bind: Engine = engine) -> int:
+    """
+    Create missing tables and stamp SCHEMA_VERSION. Meant to run once per
+    deployment (init_db.py), not in every worker. Upgrades from an older stamped
+    version are additive only: new tables and indexes are created (new tables
+    are backfilled, see TABLE_BACKFILLS). An existing database is only stamped if it then matches
+    the models; a newer stamped version is refused.
+    """
+    metadata = _registered_metadata()
+    existing_tables = set(inspect(bind).get_table_names())
+    if "schema_version" in existing_tables:
+        version = _stamped_version(bind)
+        if version is not None and version > SCHEMA_VERSION:
+            raise SchemaError(
+                f"Database schema version is {version}, but this build expects {SCHEMA_VERSION}; "
+                "refusing to bootstrap it with an older build."
+            )
+
+    metadata.create_all(bind=bind)
+    # create_all skips existing tables, so add indexes declared on them since
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+    problems = _schema_problems(bind)
+    if problems:
+        raise SchemaError(
+            f"Existing tables do not match the models ({'; '.join(problems)}). Migrate them before bootstrapping."
+        )
+
+    # A fresh database has nothing to derive, so backfills only run when upgrading one.
+    if existing_tables:
+        for table, hook in TABLE_BACKFILLS.items():
+            if table not in existing_tables:
+                module, function = hook.rsplit(".", 1)
+                getattr(importlib.import_module(module), function)(bind)
+
+    with bind.begin() as conn:
+        if conn.execute(text("SELECT COUNT(*) FROM schema_version WHERE version = :v"), {"v": SCHEMA_VERSION}).scalar() == 0:
+            conn.execute(text("INSERT INTO schema_version (version, applied_at) VALUES (:v, :at)"),
+                         {"v": SCHEMA_VERSION, "at": datetime.utcnow()})
+    return SCHEMA_VERSION
+
+
 # Create database tables
 def create_tables():
-    Base.metadata.create_all(bind=engine)
+    """Backwards-compatible alias for bootstrap_schema()."""
+    return bootstrap_schema(engine)
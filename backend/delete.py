@@ -1,9 +1,14 @@
 from database import SessionLocal
-from models import MonthlyData, CarbonMetrics, OTPVerification, User
+from aggregates import bump_data_version
+from models import MonthlyData, ActivityAggregate, ActivityStats, AnomalyFlag, CarbonMetrics, OTPVerification, User
 db = SessionLocal()
+db.query(AnomalyFlag).delete()
+db.query(ActivityStats).delete()
 db.query(MonthlyData).delete()
+db.query(ActivityAggregate).delete()
+bump_data_version(db.connection())
 db.query(CarbonMetrics).delete()
 db.query(OTPVerification).delete()
 db.query(User).filter(User.role == 'user').delete()
 db.commit(); db.close()
-print("✅ Done. Monthly data, metrics, OTPs, and non-admin users cleared.")
\ No newline at end of file
+print("✅ Done. Monthly data, aggregates, anomaly stats, metrics, OTPs, and non-admin users cleared.")
\ No newline at end of file
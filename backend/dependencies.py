@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session
 from typing import Optional, List
 import os
 
+import cache
 from database import get_db
 from auth import verify_token
 from models import User
@@ -12,6 +13,17 @@ from schemas import User as UserSchema
 # Security scheme
 security = HTTPBearer()
 
+# Seconds a cached user record is trusted: the lookup costs no database query,
+# and a deleted or deactivated user is locked out within this time.
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+
+def _user_by_username(db: Session, username: str) -> Optional[UserSchema]:
+    """The user behind a token, from the shared cache for up to USER_CACHE_TTL seconds."""
+    def load():
+        user = db.query(User).filter(User.username == username).first()
+        return UserSchema.from_orm(user) if user is not None else None
+    return cache.cached(db, "user", (username,), load, depends=(), ttl=USER_CACHE_TTL)
+
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
@@ -32,11 +44,11 @@ def get_current_user(
         raise credentials_exception
     
     # Get user from database
-    user = db.query(User).filter(User.username == username).first()
+    user = _user_by_username(db, username)
     if user is None:
         raise credentials_exception
     
-    return UserSchema.from_orm(user)
+    return user
 
 def get_current_active_user(current_user: UserSchema = Depends(get_current_user)) -> UserSchema:
     """Get current active user."""
@@ -67,11 +79,11 @@ def get_optional_user(
         if username is None:
             return None
         
-        user = db.query(User).filter(User.username == username).first()
+        user = _user_by_username(db, username)
         if user is None or not user.is_active:
             return None
         
-        return UserSchema.from_orm(user)
+        return user
     except Exception:
         return None
 
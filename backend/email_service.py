@@ -1,9 +1,39 @@
+"""
+OTP email delivery through an in-process outbox.
+
+send_otp_email only enqueues the message and returns, so request handlers
+never wait for an SMTP handshake. EMAIL_SENDERS background threads each keep
+one authenticated SMTP connection open and reuse it for every message they
+send: a burst of OTPs is drained in batches of up to EMAIL_BATCH_SIZE over
+the same connection, and a connection idle for longer than SMTP_IDLE_TIMEOUT
+is closed. Failed sends are retried with exponential backoff (EMAIL_RETRY_DELAY,
+doubled per attempt) up to EMAIL_MAX_ATTEMPTS; permanent (5xx) rejections and
+messages the SMTP client cannot send at all are not retried. A failing message
+never takes its sender thread down with it.
+
+The outbox lives in memory: OTPs expire after ten minutes anyway, and a user
+whose code was lost with a restart simply requests a new one.
+
+For local testing, run an SMTP stand-in such as aiosmtpd
+(`python -m aiosmtpd -n -l localhost:8025`) with SMTP_SERVER=localhost,
+SMTP_PORT=8025, SMTP_STARTTLS=0, SMTP_LOGIN=0 and a FROM_EMAIL;
+tests/test_email_service.py does the same in-process.
+"""
+import heapq
+import itertools
+import logging
 import os
 import smtplib
+import threading
+import time
+from dataclasses import dataclass, field
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from typing import List, Optional
 from dotenv import load_dotenv
 
+from metrics import EMAILS, EMAIL_OUTBOX_DEPTH
+
 load_dotenv()
 
 SMTP_SERVER = os.getenv("SMTP_SERVER", "")
@@ -11,11 +41,220 @@ SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 SMTP_USERNAME = os.getenv("SMTP_USERNAME", "")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
 FROM_EMAIL = os.getenv("FROM_EMAIL", "")
+# Set to 0 for servers without STARTTLS / authentication (e.g. a local SMTP stand-in)
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") == "1"
+SMTP_LOGIN = os.getenv("SMTP_LOGIN", "1") == "1"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "10"))
+# Close pooled connections after this many idle seconds (servers drop idle clients after a few minutes)
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "60"))
+# A reused connection idle for longer than this is checked with NOOP first
+SMTP_CHECK_AFTER = 10.0
+
+EMAIL_SENDERS = int(os.getenv("EMAIL_SENDERS", "1"))
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "20"))
+EMAIL_QUEUE_SIZE = int(os.getenv("EMAIL_QUEUE_SIZE", "1000"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "5"))
+# Delay before the first retry, doubled for every further attempt
+EMAIL_RETRY_DELAY = float(os.getenv("EMAIL_RETRY_DELAY", "2"))
+
+logger = logging.getLogger("carbontrackhub.email")
+
+
+def smtp_configured() -> bool:
+    """Whether real delivery is set up; otherwise OTPs are printed to the console."""
+    if not FROM_EMAIL:
+        return False
+    if SMTP_LOGIN:
+        return bool(SMTP_USERNAME and SMTP_PASSWORD and SMTP_USERNAME != "your_email@gmail.com")
+    return bool(SMTP_SERVER)
+
+
+@dataclass(order=True)
+class _Pending:
+    due: float
+    seq: int
+    message: MIMEMultipart = field(compare=False)
+    attempts: int = field(default=0, compare=False)
+
+
+class _Connection:
+    """One sender's SMTP connection, opened on demand and reused while it stays alive."""
+
+    def __init__(self):
+        self.smtp: Optional[smtplib.SMTP] = None
+        self.last_used = 0.0
+
+    def get(self) -> smtplib.SMTP:
+        if self.smtp is not None and time.monotonic() - self.last_used > SMTP_CHECK_AFTER:
+            try:
+                self.smtp.noop()
+            except (smtplib.SMTPException, OSError):
+                self.close()
+        if self.smtp is None:
+            smtp = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=SMTP_TIMEOUT)
+            try:
+                if SMTP_STARTTLS:
+                    smtp.starttls()
+                if SMTP_LOGIN:
+                    smtp.login(SMTP_USERNAME, SMTP_PASSWORD)
+            except Exception:
+                smtp.close()
+                raise
+            self.smtp = smtp
+        self.last_used = time.monotonic()
+        return self.smtp
+
+    def close_if_idle(self) -> None:
+        if self.smtp is not None and time.monotonic() - self.last_used > SMTP_IDLE_TIMEOUT:
+            self.close()
+
+    def close(self) -> None:
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                self.smtp.close()
+            self.smtp = None
+
+
+def _is_permanent(error: Exception) -> bool:
+    """5xx replies (bad recipient, rejected content) will not succeed on retry, nor will a malformed message."""
+    if not isinstance(error, (smtplib.SMTPException, OSError)):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    code = getattr(error, "smtp_code", None)
+    return isinstance(code, int) and code >= 500 and not isinstance(error, smtplib.SMTPAuthenticationError)
+
+
+class EmailOutbox:
+    """Queue of outgoing messages drained by background sender threads."""
+
+    def __init__(self, senders: int = EMAIL_SENDERS):
+        self.senders = max(1, senders)
+        self._pending: List[_Pending] = []  # heap ordered by due time
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+
+    def _start(self) -> None:
+        # Called with the condition held; threads start on first use so forked workers get their own.
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        if len(self._threads) >= self.senders or self._stopping:
+            return
+        for i in range(len(self._threads), self.senders):
+            thread = threading.Thread(target=self._run, name=f"email-sender-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def enqueue(self, message: MIMEMultipart) -> bool:
+        """Queue a message for delivery; False if the outbox is full or shutting down."""
+        with self._cond:
+            if self._stopping or len(self._pending) >= EMAIL_QUEUE_SIZE:
+                EMAILS.inc("rejected")
+                return False
+            heapq.heappush(self._pending, _Pending(time.monotonic(), next(self._seq), message))
+            EMAIL_OUTBOX_DEPTH.set(len(self._pending))
+            self._start()
+            self._cond.notify()
+        return True
+
+    def _take_due(self) -> List[_Pending]:
+        now = time.monotonic()
+        batch = []
+        while self._pending and self._pending[0].due <= now and len(batch) < EMAIL_BATCH_SIZE:
+            batch.append(heapq.heappop(self._pending))
+        if batch:
+            EMAIL_OUTBOX_DEPTH.set(len(self._pending))
+        return batch
+
+    def _next_batch(self) -> Optional[List[_Pending]]:
+        """
+        Due messages, waiting for some if there are none; an empty batch when
+        the wait timed out, None once shutting down with nothing due.
+        """
+        with self._cond:
+            batch = self._take_due()
+            if not batch and not self._stopping:
+                timeout = SMTP_IDLE_TIMEOUT
+                if self._pending:
+                    timeout = min(timeout, self._pending[0].due - time.monotonic())
+                self._cond.wait(max(0.0, timeout))
+                batch = self._take_due()
+            if not batch and self._stopping:
+                return None
+            return batch
+
+    def _retry(self, item: _Pending, error: Exception) -> None:
+        item.attempts += 1
+        if item.attempts >= EMAIL_MAX_ATTEMPTS or _is_permanent(error):
+            EMAILS.inc("failed")
+            logger.error("Giving up on email to %s after %d attempt(s): %s", item.message["To"], item.attempts, error)
+            return
+        EMAILS.inc("retried")
+        logger.warning("Email to %s failed (attempt %d), retrying: %s", item.message["To"], item.attempts, error)
+        with self._cond:
+            item.due = time.monotonic() + EMAIL_RETRY_DELAY * 2 ** (item.attempts - 1)
+            heapq.heappush(self._pending, item)
+            EMAIL_OUTBOX_DEPTH.set(len(self._pending))
+            self._cond.notify()
+
+    def _run(self) -> None:
+        connection = _Connection()
+        try:
+            while (batch := self._next_batch()) is not None:
+                if not batch:
+                    connection.close_if_idle()
+                for item in batch:
+                    try:
+                        connection.get().send_message(item.message)
+                        EMAILS.inc("sent")
+                    except Exception as e:
+                        if not isinstance(e, (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError)):
+                            connection.close()  # the connection itself failed; reconnect for the next message
+                        self._retry(item, e)
+        finally:
+            connection.close()
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        """Send what is due now, then stop the senders; retries still waiting are dropped."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        with self._cond:
+            if self._pending:
+                logger.warning("Dropping %d unsent email(s) on shutdown", len(self._pending))
+
+
+outbox = EmailOutbox()
+
+
+def _otp_message(to_email: str, otp: str) -> MIMEMultipart:
+    msg = MIMEMultipart()
+    msg["From"] = FROM_EMAIL
+    msg["To"] = to_email
+    msg["Subject"] = "Your CarbonTrack Verification Code"
+
+    body = f"""
+    Hello,
+
+    Your verification code for CarbonTrack registration is: {otp}
+
+    This code will expire in 10 minutes.
+    If you did not request this, please ignore this email.
+    """
+    msg.attach(MIMEText(body, "plain"))
+    return msg
+
 
 def send_otp_email(to_email: str, otp: str) -> bool:
-    """Send an OTP code to the requested email address."""
+    """Queue an OTP email for the requested address; False if it could not be queued."""
     # If not fully configured, dummy print mode
-    if not SMTP_USERNAME or not SMTP_PASSWORD or SMTP_USERNAME == "your_email@gmail.com":
+    if not smtp_configured():
         print(f"=====================================")
         print(f"[DUMMY EMAIL] To: {to_email}")
         print(f"[DUMMY EMAIL] Subject: CarbonTrack Verification Code")
@@ -23,28 +262,4 @@ def send_otp_email(to_email: str, otp: str) -> bool:
         print(f"=====================================")
         return True
 
-    try:
-        msg = MIMEMultipart()
-        msg["From"] = FROM_EMAIL
-        msg["To"] = to_email
-        msg["Subject"] = "Your CarbonTrack Verification Code"
-
-        body = f"""
-        Hello,
-        
-        Your verification code for CarbonTrack registration is: {otp}
-        
-        This code will expire in 10 minutes. 
-        If you did not request this, please ignore this email.
-        """
-        msg.attach(MIMEText(body, "plain"))
-
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(SMTP_USERNAME, SMTP_PASSWORD)
-        server.send_message(msg)
-        server.quit()
-        return True
-    except Exception as e:
-        print(f"Failed to send email: {e}")
-        return False
+    return outbox.enqueue(_otp_message(to_email, otp))
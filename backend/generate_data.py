@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Synthetic large-scale data generator for CarbonTrackHub.
+
+Creates N panchayats with M firms each and Y years of MonthlyData per firm:
+
+    python generate_data.py --panchayats 200 --firms 250 --years 10     # ~6M rows
+    python generate_data.py --panchayats 10 --firms 20 --years 3 --reset
+
+Firm types follow a realistic mix (mostly households and shops, few
+industries). Each activity is drawn from a per-firm-type log-normal
+distribution around a firm-specific level, modulated by Kerala seasonality
+(pre-monsoon cooling and water peaks, monsoon dip in solar output, school
+vacations in April-May, Onam/Christmas waste) and a slow per-firm trend;
+solar adopters switch on in a random year. Generated panchayats use ids
+prefixed with `gen-`, so `--reset` removes exactly what a previous run added.
+
+Rows are written with batched executemany on the raw DBAPI connection, with
+SQLite journaling relaxed for the duration of the load.
+"""
+import argparse
+import math
+import random
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Iterator, List, Tuple
+
+from sqlalchemy import create_engine, insert, text
+
+from aggregates import rebuild_aggregates
+from anomalies import rebuild_stats
+from database import DATABASE_URL, bootstrap_schema
+from models import User, Panchayat, MonthlyData, EmissionFactors
+
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+DISTRICTS = [
+    "Thiruvananthapuram", "Kollam", "Pathanamthitta", "Alappuzha", "Kottayam", "Idukki", "Ernakulam",
+    "Thrissur", "Palakkad", "Malappuram", "Kozhikode", "Wayanad", "Kannur", "Kasaragod",
+]
+
+GENERATED_PREFIX = "gen-"
+
+# Share of firms of each type within a panchayat.
+FIRM_TYPE_WEIGHTS = {"household": 0.55, "shop": 0.20, "other": 0.10, "school": 0.08, "industry": 0.07}
+
+# Monthly activity per firm type: (probability the firm has this activity, median, log-normal sigma).
+FIRM_PROFILES: Dict[str, Dict[str, Tuple[float, float, float]]] = {
+    "household": {
+        "electricity_kwh": (1.0, 150, 0.45), "diesel_liters": (0.05, 10, 0.5), "petrol_liters": (0.7, 25, 0.6),
+        "waste_kg": (1.0, 45, 0.4), "water_liters": (1.0, 12000, 0.4), "solar_units": (0.12, 120, 0.3),
+    },
+    "shop": {
+        "electricity_kwh": (1.0, 450, 0.6), "diesel_liters": (0.10, 20, 0.6), "petrol_liters": (0.6, 40, 0.6),
+        "waste_kg": (1.0, 120, 0.5), "water_liters": (1.0, 6000, 0.5), "solar_units": (0.15, 300, 0.3),
+    },
+    "school": {
+        "electricity_kwh": (1.0, 1200, 0.5), "diesel_liters": (0.6, 150, 0.5), "petrol_liters": (0.5, 30, 0.5),
+        "waste_kg": (1.0, 350, 0.4), "water_liters": (1.0, 60000, 0.4), "solar_units": (0.35, 900, 0.3),
+    },
+    "industry": {
+        "electricity_kwh": (1.0, 9000, 0.8), "diesel_liters": (0.85, 900, 0.7), "petrol_liters": (0.7, 150, 0.6),
+        "waste_kg": (1.0, 2500, 0.7), "water_liters": (1.0, 250000, 0.7), "solar_units": (0.30, 4000, 0.4),
+    },
+    "other": {
+        "electricity_kwh": (1.0, 600, 0.6), "diesel_liters": (0.20, 80, 0.6), "petrol_liters": (0.6, 60, 0.6),
+        "waste_kg": (1.0, 150, 0.5), "water_liters": (1.0, 15000, 0.5), "solar_units": (0.15, 400, 0.3),
+    },
+}
+
+# Trees planted per month: (probability of planting in a given month, mean trees when planting).
+TREE_PROFILES = {"household": (0.04, 2), "shop": (0.02, 2), "school": (0.15, 8), "industry": (0.08, 15), "other": (0.06, 4)}
+
+# Month multipliers (Jan..Dec) capturing Kerala's climate and calendar.
+SEASONALITY = {
+    "electricity_kwh": [0.95, 1.00, 1.15, 1.25, 1.20, 0.95, 0.90, 0.90, 0.92, 0.95, 0.93, 0.95],
+    "diesel_liters":   [1.00, 1.00, 1.00, 1.00, 1.00, 0.95, 0.95, 1.00, 1.05, 1.00, 1.00, 1.05],
+    "petrol_liters":   [1.00, 1.00, 1.00, 1.05, 1.05, 0.90, 0.90, 1.00, 1.10, 1.00, 1.00, 1.10],
+    "waste_kg":        [1.00, 0.95, 1.00, 1.05, 1.00, 0.95, 0.95, 1.15, 1.15, 1.00, 1.00, 1.10],
+    "water_liters":    [1.00, 1.05, 1.20, 1.30, 1.25, 0.85, 0.80, 0.80, 0.85, 0.90, 0.95, 1.00],
+    "solar_units":     [1.10, 1.15, 1.20, 1.15, 1.00, 0.60, 0.55, 0.65, 0.75, 0.85, 0.95, 1.05],
+    "trees_planted":   [0.3, 0.3, 0.3, 0.5, 0.8, 3.0, 2.5, 1.2, 0.8, 0.6, 0.4, 0.3],
+}
+
+# Schools run at a fraction of their usual load during the April-May vacation.
+VACATION_FACTOR = {"school": {3: 0.4, 4: 0.4}}
+
+ACTIVITIES = list(FIRM_PROFILES["household"])
+MONTHLY_COLUMNS = ["id", "user_id", "panchayat_id", "month", "year", *ACTIVITIES, "trees_planted",
+                   "created_at", "updated_at"]
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"  # SQLAlchemy's SQLite DateTime storage format
+
+
+def _uuid(rng: random.Random) -> str:
+    """Seeded UUID4: reproducible across runs and cheaper than uuid.uuid4()."""
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _submitted_at(year: int, month_index: int) -> str:
+    """Entries are submitted at the start of the following month."""
+    year, month_index = (year + 1, 0) if month_index == 11 else (year, month_index + 1)
+    return datetime(year, month_index + 1, 1, 9, 0).strftime(DATETIME_FORMAT)
+
+
+def generate_firm_rows(rng: random.Random, user_id: str, panchayat_id: str, firm_type: str,
+                       periods: List[Tuple[int, int, str]]) -> Iterator[tuple]:
+    """Yield one MonthlyData tuple (MONTHLY_COLUMNS order) per period for a single firm."""
+    profile = FIRM_PROFILES[firm_type]
+    vacation = VACATION_FACTOR.get(firm_type, {})
+    tree_probability, tree_mean = TREE_PROFILES[firm_type]
+    first_year, last_year = periods[0][0], periods[-1][0]
+
+    # Firm-level state: which activities it has, its typical level, its trend and when solar came online.
+    levels = {}
+    for activity, (probability, median, sigma) in profile.items():
+        if rng.random() < probability:
+            levels[activity] = median * rng.lognormvariate(0, sigma)
+    growth = rng.gauss(0.03, 0.02)
+    solar_from = rng.randint(first_year, last_year) if "solar_units" in levels else None
+
+    for year, month_index, submitted in periods:
+        trend = (1 + growth) ** (year - first_year)
+        month_factor = vacation.get(month_index, 1.0)
+        values = []
+        for activity in ACTIVITIES:
+            level = levels.get(activity)
+            if level is None or (activity == "solar_units" and year < solar_from):
+                values.append(0.0)
+                continue
+            noise = math.exp(rng.gauss(0, 0.12))
+            factor = SEASONALITY[activity][month_index] * noise
+            if activity != "solar_units":
+                factor *= trend * month_factor
+            values.append(round(level * factor, 2))
+
+        trees = 0
+        if rng.random() < tree_probability * SEASONALITY["trees_planted"][month_index]:
+            trees = max(1, int(rng.expovariate(1 / tree_mean)))
+
+        yield (_uuid(rng), user_id, panchayat_id, MONTHS[month_index], year, *values, trees, submitted, submitted)
+
+
+def reset_generated(engine) -> None:
+    """Delete panchayats, firms and MonthlyData created by a previous run."""
+    pattern = GENERATED_PREFIX + "%"
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM monthly_data WHERE panchayat_id LIKE :p"), {"p": pattern})
+        conn.execute(text("DELETE FROM activity_aggregates WHERE panchayat_id LIKE :p"), {"p": pattern})
+        conn.execute(text("DELETE FROM anomaly_flags WHERE panchayat_id LIKE :p"), {"p": pattern})
+        conn.execute(text("DELETE FROM activity_stats WHERE user_id IN "
+                          "(SELECT id FROM users WHERE panchayat_id LIKE :p AND role = 'user')"), {"p": pattern})
+        conn.execute(text("DELETE FROM carbon_metrics WHERE panchayat_id LIKE :p"), {"p": pattern})
+        conn.execute(text("DELETE FROM users WHERE panchayat_id LIKE :p AND role = 'user'"), {"p": pattern})
+        conn.execute(text("DELETE FROM panchayats WHERE id LIKE :p"), {"p": pattern})
+
+
+def generate(database_url: str, panchayats: int, firms: int, years: int, end_year: int, seed: int,
+             password: str, chunk_size: int, reset: bool) -> Dict[str, int]:
+    from auth import get_password_hash
+
+    engine = create_engine(database_url)
+    bootstrap_schema(engine)
+    if reset:
+        print("Removing previously generated data...")
+        reset_generated(engine)
+
+    with engine.connect() as conn:
+        existing = conn.execute(text("SELECT COUNT(*) FROM panchayats WHERE id LIKE :p"),
+                                {"p": GENERATED_PREFIX + "%"}).scalar()
+    if existing:
+        raise SystemExit(f"{existing} generated panchayats already exist; re-run with --reset to replace them.")
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    hashed_password = get_password_hash(password)
+    periods = [(year, month_index, _submitted_at(year, month_index))
+               for year in range(end_year - years + 1, end_year + 1) for month_index in range(12)]
+    firm_types = list(FIRM_TYPE_WEIGHTS)
+    firm_weights = list(FIRM_TYPE_WEIGHTS.values())
+
+    panchayat_rows, user_rows = [], []
+    for p in range(panchayats):
+        district = DISTRICTS[p % len(DISTRICTS)]
+        panchayat_id = f"{GENERATED_PREFIX}panchayat-{p}"
+        panchayat_rows.append({
+            "id": panchayat_id, "name": f"Gram Panchayat {district} {p // len(DISTRICTS) + 1}",
+            "district": district, "state": "Kerala", "total_population": rng.randint(8000, 45000),
+            "created_at": now, "updated_at": now,
+        })
+        for f in range(firms):
+            firm_type = rng.choices(firm_types, firm_weights)[0]
+            username = f"gen_p{p}_f{f}"
+            user_rows.append({
+                "id": _uuid(rng), "username": username, "email": f"{username}@example.com",
+                "hashed_password": hashed_password, "role": "user", "panchayat_id": panchayat_id,
+                "firm_type": firm_type, "firm_name": f"{firm_type.title()} {p}-{f}", "is_active": True,
+                "created_at": now, "updated_at": now,
+            })
+
+    with engine.begin() as conn:
+        if conn.execute(text("SELECT COUNT(*) FROM emission_factors")).scalar() == 0:
+            conn.execute(insert(EmissionFactors.__table__), [{"id": _uuid(rng), "created_at": now, "updated_at": now}])
+        conn.execute(insert(Panchayat.__table__), panchayat_rows)
+        for i in range(0, len(user_rows), chunk_size):
+            conn.execute(insert(User.__table__), user_rows[i:i + chunk_size])
+    print(f"Inserted {len(panchayat_rows)} panchayats and {len(user_rows)} firms")
+
+    total = len(user_rows) * len(periods)
+    written = 0
+    started = time.perf_counter()
+    placeholders = ", ".join("?" for _ in MONTHLY_COLUMNS)
+    statement = f"INSERT INTO {MonthlyData.__tablename__} ({', '.join(MONTHLY_COLUMNS)}) VALUES ({placeholders})"
+    is_sqlite = engine.dialect.name == "sqlite"
+
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        if is_sqlite:
+            # Bulk-load settings: a crash mid-load loses only this run's rows, which --reset clears anyway.
+            cursor.execute("PRAGMA synchronous = OFF")
+            cursor.execute("PRAGMA journal_mode = MEMORY")
+            cursor.execute("PRAGMA cache_size = -200000")
+        else:
+            statement = statement.replace("?", "%s")
+
+        batch = []
+        for user in user_rows:
+            batch.extend(generate_firm_rows(rng, user["id"], user["panchayat_id"], user["firm_type"], periods))
+            if len(batch) >= chunk_size:
+                cursor.executemany(statement, batch)
+                raw.commit()
+                written += len(batch)
+                batch = []
+                elapsed = time.perf_counter() - started
+                print(f"\r  {written:,}/{total:,} rows ({written / elapsed:,.0f} rows/s)", end="", flush=True)
+        if batch:
+            cursor.executemany(statement, batch)
+            raw.commit()
+            written += len(batch)
+        if is_sqlite:
+            cursor.execute("PRAGMA synchronous = FULL")
+            cursor.execute("PRAGMA journal_mode = DELETE")
+        cursor.close()
+    finally:
+        raw.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"\r  {written:,}/{total:,} rows in {elapsed:.1f}s ({written / max(elapsed, 1e-9):,.0f} rows/s)")
+    # The raw inserts bypass the ORM listeners, so aggregate the generated panchayats in one pass.
+    aggregate_rows = rebuild_aggregates(engine, GENERATED_PREFIX)
+    print(f"Aggregated into {aggregate_rows:,} activity_aggregates rows")
+    # Seed the anomaly detector's per-firm statistics with the generated history.
+    stats_rows = rebuild_stats(engine, GENERATED_PREFIX)
+    engine.dispose()
+    print(f"Computed {stats_rows:,} activity_stats rows")
+    return {"panchayats": len(panchayat_rows), "firms": len(user_rows), "monthly_data": written}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic panchayats, firms and MonthlyData.")
+    parser.add_argument("--panchayats", type=int, default=10, help="Number of panchayats (N)")
+    parser.add_argument("--firms", type=int, default=50, help="Firms per panchayat (M)")
+    parser.add_argument("--years", type=int, default=3, help="Years of monthly data per firm (Y)")
+    parser.add_argument("--end-year", type=int, default=datetime.utcnow().year - 1, help="Last generated year")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--password", default="password123", help="Password for every generated firm account")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="Rows per executemany batch")
+    parser.add_argument("--database-url", default=DATABASE_URL, help="Target database (default: DATABASE_URL)")
+    parser.add_argument("--reset", action="store_true", help="Remove previously generated data first")
+    args = parser.parse_args()
+
+    print(f"Generating {args.panchayats} panchayats x {args.firms} firms x {args.years} years "
+          f"= {args.panchayats * args.firms * args.years * 12:,} MonthlyData rows")
+    summary = generate(args.database_url, args.panchayats, args.firms, args.years, args.end_year, args.seed,
+                       args.password, args.chunk_size, args.reset)
+    print(f"✅ Done: {summary['panchayats']} panchayats, {summary['firms']} firms, "
+          f"{summary['monthly_data']:,} monthly entries (password: {args.password})")
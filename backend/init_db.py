@@ -1,23 +1,27 @@
 #!/usr/bin/env python3
 """
 Database initialization script for CarbonTrackHub Backend
+
+Run once per deployment (not per worker) before starting the API:
+
+    python init_db.py            # create missing tables, stamp the schema version, seed initial data
+    python init_db.py --check    # only verify the schema, as the API does at startup
 """
+import argparse
+import sys
 
-from database import create_tables, SessionLocal, engine
-from models import Base
+from database import SessionLocal, engine, bootstrap_schema, check_schema, SchemaError
 from calculations import seed_initial_data
 
-def init_database():
+def init_database(seed: bool = True):
     """Initialize database and seed initial data."""
-    print("Creating database tables...")
-    
-    # Import all models to ensure they're registered
-    from models import User, Panchayat, MonthlyData, EmissionFactors, CarbonMetrics
-    
-    # Create all tables
-    Base.metadata.create_all(bind=engine)
-    print("Database tables created successfully!")
-    
+    print("Bootstrapping database schema...")
+    version = bootstrap_schema(engine)
+    print(f"Database schema ready (version {version})")
+
+    if not seed:
+        return
+
     # Seed initial data
     print("Seeding initial data...")
     db = SessionLocal()
@@ -30,4 +34,16 @@ def init_database():
         db.close()
 
 if __name__ == "__main__":
-    init_database()
+    parser = argparse.ArgumentParser(description="Initialize the CarbonTrackHub database.")
+    parser.add_argument("--check", action="store_true", help="Verify the schema without changing anything")
+    parser.add_argument("--no-seed", action="store_true", help="Create/stamp the schema without seeding data")
+    args = parser.parse_args()
+
+    try:
+        if args.check:
+            print(f"Database schema OK (version {check_schema(engine)})")
+        else:
+            init_database(seed=not args.no_seed)
+    except SchemaError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,334 @@
+"""
+In-process background jobs for heavy work (AI predictions, full exports, recomputes).
+
+Jobs are rows in the `jobs` table, so their state, progress and results
+survive restarts and are visible to every worker. `POST /jobs/` inserts a job
+and returns at once; a bounded thread pool (JOB_WORKERS threads per process)
+runs it. A job is claimed with a conditional UPDATE (queued -> running), so
+with several API processes each job still runs once. Failed attempts are
+retried with exponential backoff up to the job's max_attempts, except for
+JobError, which marks a job as failed for good.
+
+Handlers are registered with @job_handler(kind) and receive a session and a
+JobContext (params, the requesting user, progress reporting); they return a
+JSON-serialisable result.
+"""
+import asyncio
+import csv
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import and_, or_, update
+from sqlalchemy.orm import Session
+
+from database import BASE_DIR, SessionLocal
+from metrics import JOB_DURATION, track_ai_call
+from models import Job, MonthlyData, User
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Delay before the first retry, doubled for every further attempt
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", "5"))
+# A running job without progress for this long is assumed lost with its process and is requeued
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "900"))
+MAX_ACTIVE_JOBS_PER_USER = int(os.getenv("MAX_ACTIVE_JOBS_PER_USER", "5"))
+EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.join(BASE_DIR, "exports"))
+
+logger = logging.getLogger("carbontrackhub.jobs")
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+ACTIVE = (QUEUED, RUNNING)
+
+
+class JobError(Exception):
+    """A failure that retrying cannot fix (bad parameters, nothing to do)."""
+
+
+class JobRejected(Exception):
+    """The job cannot be submitted; `status_code` is the HTTP status to answer with."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class JobSpec:
+    handler: Callable[[Session, "JobContext"], Any]
+    admin_only: bool = False
+    max_attempts: int = JOB_MAX_ATTEMPTS
+
+
+HANDLERS: Dict[str, JobSpec] = {}
+
+
+def job_handler(kind: str, admin_only: bool = False, max_attempts: Optional[int] = None):
+    def register(handler):
+        HANDLERS[kind] = JobSpec(handler, admin_only, max_attempts or JOB_MAX_ATTEMPTS)
+        return handler
+    return register
+
+
+class JobContext:
+    """What a handler sees of its job. progress() writes at most about once a second."""
+
+    def __init__(self, job_id: str, user_id: str, params: dict, session_factory=SessionLocal):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.params = params
+        self._session_factory = session_factory
+        self._last_write = 0.0
+
+    def progress(self, fraction: float, message: Optional[str] = None, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_write < 1.0:
+            return
+        self._last_write = now
+        # A separate short transaction, so progress is visible while the handler's own session is busy.
+        db = self._session_factory()
+        try:
+            db.execute(update(Job).where(Job.id == self.job_id).values(
+                progress=max(0.0, min(1.0, fraction)), message=message, updated_at=datetime.utcnow()))
+            db.commit()
+        finally:
+            db.close()
+
+
+class JobRunner:
+    def __init__(self, session_factory=SessionLocal, workers: int = JOB_WORKERS):
+        self.session_factory = session_factory
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._timers = set()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+            return self._executor
+
+    def submit(self, db: Session, kind: str, params: dict, user) -> Job:
+        """Persist a new job for `user` and queue it; raises JobRejected."""
+        spec = HANDLERS.get(kind)
+        if spec is None:
+            raise JobRejected(400, f"Unknown job kind '{kind}'. Available: {', '.join(sorted(HANDLERS))}")
+        if spec.admin_only and user.role != "admin":
+            raise JobRejected(403, "Admin access required for this job")
+        active = db.query(Job).filter(Job.created_by == user.id, Job.status.in_(ACTIVE)).count()
+        if active >= MAX_ACTIVE_JOBS_PER_USER:
+            raise JobRejected(429, f"Too many active jobs ({active}); wait for some to finish")
+
+        job = Job(kind=kind, status=QUEUED, params_json=json.dumps(params or {}), progress=0.0,
+                  attempts=0, max_attempts=spec.max_attempts, created_by=user.id)
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        self.schedule(job.id)
+        return job
+
+    def schedule(self, job_id: str, delay: float = 0) -> None:
+        if delay > 0:
+            timer = threading.Timer(delay, self._fire, (job_id,))
+            timer.daemon = True
+            with self._lock:
+                self._timers.add(timer)
+            timer.start()
+        else:
+            self._pool().submit(self.run, job_id)
+
+    def _fire(self, job_id: str) -> None:
+        with self._lock:
+            self._timers = {timer for timer in self._timers if timer.is_alive() and timer is not threading.current_thread()}
+        self.schedule(job_id)
+
+    def _claim(self, db: Session, job_id: str) -> bool:
+        now = datetime.utcnow()
+        claimed = db.execute(
+            update(Job).where(Job.id == job_id, Job.status == QUEUED)
+            .values(status=RUNNING, attempts=Job.attempts + 1, started_at=now, updated_at=now, error=None)
+        ).rowcount
+        db.commit()
+        return claimed == 1
+
+    def run(self, job_id: str) -> None:
+        """Run one attempt of a queued job (in a pool thread)."""
+        db = self.session_factory()
+        try:
+            if not self._claim(db, job_id):
+                return  # another thread or process got it first, or it was cancelled
+            job = db.query(Job).filter(Job.id == job_id).first()
+            spec = HANDLERS.get(job.kind)
+            context = JobContext(job.id, job.created_by, job.params, self.session_factory)
+            started = time.perf_counter()
+            outcome = "ok"
+            try:
+                if spec is None:
+                    raise JobError(f"No handler for job kind '{job.kind}'")
+                result = spec.handler(db, context)
+                db.rollback()  # discard anything the handler left uncommitted
+                job = db.query(Job).filter(Job.id == job_id).one()
+                job.status, job.progress, job.result_json = SUCCEEDED, 1.0, json.dumps(result, default=str)
+                job.finished_at = datetime.utcnow()
+            except Exception as e:
+                outcome = "error"
+                db.rollback()
+                job = db.query(Job).filter(Job.id == job_id).one()
+                job.error = f"{type(e).__name__}: {e}"
+                if isinstance(e, JobError) or job.attempts >= job.max_attempts:
+                    job.status, job.finished_at = FAILED, datetime.utcnow()
+                else:
+                    job.status = QUEUED
+                    job.message = f"Retrying after attempt {job.attempts} failed"
+            finally:
+                JOB_DURATION.observe(time.perf_counter() - started, job.kind, outcome)
+            db.commit()
+            if job.status == QUEUED:
+                self.schedule(job.id, JOB_RETRY_DELAY * 2 ** (job.attempts - 1))
+        except Exception:
+            # Pool futures are never awaited, so log instead of losing the error; recover() requeues the job later.
+            logger.exception("Job %s could not be recorded", job_id)
+        finally:
+            db.close()
+
+    def recover(self) -> int:
+        """Requeue jobs lost with a previous process and queue everything waiting; returns how many."""
+        db = self.session_factory()
+        try:
+            stale_before = datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS)
+            db.execute(update(Job).where(Job.status == RUNNING, Job.updated_at < stale_before)
+                       .values(status=QUEUED, message="Requeued after its worker stopped"))
+            db.commit()
+            queued = [job_id for (job_id,) in db.query(Job.id).filter(Job.status == QUEUED).order_by(Job.created_at)]
+        finally:
+            db.close()
+        for job_id in queued:
+            self.schedule(job_id)
+        return len(queued)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            for timer in self._timers:
+                timer.cancel()
+            self._timers.clear()
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            # Jobs not yet started stay queued in the database and are picked up by recover().
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+runner = JobRunner()
+
+
+def _job_user(db: Session, context: JobContext) -> User:
+    user = db.query(User).filter(User.id == context.user_id).first()
+    if user is None:
+        raise JobError("The user who requested this job no longer exists")
+    return user
+
+
+@job_handler("predictions")
+def run_predictions(db: Session, context: JobContext):
+    """The /analytics/predictions forecast, computed off the request path."""
+    from ai_service import get_ai_prediction
+    from calculations import get_prediction_history
+
+    context.progress(0.1, "Loading history", force=True)
+    historical_data = get_prediction_history(db, _job_user(db, context))
+    if not historical_data:
+        raise JobError("No data available to generate predictions. Please submit at least one month of data first.")
+
+    context.progress(0.3, f"Asking the AI model about {len(historical_data)} entries", force=True)
+    with track_ai_call("gemini_prediction") as call:
+        prediction = asyncio.run(get_ai_prediction(historical_data))
+        if "error" in prediction:
+            call["outcome"] = "error"
+    if "error" in prediction:
+        raise RuntimeError(prediction["error"])
+    return prediction
+
+
+EXPORT_COLUMNS = ("id", "username", "firm_type", "firm_name", "panchayat_id", "month", "year",
+                  "electricity_kwh", "diesel_liters", "petrol_liters", "waste_kg", "water_liters",
+                  "solar_units", "trees_planted", "total_emissions", "total_offsets", "net_footprint",
+                  "created_at", "updated_at")
+
+
+EXPORT_PAGE_SIZE = 5000
+
+
+def export_path(job_id: str) -> str:
+    return os.path.join(EXPORT_DIR, f"{job_id}.csv")
+
+
+@job_handler("export")
+def run_export(db: Session, context: JobContext):
+    """Full-history CSV export with calculated emissions (own data for users; optional panchayat/year filters)."""
+    from calculations import calculate_emissions, get_emission_factors
+
+    user = _job_user(db, context)
+    query = db.query(MonthlyData, User.username, User.firm_type, User.firm_name).join(User, MonthlyData.user_id == User.id)
+    if user.role == "user":
+        query = query.filter(MonthlyData.user_id == user.id)
+    elif context.params.get("user_id"):
+        query = query.filter(MonthlyData.user_id == context.params["user_id"])
+    if context.params.get("panchayat_id"):
+        query = query.filter(MonthlyData.panchayat_id == context.params["panchayat_id"])
+    if context.params.get("year"):
+        query = query.filter(MonthlyData.year == int(context.params["year"]))
+
+    total = query.count()
+    emission_factors = get_emission_factors(db)
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = export_path(context.job_id)
+    written = 0
+    # Write to a temporary name so a half-written file is never served
+    with open(path + ".part", "w", newline="", encoding="utf-8") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(EXPORT_COLUMNS)
+        # Keyset pages rather than one streaming cursor: on SQLite an open read would block the progress writes.
+        last = None
+        while True:
+            page = query
+            if last is not None:
+                page = page.filter(or_(MonthlyData.year > last[0],
+                                       and_(MonthlyData.year == last[0], MonthlyData.id > last[1])))
+            rows = page.order_by(MonthlyData.year, MonthlyData.id).limit(EXPORT_PAGE_SIZE).all()
+            if not rows:
+                break
+            for data, username, firm_type, firm_name in rows:
+                totals = calculate_emissions(data, emission_factors)
+                writer.writerow((
+                    data.id, username, firm_type, firm_name, data.panchayat_id, data.month, data.year,
+                    data.electricity_kwh, data.diesel_liters, data.petrol_liters, data.waste_kg, data.water_liters,
+                    data.solar_units, data.trees_planted, round(totals["total_emissions"], 4),
+                    round(totals["total_offsets"], 4), round(totals["net_footprint"], 4),
+                    data.created_at, data.updated_at,
+                ))
+            written += len(rows)
+            last = (rows[-1][0].year, rows[-1][0].id)
+            context.progress(written / max(total, 1), f"{written:,}/{total:,} rows")
+    os.replace(path + ".part", path)
+    return {"rows": written, "file": os.path.basename(path), "media_type": "text/csv"}
+
+
+@job_handler("rebuild_aggregates", admin_only=True, max_attempts=1)
+def run_rebuild_aggregates(db: Session, context: JobContext):
+    """Recompute activity_aggregates and the anomaly statistics from monthly_data."""
+    from aggregates import rebuild_aggregates
+    from anomalies import rebuild_stats
+
+    bind = db.get_bind()
+    context.progress(0.0, "Rebuilding activity aggregates", force=True)
+    aggregate_rows = rebuild_aggregates(bind)
+    context.progress(0.5, "Rebuilding anomaly statistics", force=True)
+    stats_rows = rebuild_stats(bind)
+    return {"activity_aggregates": aggregate_rows, "activity_stats": stats_rows}
@@ -0,0 +1,330 @@
+"""
+Live dashboard updates over server-sent events (`GET /analytics/stream`).
+
+Every committed change to MonthlyData is pushed to the dashboards watching
+it as an incremental delta, so clients apply it to the totals they already
+hold instead of polling `/analytics/*`. Deltas come from the changed row
+alone: the ORM flush events record the activity values that went away
+(sign -1) and the ones that arrived (sign +1) per month, and because
+emissions are linear in the activity data, running calculate_emissions over
+that difference gives exactly the change in every dashboard total.
+
+Channels:
+
+    ("panchayat", id)   admins watching one panchayat
+    ("user", id)        a firm's own dashboard
+    ("all",)            admins watching everything
+
+After the transaction commits, one event per channel is built and encoded
+once, then handed to each subscriber's bounded queue on the event loop. A
+client whose queue is full is disconnected (EventSource reconnects, and the
+dashboard refetches) instead of buffering without limit. Nothing is computed
+while nobody is subscribed.
+
+    event: delta
+    data: {"changes": [{"year": 2025, "month": "Jan", "record_count": 1,
+            "total_emissions": 12.5, "total_offsets": 1.8, "net_footprint": 10.7,
+            "sectors": {"electricity": 7.2, "transport": 5.3, "waste": 0.0, "water": 0.0}}]}
+
+Changing the emission factors alters every total, so it sends a `refresh`
+event to all channels instead. With a shared cache backend (multi-worker
+mode, see cache.py) events travel through the backend's event log, so a
+change saved by one worker reaches the dashboards connected to every other.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+
+import cache
+from aggregates import ACTIVITY_COLUMNS, MONTH_NUMBERS, _new_values, _old_values, add_row
+from calculations import calculate_emissions
+from metrics import LIVE_EVENTS, LIVE_SUBSCRIBERS
+from models import EmissionFactors, MonthlyData
+
+# Events buffered per client before it counts as too slow and is dropped
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "100"))
+# Seconds between keepalive comments on an idle stream (proxies close silent connections)
+LIVE_KEEPALIVE = float(os.getenv("LIVE_KEEPALIVE", "15"))
+# Seconds between polls of the shared event log (multi-worker mode)
+LIVE_RELAY_INTERVAL = float(os.getenv("LIVE_RELAY_INTERVAL", "0.25"))
+RELAY_TOPIC = "live:events"
+PRESENCE_KEY = "live:subscribed"
+PRESENCE_TTL = 30.0
+
+logger = logging.getLogger("carbontrackhub.live")
+
+Channel = Tuple[str, ...]
+ALL: Channel = ("all",)
+
+_DELTAS = "live_deltas"
+_REFRESH = "live_refresh"
+_FACTORS = "live_factors"
+
+
+def channel_name(channel: Channel) -> str:
+    return ":".join(channel)
+
+
+class Subscription:
+    """One connected client: a bounded queue of encoded SSE frames."""
+
+    def __init__(self, channel: Channel):
+        self.channel = channel
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=LIVE_QUEUE_SIZE)
+        self.dropped = False
+
+    def offer(self, frame: bytes) -> bool:
+        """Queue a frame; on overflow mark the subscription dropped and wake its reader."""
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            return False
+
+
+class Broadcaster:
+    """
+    Per-channel fan-out of committed changes to subscriber queues on the event loop.
+
+    With a shared cache backend (several workers), changes are appended to the
+    backend's event log instead, and every worker that has subscribers relays
+    the log to them; workers advertise that they have subscribers with a
+    short-lived presence key, so writers skip the work while nobody watches.
+    """
+
+    def __init__(self):
+        self._channels: Dict[Channel, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._relay: Optional[asyncio.Task] = None
+        self._ids = itertools.count(1)
+        self._remote = (0.0, False)  # (checked at, anyone subscribed on any worker)
+
+    def subscribe(self, channel: Channel) -> Subscription:
+        """Register a client; must be called on the event loop that serves the stream."""
+        subscription = Subscription(channel)
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._channels.setdefault(channel, set()).add(subscription)
+        if cache.backend.shared and self._relay is None:
+            self._relay = self._loop.create_task(self._relay_log())
+        LIVE_SUBSCRIBERS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers is None or subscription not in subscribers:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._channels[subscription.channel]
+        LIVE_SUBSCRIBERS.dec()
+
+    def active(self) -> bool:
+        """Whether anyone, on this or (with a shared backend) any other worker, is subscribed."""
+        if self._channels:
+            return True
+        if not cache.backend.shared:
+            return False
+        checked, present = self._remote
+        if time.monotonic() - checked > 1.0:
+            try:
+                present = cache.backend.get(PRESENCE_KEY) is not None
+            except Exception:
+                present = False
+            self._remote = (time.monotonic(), present)
+        return present
+
+    def watched(self, channels) -> List[Channel]:
+        """The given channels that may have a subscriber (all of them when other workers could)."""
+        if cache.backend.shared:
+            return list(channels) if self.active() else []
+        with self._lock:
+            return [channel for channel in channels if channel in self._channels]
+
+    def send(self, events: List[Tuple[Optional[Channel], str, dict]]) -> None:
+        """Deliver (channel, kind, payload) events - channel None means every channel; callable from any thread."""
+        if cache.backend.shared:
+            message = json.dumps([[channel, kind, payload] for channel, kind, payload in events])
+            try:
+                cache.backend.publish(RELAY_TOPIC, message.encode())
+            except Exception as e:
+                logger.warning("Could not relay live updates: %s", e)
+            return
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        for channel, kind, payload in events:
+            loop.call_soon_threadsafe(self._deliver, channel, kind, payload)
+
+    def _deliver(self, channel: Optional[Channel], kind: str, payload: dict) -> None:
+        """Encode one event once and queue it to each subscriber of `channel` (on the event loop)."""
+        with self._lock:
+            if channel is None:
+                subscribers = [s for channel_subscribers in self._channels.values() for s in channel_subscribers]
+            else:
+                subscribers = list(self._channels.get(channel, ()))
+        if not subscribers:
+            return
+        data = json.dumps(payload, separators=(",", ":"))
+        frame = f"id: {next(self._ids)}\nevent: {kind}\ndata: {data}\n\n".encode()
+        LIVE_EVENTS.inc(kind)
+        for subscription in subscribers:
+            if not subscription.offer(frame):
+                LIVE_EVENTS.inc("dropped")
+                self.unsubscribe(subscription)
+
+    async def _relay_log(self) -> None:
+        """Pass events published by any worker to this worker's subscribers."""
+        loop = asyncio.get_running_loop()
+        cursor, announced = None, 0.0
+        while True:
+            try:
+                if self._channels and time.monotonic() - announced > PRESENCE_TTL / 3:
+                    await loop.run_in_executor(None, cache.backend.set, PRESENCE_KEY, b"1", PRESENCE_TTL)
+                    announced = time.monotonic()
+                cursor, messages = await loop.run_in_executor(None, cache.backend.poll, RELAY_TOPIC, cursor)
+                for message in messages:
+                    for channel, kind, payload in json.loads(message):
+                        self._deliver(tuple(channel) if channel else None, kind, payload)
+            except Exception as e:
+                logger.warning("Live update relay failed: %s", e)
+            await asyncio.sleep(LIVE_RELAY_INTERVAL)
+
+
+broadcaster = Broadcaster()
+
+
+def _channels_for(values: dict) -> List[Channel]:
+    channels = [ALL]
+    if values["panchayat_id"]:
+        channels.append(("panchayat", values["panchayat_id"]))
+    if values["user_id"]:
+        channels.append(("user", values["user_id"]))
+    return channels
+
+
+def _record(connection, target: MonthlyData, values: dict, sign: int) -> None:
+    """Accumulate one side of a row change in the session, for the channels that are watched."""
+    session = object_session(target)
+    if session is None:
+        return
+    channels = broadcaster.watched(_channels_for(values))
+    if not channels:
+        return
+    if _FACTORS not in session.info:
+        # Read once per transaction, on the flush's own connection
+        session.info[_FACTORS] = connection.execute(select(EmissionFactors.__table__).limit(1)).first()
+    deltas = session.info.setdefault(_DELTAS, {})
+    for channel in channels:
+        add_row(deltas, (channel, values["year"], values["month"]), values, sign)
+
+
+@event.listens_for(MonthlyData, "after_insert")
+def _inserted(mapper, connection, target):
+    if broadcaster.active():
+        _record(connection, target, _new_values(target), 1)
+
+
+@event.listens_for(MonthlyData, "after_update")
+def _updated(mapper, connection, target):
+    if not broadcaster.active():
+        return
+    old, new = _old_values(target), _new_values(target)
+    if old != new:
+        _record(connection, target, old, -1)
+        _record(connection, target, new, 1)
+
+
+@event.listens_for(MonthlyData, "after_delete")
+def _deleted(mapper, connection, target):
+    if broadcaster.active():
+        _record(connection, target, _old_values(target), -1)
+
+
+@event.listens_for(EmissionFactors, "after_insert")
+@event.listens_for(EmissionFactors, "after_update")
+def _factors_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None and broadcaster.active():
+        session.info[_REFRESH] = True
+
+
+def _change(year: int, month: str, delta: List[float], factors) -> dict:
+    activity = SimpleNamespace(**dict(zip(ACTIVITY_COLUMNS, delta)))
+    result = calculate_emissions(activity, factors)
+    breakdown = result["breakdown"]
+    return {
+        "year": year,
+        "month": month,
+        "record_count": int(delta[-1]),
+        "total_emissions": result["total_emissions"],
+        "total_offsets": result["total_offsets"],
+        "net_footprint": result["net_footprint"],
+        "sectors": {
+            "electricity": breakdown["electricity"],
+            "transport": breakdown["diesel"] + breakdown["petrol"],
+            "waste": breakdown["waste"],
+            "water": breakdown["water"],
+        },
+    }
+
+
+@event.listens_for(Session, "after_commit")
+def _publish(session):
+    deltas = session.info.pop(_DELTAS, None)
+    factors = session.info.pop(_FACTORS, None)
+    if session.info.pop(_REFRESH, False):
+        broadcaster.send([(None, "refresh", {})])
+        return
+    if not deltas:
+        return
+    if factors is None:
+        # No factors row yet: the defaults get_emission_factors would create
+        factors = SimpleNamespace(**{column.name: column.default.arg for column in EmissionFactors.__table__.columns
+                                     if column.default is not None and column.default.is_scalar})
+    by_channel: Dict[Channel, List[dict]] = {}
+    for (channel, year, month), delta in deltas.items():
+        if any(delta):
+            by_channel.setdefault(channel, []).append(_change(year, month, delta, factors))
+    for changes in by_channel.values():
+        changes.sort(key=lambda c: (c["year"], MONTH_NUMBERS.get(c["month"], 0)))
+    broadcaster.send([(channel, "delta", {"changes": changes}) for channel, changes in by_channel.items()])
+
+
+@event.listens_for(Session, "after_rollback")
+@event.listens_for(Session, "after_soft_rollback")
+def _discard(session, *args):
+    for key in (_DELTAS, _REFRESH, _FACTORS):
+        session.info.pop(key, None)
+
+
+async def stream(subscription: Subscription, keepalive: float = LIVE_KEEPALIVE):
+    """SSE frames for one client until it disconnects or falls too far behind."""
+    try:
+        yield f"retry: 5000\nevent: ready\ndata: {json.dumps({'channel': channel_name(subscription.channel)})}\n\n".encode()
+        while True:
+            try:
+                frame = await asyncio.wait_for(subscription.queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            if frame is None:
+                return
+            yield frame
+    finally:
+        broadcaster.unsubscribe(subscription)
@@ -1,15 +1,23 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Query
+import time
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, Depends, HTTPException, status, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi.responses import PlainTextResponse, FileResponse, Response, StreamingResponse
+from sqlalchemy.orm import Session, joinedload
+from typing import List, Optional, Union
 from datetime import datetime, timedelta
+import argparse
+import os
 import uvicorn
 
 # Import local modules
-from database import get_db, create_tables, SessionLocal
-from models import User, Panchayat, MonthlyData, EmissionFactors, CarbonMetrics, OTPVerification
-from email_service import send_otp_email
+from database import get_db, check_schema, SessionLocal, engine
+from metrics import MetricsMiddleware, instrument_engine, render_metrics, track_ai_call, STARTUP_PHASE_SECONDS
+import profiling
+from models import User, Panchayat, MonthlyData, EmissionFactors, CarbonMetrics, AnomalyFlag, Job
+from email_service import send_otp_email, outbox as email_outbox
 import random
 from schemas import (
     User as UserSchema, UserCreate, UserUpdate, UserInDB,
@@ -19,17 +27,32 @@ from schemas import (
     CarbonMetrics as CarbonMetricsSchema, CarbonMetricsCreate, CarbonMetricsUpdate,
     Token, TokenData, LoginRequest, MessageResponse,
     CarbonMetricsResponse, SectorEmission, MonthlyTrend, PaginatedResponse,
-    PredictionResponse, OTPRequest, OTPVerify
+    MonthlyDataPage, ColumnarMonthlyDataPage,
+    PredictionResponse, OTPRequest, OTPVerify, ComparativeResponse, RollupResponse,
+    ScenarioRequest, ScenarioResponse, AnomalyFlag as AnomalyFlagSchema, AnomalyResolve,
+    Job as JobSchema, JobCreate
 )
 from auth import (
-    get_password_hash, verify_password, create_access_token, 
+    get_password_hash, verify_password, create_access_token, verify_token,
     ACCESS_TOKEN_EXPIRE_MINUTES, SECRET_KEY, ALGORITHM
 )
 from dependencies import get_current_user, get_current_active_user, require_admin, get_optional_user, get_pagination_params
 from calculations import (
     get_carbon_metrics, get_sector_emissions, get_monthly_trends, 
-    calculate_emissions, seed_initial_data
+    calculate_emissions, seed_initial_data, get_prediction_history
 )
+# Importing aggregates also registers the listeners that keep activity_aggregates current
+from aggregates import get_comparative_footprints
+from rollups import get_rollup
+from scenarios import run_scenarios
+from anomalies import score_entry, forget_entry, resolve_flag, SCORED_FIELDS
+import jobs
+import otp_store
+import reports
+from serialization import CompressionMiddleware, ORJSONResponse, row_dicts
+from columnar import columnar_payload, to_columns, trend_columns
+import live
+import cache
 
 # Create FastAPI app
 app = FastAPI(
@@ -45,22 +68,66 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-SQL-Profile", "ETag", "Content-Disposition"],
 )
 
+# gzip/Brotli for large responses (inside the metrics middleware, so response sizes are bytes on the wire)
+app.add_middleware(CompressionMiddleware)
+
+# Request / SQL / AI-call instrumentation, exposed on /metrics
+app.add_middleware(profiling.SQLProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine)
+profiling.instrument_engine(engine)
+
 # Security
 security = HTTPBearer()
 
+_imports_done = time.perf_counter()
+
 # Startup event
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database and seed data."""
-    create_tables()
+    """
+    Initialize database and seed data. Set SKIP_SEED=1 (or run `python main.py --no-seed`)
+    for fast-boot workers once the database has been seeded.
+    """
+    timings = {"import": _imports_done - _import_started}
+    started = time.perf_counter()
+    # Read-only: DDL happens once per deployment in init_db.py, never in every worker.
+    check_schema(engine)
+    timings["schema_check"] = time.perf_counter() - started
+
     # Seed data
-    db = SessionLocal()
-    try:
-        seed_initial_data(db)
-    finally:
-        db.close()
+    if os.getenv("SKIP_SEED", "0").lower() not in ("1", "true", "yes"):
+        db = SessionLocal()
+        try:
+            timings.update(seed_initial_data(db))
+        finally:
+            db.close()
+
+    # Queue jobs left waiting (or orphaned) by a previous run
+    started = time.perf_counter()
+    jobs.runner.recover()
+    timings["job_recovery"] = time.perf_counter() - started
+
+    # Periodically drop expired OTPs
+    otp_store.store.start_sweeper()
+
+    timings["total"] = sum(timings.values())
+    for phase, seconds in timings.items():
+        STARTUP_PHASE_SECONDS.set(seconds, phase)
+    print("🚀 Startup finished in {:.0f} ms ({})".format(
+        timings["total"] * 1000,
+        ", ".join(f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in timings.items() if phase != "total")
+    ))
+
+@app.on_event("shutdown")
+def shutdown_event():
+    """Stop the job pool (unstarted jobs stay queued for the next start), flush the email outbox, stop the OTP sweep."""
+    jobs.runner.shutdown()
+    email_outbox.shutdown()
+    otp_store.store.stop_sweeper()
 
 # Authentication endpoints
 @app.post("/auth/login", response_model=Token)
@@ -91,16 +158,9 @@ async def request_otp(otp_request: OTPRequest, db: Session = Depends(get_db)):
             status_code=400, detail="Email already registered"
         )
     
-    # Generate 6-digit OTP
+    # Generate 6-digit OTP (replaces any pending one for this email)
     otp_code = str(random.randint(100000, 999999))
-    expires_at = datetime.utcnow() + timedelta(minutes=10)
-    
-    # Check if there is already a pending OTP, delete it
-    db.query(OTPVerification).filter(OTPVerification.email == otp_request.email).delete()
-    
-    new_otp = OTPVerification(email=otp_request.email, otp=otp_code, expires_at=expires_at)
-    db.add(new_otp)
-    db.commit()
+    otp_store.store.put(otp_request.email, otp_code)
     
     # Send email
     if not send_otp_email(otp_request.email, otp_code):
@@ -112,15 +172,12 @@ async def request_otp(otp_request: OTPRequest, db: Session = Depends(get_db)):
 async def register(user_data: OTPVerify, db: Session = Depends(get_db)):
     """Register new user."""
     # Validate OTP
-    otp_record = db.query(OTPVerification).filter(
-        OTPVerification.email == user_data.email, 
-        OTPVerification.otp == user_data.otp
-    ).first()
+    otp_status = otp_store.store.check(user_data.email, user_data.otp)
     
-    if not otp_record:
+    if otp_status == otp_store.INVALID:
         raise HTTPException(status_code=400, detail="Invalid OTP")
         
-    if otp_record.expires_at < datetime.utcnow():
+    if otp_status == otp_store.EXPIRED:
         raise HTTPException(status_code=400, detail="OTP has expired")
         
     # Check if user exists (again to be sure)
@@ -134,9 +191,6 @@ async def register(user_data: OTPVerify, db: Session = Depends(get_db)):
             status_code=400, detail="Email already registered"
         )
         
-    # Delete OTP record to prevent reuse
-    db.delete(otp_record)
-    
     # Create user
     hashed_password = get_password_hash(user_data.password)
     db_user = User(
@@ -152,6 +206,9 @@ async def register(user_data: OTPVerify, db: Session = Depends(get_db)):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+
+    # Delete the OTP to prevent reuse
+    otp_store.store.consume(user_data.email)
     
     return UserSchema.from_orm(db_user)
 
@@ -278,7 +335,11 @@ async def get_panchayat(
     return PanchayatSchema.from_orm(panchayat)
 
 # Monthly data endpoints
-@app.get("/data/", response_model=PaginatedResponse)
+# Serialized directly (no response_model validation); `responses` documents the two shapes.
+@app.get("/data/", response_class=ORJSONResponse, responses={
+    200: {"model": Union[MonthlyDataPage, ColumnarMonthlyDataPage],
+          "description": "A page of entries: MonthlyDataPage by default, ColumnarMonthlyDataPage with format=columnar"},
+})
 async def get_monthly_data(
     db: Session = Depends(get_db),
     current_user: UserSchema = Depends(get_current_active_user),
@@ -287,9 +348,16 @@ async def get_monthly_data(
     month: Optional[str] = None,
     year: Optional[int] = None,
     page: int = Query(1, ge=1),
-    size: int = Query(50, ge=1, le=10000)
+    size: int = Query(50, ge=1, le=10000),
+    response_format: str = Query("rows", alias="format", pattern="^(rows|columnar)$"),
+    delta: bool = Query(False, description="Columnar only: delta-encode numeric columns"),
+    precision: int = Query(2, ge=0, le=6, description="Decimal places kept by delta encoding")
 ):
-    """Get monthly carbon data."""
+    """Get monthly carbon data (format=columnar returns one array per field, see columnar.py)."""
+    # Plain columns rather than ORM objects: the rows are serialized as they are, without
+    # per-row schema validation or a lazy load of each entry's user.
+    columns = [getattr(User if field in ("username", "firm_type", "firm_name") else MonthlyData, field)
+               for field in MonthlyDataSchema.model_fields]
     query = db.query(MonthlyData).join(User, MonthlyData.user_id == User.id)
 
     # Apply filters
@@ -312,15 +380,20 @@ async def get_monthly_data(
     # Pagination
     total = query.count()
     offset = (page - 1) * size
-    data = query.offset(offset).limit(size).all()
-
-    return {
-        "items": [MonthlyDataSchema.from_orm(item) for item in data],
+    data = query.with_entities(*columns).offset(offset).limit(size).all()
+
+    if response_format == "columnar":
+        return ORJSONResponse(columnar_payload(
+            to_columns(data, list(MonthlyDataSchema.model_fields)), delta, precision,
+            total=total, page=page, size=size, pages=(total + size - 1) // size
+        ))
+    return ORJSONResponse({
+        "items": row_dicts(data),
         "total": total,
         "page": page,
         "size": size,
         "pages": (total + size - 1) // size
-    }
+    })
 
 @app.post("/data/", response_model=MonthlyDataSchema)
 async def create_monthly_data(
@@ -336,6 +409,8 @@ async def create_monthly_data(
 
     db_data = MonthlyData(**data_dict)
     db.add(db_data)
+    db.flush()
+    score_entry(db, db_data)
     db.commit()
     db.refresh(db_data)
 
@@ -356,10 +431,14 @@ async def update_monthly_data(
     if current_user.role == "user" and db_data.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Can only update your own data")
     
+    previous = {field: getattr(db_data, field) for field in SCORED_FIELDS}
+
     # Update fields
     for field, value in data_update.dict(exclude_unset=True).items():
         setattr(db_data, field, value)
     
+    db.flush()
+    score_entry(db, db_data, previous)
     db.commit()
     db.refresh(db_data)
     
@@ -379,11 +458,65 @@ async def delete_monthly_data(
     if current_user.role == "user" and db_data.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Can only delete your own data")
     
+    forget_entry(db, db_data)
     db.delete(db_data)
     db.commit()
     
     return {"message": "Data deleted successfully"}
 
+# Anomaly review endpoints (admin only)
+@app.get("/anomalies/", response_model=PaginatedResponse)
+async def get_anomalies(
+    db: Session = Depends(get_db),
+    current_user: UserSchema = Depends(require_admin),
+    status_filter: Optional[str] = Query("open", alias="status", pattern="^(open|valid|invalid|all)$"),
+    user_id: Optional[str] = None,
+    panchayat_id: Optional[str] = None,
+    field: Optional[str] = None,
+    page: int = Query(1, ge=1),
+    size: int = Query(50, ge=1, le=1000)
+):
+    """List values flagged as anomalous on submission, most recent first."""
+    query = db.query(AnomalyFlag).options(joinedload(AnomalyFlag.monthly_data), joinedload(AnomalyFlag.user))
+    if status_filter != "all":
+        query = query.filter(AnomalyFlag.status == status_filter)
+    if user_id:
+        query = query.filter(AnomalyFlag.user_id == user_id)
+    if panchayat_id:
+        query = query.filter(AnomalyFlag.panchayat_id == panchayat_id)
+    if field:
+        query = query.filter(AnomalyFlag.field == field)
+
+    total = query.count()
+    offset = (page - 1) * size
+    flags = query.order_by(AnomalyFlag.created_at.desc()).offset(offset).limit(size).all()
+
+    return {
+        "items": [AnomalyFlagSchema.from_orm(flag) for flag in flags],
+        "total": total,
+        "page": page,
+        "size": size,
+        "pages": (total + size - 1) // size
+    }
+
+@app.put("/anomalies/{flag_id}", response_model=AnomalyFlagSchema)
+async def resolve_anomaly(
+    flag_id: str,
+    resolution: AnomalyResolve,
+    db: Session = Depends(get_db),
+    current_user: UserSchema = Depends(require_admin)
+):
+    """Mark a flagged value valid (it joins the user's statistics) or invalid (a data error)."""
+    flag = db.query(AnomalyFlag).filter(AnomalyFlag.id == flag_id).first()
+    if not flag:
+        raise HTTPException(status_code=404, detail="Anomaly not found")
+
+    resolve_flag(db, flag, resolution.status, current_user.id)
+    db.commit()
+    db.refresh(flag)
+
+    return AnomalyFlagSchema.from_orm(flag)
+
 # Analytics endpoints
 @app.get("/analytics/metrics", response_model=CarbonMetricsResponse)
 async def get_analytics_metrics(
@@ -401,7 +534,8 @@ async def get_analytics_metrics(
     elif user_id:
         user_id = user_id
     
-    return get_carbon_metrics(db, user_id, panchayat_id, month, year)
+    return cache.cached(db, "metrics", (user_id, panchayat_id, month, year),
+                        lambda: get_carbon_metrics(db, user_id, panchayat_id, month, year))
 
 @app.get("/analytics/sectors", response_model=List[SectorEmission])
 async def get_analytics_sectors(
@@ -416,7 +550,8 @@ async def get_analytics_sectors(
     if current_user.role == "user":
         user_id = current_user.id
     
-    return get_sector_emissions(db, user_id, panchayat_id, month, year)
+    return cache.cached(db, "sectors", (user_id, panchayat_id, month, year),
+                        lambda: get_sector_emissions(db, user_id, panchayat_id, month, year))
 
 @app.get("/analytics/trends", response_model=List[MonthlyTrend])
 async def get_analytics_trends(
@@ -424,13 +559,126 @@ async def get_analytics_trends(
     current_user: UserSchema = Depends(get_current_active_user),
     user_id: Optional[str] = None,
     panchayat_id: Optional[str] = None,
-    year: Optional[int] = None
+    year: Optional[int] = None,
+    response_format: str = Query("rows", alias="format", pattern="^(rows|columnar)$"),
+    delta: bool = Query(False, description="Columnar only: delta-encode numeric columns"),
+    precision: int = Query(2, ge=0, le=6, description="Decimal places kept by delta encoding")
 ):
-    """Get monthly trends."""
+    """Get monthly trends (format=columnar returns month[], emissions[], offsets[], net[] arrays)."""
     if current_user.role == "user":
         user_id = current_user.id
     
-    return get_monthly_trends(db, user_id, panchayat_id, year)
+    if response_format == "columnar":
+        columns = cache.cached(db, "trend_columns", (user_id, panchayat_id, year),
+                               lambda: trend_columns(db, user_id, panchayat_id, year))
+        return ORJSONResponse(columnar_payload(columns, delta, precision))
+    return cache.cached(db, "trends", (user_id, panchayat_id, year),
+                        lambda: get_monthly_trends(db, user_id, panchayat_id, year))
+
+@app.get("/analytics/stream")
+async def stream_analytics(
+    token: str = Query(..., description="Access token (EventSource cannot send an Authorization header)"),
+    panchayat_id: Optional[str] = None
+):
+    """
+    Server-sent events with incremental dashboard deltas: firms receive changes
+    to their own data, admins those for `panchayat_id` (or everything).
+    """
+    # Authenticate with a short-lived session; a Depends(get_db) session would stay open for the whole stream.
+    username = verify_token(token)
+    with SessionLocal() as db:
+        user = db.query(User).filter(User.username == username).first()
+    if user is None or not user.is_active:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+
+    if user.role == "user":
+        channel = ("user", user.id)
+    elif panchayat_id:
+        channel = ("panchayat", panchayat_id)
+    else:
+        channel = live.ALL
+    return StreamingResponse(
+        live.stream(live.broadcaster.subscribe(channel)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/analytics/comparison", response_model=ComparativeResponse)
+async def get_analytics_comparison(
+    db: Session = Depends(get_db),
+    current_user: UserSchema = Depends(require_admin),
+    year: Optional[int] = None,
+    dimension: str = Query("panchayat", pattern="^(panchayat|firm_type)$"),
+    state: Optional[str] = None,
+    district: Optional[str] = None,
+    sort: str = Query("net", pattern="^(net|per_capita)$")
+):
+    """Rank panchayats or firm types by total and per-capita net footprint, with year-over-year change."""
+    if year is None:
+        year = datetime.now().year
+    return get_comparative_footprints(db, year, dimension, state, district, sort)
+
+@app.get("/analytics/rollup", response_model=RollupResponse)
+async def get_analytics_rollup(
+    db: Session = Depends(get_db),
+    current_user: UserSchema = Depends(get_current_active_user),
+    start: Optional[str] = Query(None, description="First month, YYYY-MM"),
+    end: Optional[str] = Query(None, description="Last month, YYYY-MM (default: latest month with data)"),
+    group_by: str = Query("none", pattern="^(none|panchayat|firm_type|user)$"),
+    granularity: str = Query("month", pattern="^(month|quarter|year|fiscal_year|total)$"),
+    panchayat_id: Optional[str] = None,
+    firm_type: Optional[str] = None,
+    user_id: Optional[str] = None
+):
+    """Emissions per period (month, quarter, year, Apr-Mar fiscal year or total) and group over a month range."""
+    if current_user.role == "user":
+        user_id = current_user.id
+
+    try:
+        return get_rollup(db, start, end, group_by, granularity, panchayat_id, firm_type, user_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@app.post("/analytics/scenarios", response_model=ScenarioResponse)
+async def simulate_scenarios(
+    request: ScenarioRequest,
+    db: Session = Depends(get_db),
+    current_user: UserSchema = Depends(require_admin)
+):
+    """Evaluate candidate emission factors / activity changes over the filtered history without saving anything."""
+    scenarios = [scenario.dict(exclude_none=True) for scenario in request.scenarios]
+    try:
+        return run_scenarios(db, scenarios, request.start, request.end,
+                             request.panchayat_id, request.firm_type, request.user_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+# Report endpoints (admin only)
+@app.get("/reports/annual")
+async def get_annual_report(
+    year: int,
+    db: Session = Depends(get_db),
+    current_user: UserSchema = Depends(require_admin),
+    panchayat_id: Optional[str] = None,
+    report_format: str = Query("html", alias="format", pattern="^(html|pdf)$"),
+    sectors: bool = True,
+    monthly: bool = True,
+    if_none_match: Optional[str] = Header(None)
+):
+    """The annual report (summary, sectors, monthly trend) as HTML or PDF, cached until the data changes."""
+    try:
+        report = reports.get_annual_report(db, year, panchayat_id, report_format, sectors, monthly)
+    except reports.ReportNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except reports.ReportUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=str(e))
+
+    headers = {"ETag": report.etag, "Cache-Control": "private, no-cache"}
+    if reports.etag_matches(if_none_match, report.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    disposition = "inline" if report_format == "html" else "attachment"
+    headers["Content-Disposition"] = f'{disposition}; filename="{report.filename}"'
+    return Response(content=report.content, media_type=report.media_type, headers=headers)
 
 # Emission factors endpoints (admin only)
 @app.get("/emission-factors/", response_model=EmissionFactorsSchema)
@@ -475,6 +723,11 @@ async def health_check():
     """Health check endpoint."""
     return {"status": "healthy", "timestamp": datetime.utcnow()}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus metrics for this worker process."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Utility endpoint to seed data (for development)
 @app.post("/dev/seed-data")
 async def seed_dev_data(db: Session = Depends(get_db)):
@@ -490,31 +743,7 @@ async def get_predictions(
     """
     Get AI-generated emissions forecast and recommendations.
     """
-    # Fetch historical data
-    query = db.query(MonthlyData)
-    
-    # Filter by user or panchayat based on role
-    if current_user.role == "user":
-        query = query.filter(MonthlyData.user_id == current_user.id)
-    elif current_user.role == "admin" and current_user.panchayat_id:
-        query = query.filter(MonthlyData.panchayat_id == current_user.panchayat_id)
-        
-    data = query.order_by(MonthlyData.year, MonthlyData.month).all() # Simple ordering
-    
-    # Get emission factors
-    emission_factors = db.query(EmissionFactors).first()
-    if not emission_factors:
-        emission_factors = EmissionFactors()
-
-    # Convert to list of dicts with calculated emissions
-    historical_data = []
-    for d in data:
-        data_dict = MonthlyDataSchema.from_orm(d).dict()
-        # Calculate emissions
-        calc_result = calculate_emissions(d, emission_factors)
-        data_dict["calculated_total_emission_kg"] = calc_result["total_emissions"]
-        data_dict["calculated_net_footprint_kg"] = calc_result["net_footprint"]
-        historical_data.append(data_dict)
+    historical_data = get_prediction_history(db, current_user)
     
     from ai_service import get_ai_prediction
     
@@ -524,7 +753,10 @@ async def get_predictions(
             detail="No data available to generate predictions. Please submit at least one month of data first."
         )
     
-    prediction = await get_ai_prediction(historical_data)
+    with track_ai_call("gemini_prediction") as call:
+        prediction = await get_ai_prediction(historical_data)
+        if "error" in prediction:
+            call["outcome"] = "error"
     
     if "error" in prediction:
         raise HTTPException(
@@ -534,5 +766,91 @@ async def get_predictions(
         
     return prediction
 
+# Background job endpoints
+def _get_job_for(db: Session, job_id: str, current_user) -> Job:
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job or (current_user.role != "admin" and job.created_by != current_user.id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/jobs/", response_model=JobSchema, status_code=status.HTTP_202_ACCEPTED)
+async def create_job(
+    job: JobCreate,
+    db: Session = Depends(get_db),
+    current_user: UserSchema = Depends(get_current_active_user)
+):
+    """Queue a background job (predictions, export, rebuild_aggregates); poll GET /jobs/{id} for progress."""
+    try:
+        return JobSchema.from_orm(jobs.runner.submit(db, job.kind, job.params, current_user))
+    except jobs.JobRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+@app.get("/jobs/", response_model=List[JobSchema])
+async def get_jobs(
+    db: Session = Depends(get_db),
+    current_user: UserSchema = Depends(get_current_active_user),
+    status_filter: Optional[str] = Query(None, alias="status", pattern="^(queued|running|succeeded|failed)$"),
+    limit: int = Query(50, ge=1, le=500)
+):
+    """Recent jobs: your own, or everyone's for admins."""
+    query = db.query(Job)
+    if current_user.role != "admin":
+        query = query.filter(Job.created_by == current_user.id)
+    if status_filter:
+        query = query.filter(Job.status == status_filter)
+    return [JobSchema.from_orm(job) for job in query.order_by(Job.created_at.desc()).limit(limit).all()]
+
+@app.get("/jobs/{job_id}", response_model=JobSchema)
+async def get_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: UserSchema = Depends(get_current_active_user)
+):
+    """Job status, progress and (once finished) its result or error."""
+    return JobSchema.from_orm(_get_job_for(db, job_id, current_user))
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: UserSchema = Depends(get_current_active_user)
+):
+    """Download a finished job's output: the file for exports, the JSON result otherwise."""
+    job = _get_job_for(db, job_id, current_user)
+    if job.status != jobs.SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    result = job.result or {}
+    if isinstance(result, dict) and result.get("file"):
+        path = jobs.export_path(job.id)
+        if not os.path.exists(path):
+            raise HTTPException(status_code=410, detail="Job output is no longer available")
+        return FileResponse(path, media_type=result.get("media_type", "application/octet-stream"),
+                            filename=f"{job.kind}-{result['file']}")
+    return result
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    parser = argparse.ArgumentParser(description="Run the CarbonTrackHub API.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--no-seed", action="store_true", help="Skip startup seeding (same as SKIP_SEED=1)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes; more than one shares caches through CACHE_BACKEND (sqlite by default)")
+    args = parser.parse_args()
+    if args.no_seed:
+        os.environ["SKIP_SEED"] = "1"
+    if args.workers <= 1:
+        uvicorn.run(app, host=args.host, port=args.port)
+    else:
+        # Workers are fresh processes that read these settings when they import the app.
+        if os.environ.setdefault("CACHE_BACKEND", "sqlite") == "local":
+            parser.error("--workers needs a shared cache: set CACHE_BACKEND=sqlite or redis")
+        if otp_store.OTP_STORE == "memory":
+            parser.error("--workers needs OTP_STORE=database: a code must be verifiable by any worker")
+        # Check and seed once here instead of racing in every worker
+        check_schema(engine)
+        if os.getenv("SKIP_SEED", "0").lower() not in ("1", "true", "yes"):
+            with SessionLocal() as db:
+                seed_initial_data(db)
+            os.environ["SKIP_SEED"] = "1"
+        engine.dispose()
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
@@ -0,0 +1,261 @@
+"""
+In-process request, database and AI-call instrumentation exposed in the
+Prometheus text exposition format (served by the `/metrics` endpoint).
+"""
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152, 8388608)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # bucket counts..., sum, count
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        lines = self.header()
+        for labels, series in items:
+            for bound, count in zip(self.buckets, series):
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {count}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {series[-1]}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status"))
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests currently being processed.")
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes", "HTTP response body size by route.", ("method", "route"), buckets=SIZE_BUCKETS)
+REQUEST_ERRORS = Counter(
+    "http_request_errors_total", "HTTP requests that failed with a 5xx status or an unhandled exception.",
+    ("method", "route", "status"))
+DB_STATEMENTS_PER_REQUEST = Histogram(
+    "db_statements_per_request", "SQL statements executed per HTTP request.", ("route",), buckets=COUNT_BUCKETS)
+DB_TIME_PER_REQUEST = Histogram(
+    "db_time_per_request_seconds", "Time spent executing SQL per HTTP request.", ("route",))
+DB_STATEMENT_LATENCY = Histogram(
+    "db_statement_duration_seconds", "Latency of individual SQL statements.")
+AI_CALL_LATENCY = Histogram(
+    "ai_call_duration_seconds", "Latency of AI/ML inference calls.", ("operation", "outcome"))
+STARTUP_PHASE_SECONDS = Gauge(
+    "app_startup_phase_seconds", "Time spent in each phase of this worker's startup.", ("phase",))
+JOB_DURATION = Histogram(
+    "job_duration_seconds", "Run time of background job attempts.", ("kind", "outcome"),
+    buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0))
+ANOMALY_FLAGS = Counter(
+    "anomaly_flags_total", "Monthly data values flagged as anomalous on submission.", ("field",))
+EMAILS = Counter(
+    "emails_total", "Outgoing emails by outcome (sent, retried, failed, rejected).", ("outcome",))
+EMAIL_OUTBOX_DEPTH = Gauge(
+    "email_outbox_depth", "Emails waiting in this worker's outbox, including scheduled retries.")
+REPORT_REQUESTS = Counter(
+    "report_requests_total", "Annual report downloads by format and whether the rendered report was cached.",
+    ("format", "cache"))
+LIVE_SUBSCRIBERS = Gauge(
+    "live_subscribers", "Dashboard update streams currently connected to this worker.")
+LIVE_EVENTS = Counter(
+    "live_events_total", "Live dashboard events by kind (delta, refresh) and subscribers dropped for falling behind.",
+    ("kind",))
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Shared cache lookups by namespace and result (hit, miss, error).",
+    ("namespace", "result"))
+
+REGISTRY = [
+    REQUEST_LATENCY, REQUESTS_IN_FLIGHT, RESPONSE_SIZE, REQUEST_ERRORS,
+    DB_STATEMENTS_PER_REQUEST, DB_TIME_PER_REQUEST, DB_STATEMENT_LATENCY, AI_CALL_LATENCY,
+    STARTUP_PHASE_SECONDS, ANOMALY_FLAGS, JOB_DURATION, REPORT_REQUESTS,
+    EMAILS, EMAIL_OUTBOX_DEPTH, LIVE_SUBSCRIBERS, LIVE_EVENTS, CACHE_REQUESTS,
+]
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class RequestStats:
+    """Per-request accumulator for SQL activity, bound to the request's context."""
+    __slots__ = ("sql_count", "sql_time")
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = 0.0
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _current_request.get()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Attach SQL timing hooks to an engine (idempotent)."""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    DB_STATEMENT_LATENCY.observe(elapsed)
+    stats = _current_request.get()
+    if stats is not None:
+        stats.sql_count += 1
+        stats.sql_time += elapsed
+
+
+@contextmanager
+def track_ai_call(operation: str):
+    """
+    Time an AI/ML call. The yielded dict's "outcome" can be set to "error" for
+    calls that report failure without raising; exceptions are recorded as errors.
+    """
+    started = time.perf_counter()
+    call = {"outcome": "ok"}
+    try:
+        yield call
+    except BaseException:
+        call["outcome"] = "error"
+        raise
+    finally:
+        AI_CALL_LATENCY.observe(time.perf_counter() - started, operation, call["outcome"])
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency, in-flight requests, response size, errors
+    and per-request SQL statistics. Routes are labelled by their path template
+    (e.g. `/data/{data_id}`) to keep label cardinality bounded.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        status_code = 500
+        body_size = 0
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code, body_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                body_size += len(message.get("body", b""))
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            status_code = 500
+            raise
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            _current_request.reset(token)
+            route = scope.get("route")
+            route_label = getattr(route, "path", None) or "unmatched"
+            status_label = str(status_code)
+            REQUEST_LATENCY.observe(time.perf_counter() - started, method, route_label, status_label)
+            RESPONSE_SIZE.observe(body_size, method, route_label)
+            DB_STATEMENTS_PER_REQUEST.observe(stats.sql_count, route_label)
+            DB_TIME_PER_REQUEST.observe(stats.sql_time, route_label)
+            if status_code >= 500:
+                REQUEST_ERRORS.inc(method, route_label, status_label)
@@ -1,10 +1,10 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Date
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Date, Text, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
+import json
 import uuid
 
-Base = declarative_base()
+from database import Base
 
 def generate_uuid():
     return str(uuid.uuid4())
@@ -47,7 +47,7 @@ class MonthlyData(Base):
     __tablename__ = "monthly_data"
     
     id = Column(String, primary_key=True, default=generate_uuid)
-    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
     panchayat_id = Column(String, ForeignKey("panchayats.id"), nullable=True)
     month = Column(String, nullable=False)  # Jan, Feb, Mar, etc.
     year = Column(Integer, nullable=False)
@@ -106,11 +106,119 @@ class CarbonMetrics(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class ActivityAggregate(Base):
+    """Summed MonthlyData activity per panchayat, firm type and month (maintained by aggregates.py)."""
+    __tablename__ = "activity_aggregates"
+    __table_args__ = (
+        UniqueConstraint("panchayat_id", "firm_type", "year", "month", name="uq_activity_aggregates_key"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    panchayat_id = Column(String, nullable=False, index=True)  # "" for data without a panchayat
+    firm_type = Column(String, nullable=False)  # "" for users without a firm type
+    year = Column(Integer, nullable=False, index=True)
+    month = Column(String, nullable=False)
+    month_number = Column(Integer, nullable=False, default=0)  # 1-12, 0 for unrecognised month names
+    electricity_kwh = Column(Float, default=0)
+    diesel_liters = Column(Float, default=0)
+    petrol_liters = Column(Float, default=0)
+    waste_kg = Column(Float, default=0)
+    water_liters = Column(Float, default=0)
+    solar_units = Column(Float, default=0)
+    trees_planted = Column(Float, default=0)
+    record_count = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class DataVersion(Base):
+    """Change counter for derived data; caches compare it to know when to reload."""
+    __tablename__ = "data_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ActivityStats(Base):
+    """Running (Welford) statistics of log1p(value) per user and activity field, maintained by anomalies.py."""
+    __tablename__ = "activity_stats"
+
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    field = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    mean = Column(Float, nullable=False, default=0)
+    m2 = Column(Float, nullable=False, default=0)  # sum of squared deviations from the mean
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class AnomalyFlag(Base):
+    __tablename__ = "anomaly_flags"
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    monthly_data_id = Column(String, ForeignKey("monthly_data.id"), nullable=False, index=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    panchayat_id = Column(String, ForeignKey("panchayats.id"), nullable=True)
+    field = Column(String, nullable=False)
+    value = Column(Float, nullable=False)
+    expected = Column(Float, nullable=False)  # the user's typical value (geometric mean)
+    z_score = Column(Float, nullable=False)
+    status = Column(String, nullable=False, default="open", index=True)  # open, valid, invalid
+    resolved_by = Column(String, ForeignKey("users.id"), nullable=True)
+    resolved_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relationships
+    monthly_data = relationship("MonthlyData")
+    user = relationship("User", foreign_keys=[user_id])
+
+    @property
+    def month(self):
+        return self.monthly_data.month if self.monthly_data else None
+
+    @property
+    def year(self):
+        return self.monthly_data.year if self.monthly_data else None
+
+    @property
+    def username(self):
+        return self.user.username if self.user else "Unknown User"
+
+class Job(Base):
+    """A background job run by jobs.py; params and result are stored as JSON text."""
+    __tablename__ = "jobs"
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    kind = Column(String, nullable=False)  # predictions, export, rebuild_aggregates
+    status = Column(String, nullable=False, default="queued", index=True)  # queued, running, succeeded, failed
+    params_json = Column(Text, nullable=False, default="{}")
+    result_json = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    progress = Column(Float, nullable=False, default=0)  # 0..1
+    message = Column(String, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    created_by = Column(String, ForeignKey("users.id"), nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @property
+    def params(self):
+        return json.loads(self.params_json) if self.params_json else {}
+
+    @property
+    def result(self):
+        return json.loads(self.result_json) if self.result_json else None
+
 class OTPVerification(Base):
     __tablename__ = "otp_verifications"
     
     id = Column(String, primary_key=True, default=generate_uuid)
     email = Column(String, nullable=False, index=True)
     otp = Column(String, nullable=False)
-    expires_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+
+    version = Column(Integer, primary_key=True)
+    applied_at = Column(DateTime, default=datetime.utcnow)
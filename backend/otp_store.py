@@ -0,0 +1,188 @@
+"""
+Pending registration OTPs with a time-to-live.
+
+Two interchangeable stores, chosen with OTP_STORE:
+
+- "database" (default): rows in `otp_verifications`. Works with any number of
+  API workers. Expired rows are deleted by a periodic sweep in batches of
+  OTP_SWEEP_BATCH, using the index on expires_at, so a flood of unfinished
+  registrations does not grow the table.
+- "memory": a dict plus an expiry heap in this process - no database round
+  trip per request. Only for single-worker deployments, since the worker that
+  sends a code must also verify it. Holds at most OTP_MEMORY_MAX_ENTRIES
+  codes; the soonest-expiring ones are evicted first.
+
+Either way a new code for an email replaces the previous one, and a code is
+consumed once the registration succeeds.
+"""
+import hmac
+import heapq
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, select
+
+from database import SessionLocal
+from models import OTPVerification
+
+OTP_STORE = os.getenv("OTP_STORE", "database")
+OTP_TTL_MINUTES = int(os.getenv("OTP_TTL_MINUTES", "10"))
+OTP_SWEEP_INTERVAL = float(os.getenv("OTP_SWEEP_INTERVAL", "300"))
+OTP_SWEEP_BATCH = int(os.getenv("OTP_SWEEP_BATCH", "1000"))
+OTP_MEMORY_MAX_ENTRIES = int(os.getenv("OTP_MEMORY_MAX_ENTRIES", "100000"))
+
+VALID, INVALID, EXPIRED = "valid", "invalid", "expired"
+
+logger = logging.getLogger("carbontrackhub.otp")
+
+
+def _matches(expected: str, given: str) -> bool:
+    return hmac.compare_digest(expected.encode(), given.encode())
+
+
+class OTPStore(ABC):
+    """Interface shared by the stores, plus the background sweeper."""
+
+    def __init__(self):
+        self._stop = threading.Event()
+        self._sweeper: Optional[threading.Thread] = None
+
+    @abstractmethod
+    def put(self, email: str, otp: str, ttl: timedelta = timedelta(minutes=OTP_TTL_MINUTES)) -> None:
+        """Store `otp` for `email`, replacing any earlier code."""
+
+    @abstractmethod
+    def check(self, email: str, otp: str) -> str:
+        """VALID, INVALID (no such code) or EXPIRED. Does not consume the code."""
+
+    @abstractmethod
+    def consume(self, email: str) -> None:
+        """Forget the code for `email` (after a successful registration)."""
+
+    @abstractmethod
+    def sweep(self) -> int:
+        """Delete expired codes; returns how many were removed."""
+
+    def _sweep_forever(self) -> None:
+        while not self._stop.wait(OTP_SWEEP_INTERVAL):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.warning("OTP sweep failed: %s", e)
+
+    def start_sweeper(self) -> None:
+        if self._sweeper is None:
+            self._stop.clear()
+            self._sweeper = threading.Thread(target=self._sweep_forever, name="otp-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def stop_sweeper(self) -> None:
+        self._stop.set()
+        if self._sweeper is not None:
+            self._sweeper.join(timeout=5)
+            self._sweeper = None
+
+
+class MemoryOTPStore(OTPStore):
+    def __init__(self, max_entries: int = OTP_MEMORY_MAX_ENTRIES):
+        super().__init__()
+        self.max_entries = max_entries
+        self._codes: Dict[str, Tuple[str, float]] = {}  # email -> (otp, monotonic expiry)
+        self._expiries: List[Tuple[float, str]] = []  # heap; entries go stale when a code is replaced
+        self._lock = threading.Lock()
+
+    def _pop_expiring(self, until: Optional[float]) -> int:
+        """Remove codes expiring before `until` (or the single soonest one if None); lock held."""
+        removed = 0
+        while self._expiries and (until is None or self._expiries[0][0] <= until):
+            expires, email = heapq.heappop(self._expiries)
+            current = self._codes.get(email)
+            if current is not None and current[1] == expires:
+                del self._codes[email]
+                removed += 1
+                if until is None:
+                    break
+        return removed
+
+    def put(self, email, otp, ttl=timedelta(minutes=OTP_TTL_MINUTES)):
+        expires = time.monotonic() + ttl.total_seconds()
+        with self._lock:
+            if email not in self._codes and len(self._codes) >= self.max_entries:
+                self._pop_expiring(None)
+            self._codes[email] = (otp, expires)
+            heapq.heappush(self._expiries, (expires, email))
+            # Replaced codes leave stale heap entries; compact when they dominate.
+            if len(self._expiries) > 2 * len(self._codes) + 64:
+                self._expiries = [(exp, mail) for mail, (_, exp) in self._codes.items()]
+                heapq.heapify(self._expiries)
+
+    def check(self, email, otp):
+        with self._lock:
+            current = self._codes.get(email)
+        if current is None or not _matches(current[0], otp):
+            return INVALID
+        return EXPIRED if current[1] < time.monotonic() else VALID
+
+    def consume(self, email):
+        with self._lock:
+            self._codes.pop(email, None)
+
+    def sweep(self):
+        with self._lock:
+            return self._pop_expiring(time.monotonic())
+
+
+class DatabaseOTPStore(OTPStore):
+    def __init__(self, session_factory=SessionLocal):
+        super().__init__()
+        self.session_factory = session_factory
+
+    def put(self, email, otp, ttl=timedelta(minutes=OTP_TTL_MINUTES)):
+        with self.session_factory() as db:
+            db.execute(delete(OTPVerification).where(OTPVerification.email == email))
+            db.add(OTPVerification(email=email, otp=otp, expires_at=datetime.utcnow() + ttl))
+            db.commit()
+
+    def check(self, email, otp):
+        with self.session_factory() as db:
+            codes = db.execute(
+                select(OTPVerification.otp, OTPVerification.expires_at).where(OTPVerification.email == email)
+            ).all()
+        for code, expires_at in codes:
+            if _matches(code, otp):
+                return EXPIRED if expires_at < datetime.utcnow() else VALID
+        return INVALID
+
+    def consume(self, email):
+        with self.session_factory() as db:
+            db.execute(delete(OTPVerification).where(OTPVerification.email == email))
+            db.commit()
+
+    def sweep(self):
+        removed = 0
+        now = datetime.utcnow()
+        while True:
+            # Short batched transactions, so a large backlog never holds the write lock for long
+            with self.session_factory() as db:
+                batch = select(OTPVerification.id).where(OTPVerification.expires_at < now).limit(OTP_SWEEP_BATCH)
+                count = db.execute(delete(OTPVerification).where(OTPVerification.id.in_(batch))).rowcount
+                db.commit()
+            removed += count
+            if count < OTP_SWEEP_BATCH:
+                return removed
+
+
+def create_store(kind: str = OTP_STORE) -> OTPStore:
+    if kind == "memory":
+        return MemoryOTPStore()
+    if kind == "database":
+        return DatabaseOTPStore()
+    raise ValueError(f"OTP_STORE must be 'memory' or 'database', not '{kind}'")
+
+
+store = create_store()
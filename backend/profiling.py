@@ -0,0 +1,160 @@
+"""
+Opt-in per-request SQL profiling and slow-query logging.
+
+Profiling is enabled for every request with `SQL_PROFILE=1`, or for a single
+request by an authenticated admin sending `X-SQL-Profile: 1`. While enabled:
+
+- every statement is recorded with its duration;
+- statements slower than `SLOW_QUERY_MS` (default 100 ms) are logged together
+  with their `EXPLAIN QUERY PLAN`;
+- the response carries an `X-SQL-Profile` header with the statement count,
+  total SQL time, repeated statements (N+1 candidates) and the slowest queries.
+"""
+import os
+import re
+import json
+import time
+import logging
+from collections import Counter
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("carbontrackhub.sql")
+
+PROFILE_HEADER = "x-sql-profile"
+SQL_PROFILE_ALWAYS = os.getenv("SQL_PROFILE", "0").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+MAX_REPORTED_STATEMENTS = 5
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class QueryProfile:
+    """Statements executed while handling one request."""
+    def __init__(self):
+        self.statements: List[Tuple[str, float]] = []
+        self.exact_keys: List[Tuple[str, str]] = []
+
+    def record(self, statement: str, parameters, elapsed: float) -> None:
+        normalized = _WHITESPACE.sub(" ", statement).strip()
+        self.statements.append((normalized, elapsed))
+        self.exact_keys.append((normalized, repr(parameters)))
+
+    def summary(self) -> dict:
+        by_statement = Counter(sql for sql, _ in self.statements)
+        exact = Counter(self.exact_keys)
+        repeated = [
+            {"sql": sql[:200], "count": count}
+            for sql, count in by_statement.most_common(MAX_REPORTED_STATEMENTS) if count > 1
+        ]
+        slowest = sorted(self.statements, key=lambda s: s[1], reverse=True)[:MAX_REPORTED_STATEMENTS]
+        return {
+            "count": len(self.statements),
+            "total_ms": round(sum(elapsed for _, elapsed in self.statements) * 1000, 3),
+            "exact_duplicates": sum(count - 1 for count in exact.values() if count > 1),
+            "repeated": repeated,
+            "slowest": [{"sql": sql[:200], "ms": round(elapsed * 1000, 3)} for sql, elapsed in slowest],
+        }
+
+
+_current_profile: ContextVar[Optional[QueryProfile]] = ContextVar("current_query_profile", default=None)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Attach profiling hooks to an engine (idempotent)."""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("profile_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["profile_start_time"].pop()
+    profile = _current_profile.get()
+    if profile is None:
+        return
+    profile.record(statement, parameters, elapsed)
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        plan = "" if executemany else explain_query_plan(conn, statement, parameters)
+        logger.warning("Slow query (%.1f ms): %s | params=%r%s", elapsed * 1000,
+                       _WHITESPACE.sub(" ", statement).strip(), parameters, f"\n{plan}" if plan else "")
+
+
+def explain_query_plan(conn, statement: str, parameters) -> str:
+    """Run EXPLAIN (QUERY PLAN on SQLite) on the raw DBAPI connection, bypassing engine events."""
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    try:
+        raw_cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            raw_cursor.execute(prefix + statement, parameters or ())
+            return "\n".join("  " + " | ".join(str(col) for col in row) for row in raw_cursor.fetchall())
+        finally:
+            raw_cursor.close()
+    except Exception as e:
+        return f"  (EXPLAIN failed: {e})"
+
+
+def _is_admin_request(headers: dict) -> bool:
+    """Resolve the bearer token to a user and check the admin role."""
+    authorization = headers.get("authorization", "")
+    if not authorization.lower().startswith("bearer "):
+        return False
+    from auth import verify_token
+    from database import SessionLocal
+    from models import User
+
+    try:
+        username = verify_token(authorization[7:])
+    except Exception:
+        return False
+    db = SessionLocal()
+    try:
+        role = db.query(User.role).filter(User.username == username).scalar()
+    finally:
+        db.close()
+    return role == "admin"
+
+
+class SQLProfilingMiddleware:
+    """ASGI middleware that enables per-request profiling and reports it in a response header."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        enabled = SQL_PROFILE_ALWAYS
+        if not enabled:
+            headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers", [])}
+            if headers.get(PROFILE_HEADER, "").lower() in ("1", "true", "yes"):
+                enabled = _is_admin_request(headers)
+        if not enabled:
+            await self.app(scope, receive, send)
+            return
+
+        profile = QueryProfile()
+        token = _current_profile.set(profile)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                # Handlers have finished their queries before the response starts.
+                summary = json.dumps(profile.summary(), separators=(",", ":"))
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (PROFILE_HEADER.encode("latin-1"), summary.encode("latin-1", "replace"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_profile.reset(token)
@@ -0,0 +1,217 @@
+"""
+Annual carbon reports rendered on the server.
+
+The report (summary cards, sector table, monthly trend table) is built from
+the rollup cube, so rendering costs the same for ten or a hundred thousand
+MonthlyData rows. Rendered documents are kept in the shared cache (cache.py)
+keyed by panchayat, year, sections and format plus the data and emission
+factor versions: downloading the same report again from any worker is a cache
+lookup, and any data or factor change makes the next download re-render. Each document carries a strong ETag,
+so browsers can revalidate without downloading it at all.
+
+PDF output needs the optional WeasyPrint package; HTML always works and prints
+to PDF from the browser.
+"""
+import hashlib
+import html
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy.orm import Session
+
+import cache
+from metrics import REPORT_REQUESTS
+from models import Panchayat
+from rollups import get_rollup
+from scenarios import ACTIVITIES
+
+FORMATS = ("html", "pdf")
+SECTORS = (("Electricity", "electricity"), ("Diesel", "diesel"), ("Petrol", "petrol"),
+           ("Waste", "waste"), ("Water", "water"))
+MONTH_NAMES = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+MEDIA_TYPES = {"html": "text/html; charset=utf-8", "pdf": "application/pdf"}
+
+
+class ReportNotFound(Exception):
+    """The requested panchayat does not exist."""
+
+
+class ReportUnavailable(Exception):
+    """The requested format cannot be produced on this server."""
+
+
+@dataclass(frozen=True)
+class Report:
+    content: bytes
+    media_type: str
+    filename: str
+    etag: str
+
+
+def _number(value: float, digits: int = 0) -> str:
+    return f"{value:,.{digits}f}"
+
+
+def build_report_data(db: Session, year: int, panchayat_id: Optional[str] = None) -> dict:
+    """Totals, sector shares and monthly trend for one year (and panchayat, or all of them)."""
+    region = "All Panchayats"
+    if panchayat_id is not None:
+        name = db.query(Panchayat.name).filter(Panchayat.id == panchayat_id).scalar()
+        if name is None:
+            raise ReportNotFound(f"Panchayat {panchayat_id} not found")
+        region = f"Gram Panchayat {name}"
+
+    rollup = get_rollup(db, f"{year}-01", f"{year}-12", granularity="month", panchayat_id=panchayat_id)
+    months = []
+    sectors: Dict[str, float] = {name: 0.0 for name in ACTIVITIES}
+    for row in rollup["rows"]:
+        months.append({
+            "month": MONTH_NAMES[int(row["period"][-2:]) - 1],
+            "records": row["record_count"],
+            "emissions": row["total_emissions"],
+            "offsets": row["total_offsets"],
+            "net": row["net_footprint"],
+        })
+        for name, value in row["breakdown"].items():
+            sectors[name] += value
+
+    total_emissions = sum(month["emissions"] for month in months)
+    total_offsets = sum(month["offsets"] for month in months)
+    return {
+        "year": year,
+        "region": region,
+        "records": sum(month["records"] for month in months),
+        "total_emissions": total_emissions,
+        "total_offsets": total_offsets,
+        "net_footprint": total_emissions - total_offsets,
+        "sectors": sectors,
+        "months": months,
+    }
+
+
+def render_html(data: dict, include_sectors: bool = True, include_monthly: bool = True,
+                generated: Optional[datetime] = None) -> str:
+    """The report page; the same layout and styling as the admin panel's print export."""
+    generated = generated or datetime.now()
+    net = data["net_footprint"]
+    total = data["total_emissions"]
+    neutral = net <= 0
+
+    sector_rows = "".join(
+        f"<tr><td>{label}</td><td>{_number(data['sectors'][name], 2)} kg CO₂</td>"
+        f"<td>{(data['sectors'][name] / total * 100) if total > 0 else 0:.1f}%</td></tr>"
+        for label, name in SECTORS
+    )
+    month_rows = "".join(
+        f"<tr><td>{month['month']} {data['year']}</td><td>{month['records']}</td>"
+        f"<td>{_number(month['emissions'], 2)}</td><td>{_number(month['offsets'], 2)}</td>"
+        f"<td>{_number(month['net'], 2)}</td></tr>"
+        for month in data["months"]
+    ) or '<tr><td colspan="5">No data submitted for this year.</td></tr>'
+    region = html.escape(data["region"])
+    sector_table = f"""
+<h2>Sector-wise Emissions</h2>
+<table>
+  <thead><tr><th>Sector</th><th>Emissions</th><th>Share</th></tr></thead>
+  <tbody>{sector_rows}</tbody>
+</table>
+""" if include_sectors else ""
+    month_table = f"""
+<h2>Monthly Trend</h2>
+<table>
+  <thead><tr><th>Month</th><th>Records</th><th>Emissions (kg)</th><th>Offsets (kg)</th><th>Net (kg)</th></tr></thead>
+  <tbody>{month_rows}</tbody>
+</table>
+""" if include_monthly else ""
+
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8"/>
+<title>Carbon Report – {region} {data['year']}</title>
+<style>
+  * {{ box-sizing: border-box; margin: 0; padding: 0; }}
+  body {{ font-family: 'Segoe UI', Arial, sans-serif; color: #1a1a1a; padding: 24px; font-size: 11px; }}
+  h1 {{ font-size: 22px; color: #166534; margin-bottom: 4px; }}
+  .subtitle {{ color: #555; margin-bottom: 20px; font-size: 12px; }}
+  .summary-grid {{ display: grid; grid-template-columns: repeat(3, 1fr); gap: 12px; margin-bottom: 24px; }}
+  .card {{ background: #f0fdf4; border: 1px solid #bbf7d0; border-radius: 8px; padding: 12px; }}
+  .card h3 {{ font-size: 10px; text-transform: uppercase; color: #555; margin-bottom: 4px; }}
+  .card p {{ font-size: 18px; font-weight: 700; color: #166534; }}
+  .card small {{ font-size: 10px; color: #888; }}
+  h2 {{ font-size: 14px; color: #166534; border-bottom: 2px solid #bbf7d0; padding-bottom: 4px; margin: 20px 0 10px; }}
+  table {{ width: 100%; border-collapse: collapse; margin-bottom: 16px; }}
+  th {{ background: #166534; color: white; padding: 6px 8px; text-align: left; font-size: 10px; }}
+  td {{ padding: 5px 8px; border-bottom: 1px solid #e5e7eb; }}
+  tr:nth-child(even) td {{ background: #f9fafb; }}
+  .status {{ font-weight: 700; color: {'#166534' if neutral else '#dc2626'}; }}
+  .footer {{ margin-top: 32px; text-align: center; color: #aaa; font-size: 10px; border-top: 1px solid #e5e7eb; padding-top: 12px; }}
+  @media print {{ @page {{ margin: 10mm; }} }}
+</style>
+</head>
+<body>
+<h1>🌿 Carbon Footprint Report</h1>
+<p class="subtitle">{region} &nbsp;|&nbsp; Year: {data['year']} &nbsp;|&nbsp; Records: {data['records']} &nbsp;|&nbsp; Generated: {generated.day} {generated:%B %Y}</p>
+
+<div class="summary-grid">
+  <div class="card"><h3>Total Emissions</h3><p>{_number(total)}</p><small>kg CO₂e</small></div>
+  <div class="card"><h3>Total Offsets</h3><p>{_number(data['total_offsets'])}</p><small>kg CO₂e</small></div>
+  <div class="card"><h3>Net Footprint</h3><p class="status">{_number(net)}</p><small>{'✓ Carbon Neutral' if neutral else 'Still Emitting'}</small></div>
+</div>
+{sector_table}{month_table}
+<div class="footer">Report generated by CarbonTrackHub &nbsp;|&nbsp; Powered by GHG Protocol Standards</div>
+</body>
+</html>"""
+
+
+def render_pdf(page: str) -> bytes:
+    try:
+        from weasyprint import HTML
+    except ImportError:
+        raise ReportUnavailable("PDF rendering needs WeasyPrint (pip install weasyprint); "
+                                "request format=html and print it to PDF instead")
+    return HTML(string=page).write_pdf()
+
+
+def _make_report(content: bytes, fmt: str, year: int, panchayat_id: Optional[str]) -> Report:
+    filename = f"carbon_report_{panchayat_id or 'all'}_{year}.{fmt}"
+    etag = '"' + hashlib.sha256(content).hexdigest()[:32] + '"'
+    return Report(content, MEDIA_TYPES[fmt], filename, etag)
+
+
+def get_annual_report(
+    db: Session,
+    year: int,
+    panchayat_id: Optional[str] = None,
+    fmt: str = "html",
+    include_sectors: bool = True,
+    include_monthly: bool = True,
+) -> Report:
+    """The rendered annual report, from the cache while the data and emission factors are unchanged."""
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    rendered = []
+
+    def render() -> Report:
+        rendered.append(fmt)
+        if fmt == "pdf":
+            # PDFs are rendered from the (possibly cached) HTML report
+            page = get_annual_report(db, year, panchayat_id, "html", include_sectors, include_monthly)
+            content = render_pdf(page.content.decode("utf-8"))
+        else:
+            data = build_report_data(db, year, panchayat_id)
+            content = render_html(data, include_sectors, include_monthly).encode("utf-8")
+        return _make_report(content, fmt, year, panchayat_id)
+
+    report = cache.cached(db, "report", (panchayat_id, year, include_sectors, include_monthly, fmt), render)
+    REPORT_REQUESTS.inc(fmt, "miss" if rendered else "hit")
+    return report
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value covers `etag`."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
@@ -0,0 +1,287 @@
+"""
+Range rollups (quarters, fiscal years, rolling windows, ...) over in-memory prefix sums.
+
+For every series key - (panchayat, firm type) from activity_aggregates, or
+(user, panchayat, firm type) from monthly_data when a user dimension is
+needed - the monthly activity sums are stored as running totals. The sum over
+any month range is then the difference of two prefix entries, found by
+bisection, so a query costs O(series x periods x log months) no matter how many
+MonthlyData rows the range covers.
+
+Cubes are built lazily and cached per process; they are rebuilt when the
+aggregate data version (see aggregates.bump_data_version) changes. User-level
+cubes are scoped to the requested user and/or panchayat, so a firm's own
+rollup only reads (and rebuilds from) that firm's rows.
+"""
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from aggregates import ACTIVITY_COLUMNS, MONTH_NUMBERS, UNKNOWN, data_version
+from calculations import calculate_emissions, get_emission_factors
+from models import ActivityAggregate, MonthlyData, Panchayat, User
+
+GROUP_BY = ("none", "panchayat", "firm_type", "user")
+GRANULARITIES = ("month", "quarter", "year", "fiscal_year", "total")
+# activity columns + record_count
+WIDTH = len(ACTIVITY_COLUMNS) + 1
+# Cached user-level cubes (one per user/panchayat scope); the least recently used are dropped first.
+MAX_USER_CUBES = 256
+
+
+def month_index(year: int, month_number: int) -> int:
+    return year * 12 + month_number - 1
+
+
+def parse_month(value: str) -> int:
+    """'YYYY-MM' -> month index."""
+    try:
+        year, month = (int(part) for part in value.split("-"))
+    except ValueError:
+        raise ValueError(f"Invalid month '{value}', expected YYYY-MM")
+    if not 1 <= month <= 12:
+        raise ValueError(f"Invalid month '{value}', expected YYYY-MM")
+    return month_index(year, month)
+
+
+def format_month(index: int) -> str:
+    return f"{index // 12}-{index % 12 + 1:02d}"
+
+
+class PrefixSeries:
+    """Running totals of one series, stored flat in a double array (WIDTH values per month)."""
+    __slots__ = ("months", "prefix")
+
+    def __init__(self, points: Sequence[Tuple[int, Sequence[float]]]):
+        self.months = array("l", (index for index, _ in points))
+        self.prefix = array("d", [0.0] * WIDTH)
+        running = [0.0] * WIDTH
+        for _, values in points:
+            for i in range(WIDTH):
+                running[i] += values[i]
+            self.prefix.extend(running)
+
+    def range_sum(self, start: int, end: int) -> Optional[List[float]]:
+        """Sums over months start..end inclusive, or None if the series has no data there."""
+        lo = bisect_left(self.months, start)
+        hi = bisect_right(self.months, end)
+        if hi <= lo:
+            return None
+        lo, hi = lo * WIDTH, hi * WIDTH
+        return [self.prefix[hi + i] - self.prefix[lo + i] for i in range(WIDTH)]
+
+
+class RollupCube:
+    """Prefix series per key, where a key is a tuple of `fields` values."""
+
+    def __init__(self, version: int, fields: Tuple[str, ...], rows):
+        self.version = version
+        self.fields = fields
+        points: Dict[tuple, List[Tuple[int, List[float]]]] = {}
+        for row in rows:
+            if not row["month_number"]:
+                continue  # a month name we cannot place in time
+            values = [row[column] or 0 for column in ACTIVITY_COLUMNS] + [row["record_count"]]
+            key = tuple(row[field] for field in fields)
+            points.setdefault(key, []).append((month_index(row["year"], row["month_number"]), values))
+        self.series = {key: PrefixSeries(sorted(series)) for key, series in points.items()}
+        indexes = [s.months[i] for s in self.series.values() for i in (0, -1)]
+        self.first = min(indexes) if indexes else None
+        self.last = max(indexes) if indexes else None
+
+    def select(self, **filters) -> List[Tuple[dict, PrefixSeries]]:
+        """Series whose key matches every given field value (None means any)."""
+        wanted = [(i, value) for i, field in enumerate(self.fields)
+                  if (value := filters.get(field)) is not None]
+        return [(dict(zip(self.fields, key)), series) for key, series in self.series.items()
+                if all(key[i] == value for i, value in wanted)]
+
+
+_cubes: Dict[tuple, RollupCube] = {}
+_lock = threading.Lock()
+
+
+def _aggregate_rows(db: Session):
+    query = db.query(
+        ActivityAggregate.panchayat_id, ActivityAggregate.firm_type, ActivityAggregate.year,
+        ActivityAggregate.month_number, ActivityAggregate.record_count,
+        *(getattr(ActivityAggregate, column) for column in ACTIVITY_COLUMNS),
+    )
+    return (row._mapping for row in query)
+
+
+def _user_rows(db: Session, panchayat_id: Optional[str], user_id: Optional[str]):
+    query = db.query(
+        MonthlyData.user_id, func.coalesce(MonthlyData.panchayat_id, UNKNOWN).label("panchayat_id"),
+        func.coalesce(User.firm_type, UNKNOWN).label("firm_type"), MonthlyData.year, MonthlyData.month,
+        func.count().label("record_count"),
+        *(func.sum(getattr(MonthlyData, column)).label(column) for column in ACTIVITY_COLUMNS),
+    ).outerjoin(User, User.id == MonthlyData.user_id)
+    if panchayat_id is not None:
+        query = query.filter(MonthlyData.panchayat_id == panchayat_id)
+    if user_id is not None:
+        query = query.filter(MonthlyData.user_id == user_id)
+    query = query.group_by(MonthlyData.user_id, MonthlyData.panchayat_id, User.firm_type,
+                           MonthlyData.year, MonthlyData.month)
+    for row in query:
+        mapping = dict(row._mapping)
+        mapping["month_number"] = MONTH_NUMBERS.get(mapping.pop("month"), 0)
+        yield mapping
+
+
+def get_cube(db: Session, by_user: bool = False, panchayat_id: Optional[str] = None,
+             user_id: Optional[str] = None) -> RollupCube:
+    """The cached cube for the current data version, rebuilt if the aggregates changed."""
+    version = data_version(db)
+    cache_key = ("user", panchayat_id, user_id) if by_user else ("aggregate",)
+    with _lock:
+        cube = _cubes.pop(cache_key, None)
+        if cube is not None:
+            _cubes[cache_key] = cube  # most recently used
+            if cube.version == version:
+                return cube
+
+    # Built outside the lock, so one scope's database read does not stall requests for the others.
+    if by_user:
+        cube = RollupCube(version, ("user_id", "panchayat_id", "firm_type"), _user_rows(db, panchayat_id, user_id))
+    else:
+        cube = RollupCube(version, ("panchayat_id", "firm_type"), _aggregate_rows(db))
+
+    with _lock:
+        current = _cubes.pop(cache_key, None)
+        # A concurrent request may have built a newer cube for this scope meanwhile.
+        _cubes[cache_key] = current if current is not None and current.version > version else cube
+        user_keys = [key for key in _cubes if key[0] == "user"]
+        for stale in user_keys[:max(0, len(user_keys) - MAX_USER_CUBES)]:
+            del _cubes[stale]
+    return cube
+
+
+def period_buckets(start: int, end: int, granularity: str) -> List[Tuple[str, int, int]]:
+    """(label, first month, last month) for each period overlapping start..end, clipped to the range."""
+    if granularity == "total":
+        return [(f"{format_month(start)}..{format_month(end)}", start, end)]
+    buckets = []
+    current = start
+    while current <= end:
+        year, month = divmod(current, 12)
+        if granularity == "month":
+            first, size, label = current, 1, format_month(current)
+        elif granularity == "quarter":
+            first, size, label = current - month % 3, 3, f"{year}-Q{month // 3 + 1}"
+        elif granularity == "year":
+            first, size, label = current - month, 12, str(year)
+        else:  # fiscal_year, April to March
+            fy = year if month >= 3 else year - 1
+            first, size, label = month_index(fy, 4), 12, f"FY{fy}-{(fy + 1) % 100:02d}"
+        last = first + size - 1
+        buckets.append((label, max(first, start), min(last, end)))
+        current = last + 1
+    return buckets
+
+
+def resolve_range(cube: RollupCube, start: Optional[str], end: Optional[str]) -> Tuple[int, int]:
+    """Month indexes for start..end; defaults to the 12 months up to the latest data (or now)."""
+    if end:
+        end_index = parse_month(end)
+    elif cube.last is not None:
+        end_index = cube.last
+    else:
+        end_index = month_index(datetime.now().year, datetime.now().month)
+    start_index = parse_month(start) if start else end_index - 11
+    if start_index > end_index:
+        raise ValueError("start must not be after end")
+    return start_index, end_index
+
+
+def _group_names(db: Session, group_by: str, keys) -> Dict[Optional[str], str]:
+    keys = [key for key in keys if key]
+    if group_by == "panchayat" and keys:
+        return dict(db.query(Panchayat.id, Panchayat.name).filter(Panchayat.id.in_(keys)).all())
+    if group_by == "user" and keys:
+        return dict(db.query(User.id, User.username).filter(User.id.in_(keys)).all())
+    return {}
+
+
+def get_rollup(
+    db: Session,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    group_by: str = "none",
+    granularity: str = "month",
+    panchayat_id: Optional[str] = None,
+    firm_type: Optional[str] = None,
+    user_id: Optional[str] = None,
+) -> dict:
+    """
+    Emissions, offsets and sector breakdown per period and group between the
+    `start` and `end` months (inclusive, 'YYYY-MM'). Without a range the last
+    12 months with data are used.
+    """
+    if group_by not in GROUP_BY:
+        raise ValueError(f"group_by must be one of {', '.join(GROUP_BY)}")
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+
+    by_user = group_by == "user" or user_id is not None
+    cube = get_cube(db, by_user=by_user, panchayat_id=panchayat_id if by_user else None,
+                    user_id=user_id if by_user else None)
+
+    start_index, end_index = resolve_range(cube, start, end)
+
+    filters = {"panchayat_id": panchayat_id, "firm_type": firm_type}
+    if by_user:
+        filters["user_id"] = user_id
+    group_field: Optional[str] = {"panchayat": "panchayat_id", "firm_type": "firm_type",
+                                  "user": "user_id"}.get(group_by)
+    selected = cube.select(**filters)
+
+    emission_factors = get_emission_factors(db)
+    rows = []
+    for label, first, last in period_buckets(start_index, end_index, granularity):
+        totals: Dict[Optional[str], List[float]] = {}
+        for key, series in selected:
+            values = series.range_sum(first, last)
+            if values is None:
+                continue
+            group = key[group_field] if group_field else None
+            running = totals.setdefault(group, [0.0] * WIDTH)
+            for i in range(WIDTH):
+                running[i] += values[i]
+        for group, values in sorted(totals.items(), key=lambda item: item[0] or ""):
+            activity = SimpleNamespace(**dict(zip(ACTIVITY_COLUMNS, values)))
+            result = calculate_emissions(activity, emission_factors)
+            rows.append({
+                "period": label,
+                "period_start": format_month(first),
+                "period_end": format_month(last),
+                "group": group if group != UNKNOWN else None,
+                "name": None,
+                "record_count": int(values[-1]),
+                "total_emissions": result["total_emissions"],
+                "total_offsets": result["total_offsets"],
+                "net_footprint": result["net_footprint"],
+                "breakdown": result["breakdown"],
+            })
+
+    if group_field:
+        names = _group_names(db, group_by, {row["group"] for row in rows})
+        for row in rows:
+            row["name"] = names.get(row["group"], row["group"] or "Unassigned")
+    else:
+        for row in rows:
+            row["name"] = "All"
+
+    return {
+        "start": format_month(start_index),
+        "end": format_month(end_index),
+        "group_by": group_by,
+        "granularity": granularity,
+        "rows": rows,
+    }
@@ -0,0 +1,123 @@
+"""
+What-if scenarios over emission factors and activity levels.
+
+Every scenario is a column of two coefficient matrices (emission and offset
+kg CO2e per unit of each activity, after its adjustments), so all scenarios
+are evaluated at once as one (months x activities) @ (activities x scenarios)
+product. The monthly activity history comes from the rollup cube, so the cost
+depends on the number of months and series, not on MonthlyData rows. Nothing
+is persisted: the live EmissionFactors are only read, as the baseline.
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from aggregates import ACTIVITY_COLUMNS
+from calculations import get_emission_factors
+from rollups import format_month, get_cube, resolve_range
+
+# Activity name (as used in adjustments and breakdowns) -> (MonthlyData column, EmissionFactors field, is an offset)
+ACTIVITIES = {
+    "electricity": ("electricity_kwh", "electricity", False),
+    "diesel": ("diesel_liters", "diesel", False),
+    "petrol": ("petrol_liters", "petrol", False),
+    "waste": ("waste_kg", "waste", False),
+    "water": ("water_liters", "water", False),
+    "solar": ("solar_units", "solar_per_unit", True),
+    "trees": ("trees_planted", "tree_per_year", True),
+}
+BASELINE_NAME = "Current factors"
+
+
+def _coefficients(base: Dict[str, float], scenarios: List[dict]):
+    """(activities x scenarios) emission and offset coefficient matrices, in ACTIVITY_COLUMNS order."""
+    columns = {column: i for i, column in enumerate(ACTIVITY_COLUMNS)}
+    emissions = np.zeros((len(ACTIVITY_COLUMNS), len(scenarios)))
+    offsets = np.zeros_like(emissions)
+    for j, scenario in enumerate(scenarios):
+        factors = {**base, **{k: v for k, v in (scenario.get("factors") or {}).items() if v is not None}}
+        adjustments = scenario.get("adjustments") or {}
+        for name, (column, factor, is_offset) in ACTIVITIES.items():
+            coefficient = factors[factor] * (1 + adjustments.get(name, 0) / 100)
+            if name == "trees":
+                coefficient /= 12  # annual sequestration, counted per month as in calculate_emissions
+            (offsets if is_offset else emissions)[columns[column], j] = coefficient
+    return emissions, offsets
+
+
+def _activity_matrix(cube, start: int, end: int, filters: dict) -> np.ndarray:
+    """(months x activities) activity sums for start..end, differenced out of the cube's prefix sums."""
+    width = len(ACTIVITY_COLUMNS) + 1
+    matrix = np.zeros((end - start + 1, width))
+    for _, series in cube.select(**filters):
+        months = np.asarray(series.months)
+        monthly = np.diff(np.frombuffer(series.prefix, dtype=np.float64).reshape(-1, width), axis=0)
+        in_range = (months >= start) & (months <= end)
+        # month indexes are unique within a series, so plain fancy-index addition is safe
+        matrix[months[in_range] - start] += monthly[in_range]
+    return matrix[:, :-1]
+
+
+def run_scenarios(
+    db: Session,
+    scenarios: List[dict],
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    panchayat_id: Optional[str] = None,
+    firm_type: Optional[str] = None,
+    user_id: Optional[str] = None,
+) -> dict:
+    """
+    Evaluate `scenarios` (each with a name, optional factor overrides and
+    optional percentage adjustments per activity) over the filtered history,
+    next to the current factors as a baseline.
+    """
+    unknown = {name for scenario in scenarios for name in (scenario.get("adjustments") or {})} - set(ACTIVITIES)
+    if unknown:
+        raise ValueError(f"Unknown activities in adjustments: {', '.join(sorted(unknown))}; "
+                         f"expected {', '.join(ACTIVITIES)}")
+
+    by_user = user_id is not None
+    cube = get_cube(db, by_user=by_user, panchayat_id=panchayat_id if by_user else None, user_id=user_id)
+    start_index, end_index = resolve_range(cube, start, end)
+
+    filters = {"panchayat_id": panchayat_id, "firm_type": firm_type}
+    if by_user:
+        filters["user_id"] = user_id
+    activity = _activity_matrix(cube, start_index, end_index, filters)
+
+    emission_factors = get_emission_factors(db)
+    base = {factor: getattr(emission_factors, factor) for _, factor, _ in ACTIVITIES.values()}
+    everything = [{"name": BASELINE_NAME}] + list(scenarios)
+    emission_coefficients, offset_coefficients = _coefficients(base, everything)
+
+    monthly_emissions = activity @ emission_coefficients  # months x scenarios
+    monthly_offsets = activity @ offset_coefficients
+    # Per-activity totals for the breakdowns: only one of the two coefficients is non-zero per activity.
+    breakdowns = activity.sum(axis=0)[:, None] * (emission_coefficients + offset_coefficients)
+    total_emissions = monthly_emissions.sum(axis=0)
+    total_offsets = monthly_offsets.sum(axis=0)
+    net = total_emissions - total_offsets
+
+    months = [format_month(index) for index in range(start_index, end_index + 1)]
+    columns = {column: i for i, column in enumerate(ACTIVITY_COLUMNS)}
+    baseline_net = net[0]
+    results = []
+    for j, scenario in enumerate(everything):
+        results.append({
+            "name": scenario["name"],
+            "total_emissions": float(total_emissions[j]),
+            "total_offsets": float(total_offsets[j]),
+            "net_footprint": float(net[j]),
+            "is_neutral": bool(net[j] <= 0),
+            "change_vs_baseline_pct": float((net[j] - baseline_net) / abs(baseline_net) * 100) if baseline_net else None,
+            "breakdown": {name: float(breakdowns[columns[column], j]) for name, (column, _, _) in ACTIVITIES.items()},
+            "trends": [
+                {"month": month, "emissions": float(monthly_emissions[i, j]), "offsets": float(monthly_offsets[i, j]),
+                 "net": float(monthly_emissions[i, j] - monthly_offsets[i, j])}
+                for i, month in enumerate(months)
+            ],
+        })
+
+    return {"start": format_month(start_index), "end": format_month(end_index), "scenarios": results}
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, Field
+from typing import Optional, List, Dict, Any
 from datetime import datetime
 
 # Base schemas
@@ -176,6 +176,124 @@ class CarbonMetricsResponse(BaseSchema):
     net_footprint: float
     is_neutral: bool
 
+class ComparativeEntry(BaseSchema):
+    key: Optional[str] = None  # panchayat id or firm type; None for unassigned data
+    name: str
+    state: Optional[str] = None
+    district: Optional[str] = None
+    population: Optional[int] = None
+    record_count: int
+    total_emissions: float
+    total_offsets: float
+    net_footprint: float
+    per_capita_net: Optional[float] = None
+    previous_net_footprint: Optional[float] = None
+    yoy_change_pct: Optional[float] = None
+    rank: int
+    per_capita_rank: Optional[int] = None
+
+class ComparativeResponse(BaseSchema):
+    year: int
+    previous_year: int
+    dimension: str
+    entries: List[ComparativeEntry]
+
+class RollupRow(BaseSchema):
+    period: str  # e.g. 2025-01, 2025-Q1, 2025, FY2024-25
+    period_start: str  # YYYY-MM, clipped to the requested range
+    period_end: str
+    group: Optional[str] = None  # panchayat id, firm type or user id; None when ungrouped or unassigned
+    name: str
+    record_count: int
+    total_emissions: float
+    total_offsets: float
+    net_footprint: float
+    breakdown: Dict[str, float]
+
+class RollupResponse(BaseSchema):
+    start: str
+    end: str
+    group_by: str
+    granularity: str
+    rows: List[RollupRow]
+
+class ScenarioFactors(BaseSchema):
+    electricity: Optional[float] = None
+    diesel: Optional[float] = None
+    petrol: Optional[float] = None
+    waste: Optional[float] = None
+    water: Optional[float] = None
+    tree_per_year: Optional[float] = None
+    solar_per_unit: Optional[float] = None
+
+class Scenario(BaseSchema):
+    name: str
+    factors: Optional[ScenarioFactors] = None  # overrides of the current emission factors
+    adjustments: Dict[str, float] = {}  # activity -> % change, e.g. {"solar": 20, "diesel": -10}
+
+class ScenarioRequest(BaseSchema):
+    scenarios: List[Scenario] = Field(..., min_length=1, max_length=200)
+    start: Optional[str] = None  # YYYY-MM
+    end: Optional[str] = None
+    panchayat_id: Optional[str] = None
+    firm_type: Optional[str] = None
+    user_id: Optional[str] = None
+
+class ScenarioResult(BaseSchema):
+    name: str
+    total_emissions: float
+    total_offsets: float
+    net_footprint: float
+    is_neutral: bool
+    change_vs_baseline_pct: Optional[float] = None
+    breakdown: Dict[str, float]
+    trends: List[MonthlyTrend]
+
+class ScenarioResponse(BaseSchema):
+    start: str
+    end: str
+    scenarios: List[ScenarioResult]  # the first entry is the current factors, unadjusted
+
+class AnomalyFlag(BaseSchema):
+    id: str
+    monthly_data_id: str
+    user_id: str
+    username: Optional[str] = None
+    panchayat_id: Optional[str] = None
+    month: Optional[str] = None
+    year: Optional[int] = None
+    field: str
+    value: float
+    expected: float
+    z_score: float
+    status: str
+    resolved_by: Optional[str] = None
+    resolved_at: Optional[datetime] = None
+    created_at: datetime
+
+class AnomalyResolve(BaseSchema):
+    status: str = Field(..., pattern="^(valid|invalid)$")
+
+class JobCreate(BaseSchema):
+    kind: str  # predictions, export, rebuild_aggregates
+    params: Dict[str, Any] = {}
+
+class Job(BaseSchema):
+    id: str
+    kind: str
+    status: str  # queued, running, succeeded, failed
+    params: Dict[str, Any] = {}
+    progress: float
+    message: Optional[str] = None
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    attempts: int
+    max_attempts: int
+    created_by: str
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
 # Authentication schemas
 class Token(BaseSchema):
     access_token: str
@@ -200,6 +318,20 @@ class PaginatedResponse(BaseSchema):
     size: int
     pages: int
 
+class MonthlyDataPage(PaginatedResponse):
+    items: List[MonthlyData]
+
+class ColumnarMonthlyDataPage(BaseSchema):
+    """`GET /data/?format=columnar`: one array per MonthlyData field (see columnar.py)."""
+    format: str = "columnar"
+    count: int
+    columns: Dict[str, List[Any]]
+    encoding: Dict[str, Dict[str, Any]]
+    total: int
+    page: int
+    size: int
+    pages: int
+
 # Prediction schemas
 class ForecastItem(BaseSchema):
     month: str
@@ -0,0 +1,73 @@
+"""EmailOutbox against an in-process aiosmtpd server (pip install aiosmtpd)."""
+import socket
+import threading
+
+import pytest
+
+aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+
+import email_service
+
+
+class Collector:
+    def __init__(self):
+        self.recipients = []
+        self.lock = threading.Lock()
+
+    async def handle_DATA(self, server, session, envelope):
+        with self.lock:
+            self.recipients.extend(envelope.rcpt_tos)
+        return "250 OK"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    handler = Collector()
+    controller = aiosmtpd_controller.Controller(handler, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    monkeypatch.setattr(email_service, "SMTP_SERVER", controller.hostname)
+    monkeypatch.setattr(email_service, "SMTP_PORT", controller.port)
+    monkeypatch.setattr(email_service, "SMTP_STARTTLS", False)
+    monkeypatch.setattr(email_service, "SMTP_LOGIN", False)
+    monkeypatch.setattr(email_service, "FROM_EMAIL", "noreply@example.com")
+    monkeypatch.setattr(email_service, "EMAIL_RETRY_DELAY", 0.01)
+    yield handler
+    controller.stop()
+
+
+def test_delivers_every_queued_message(smtp_server):
+    outbox = email_service.EmailOutbox(senders=2)
+    addresses = [f"user{i}@example.com" for i in range(30)]
+    for address in addresses:
+        assert outbox.enqueue(email_service._otp_message(address, "123456"))
+    outbox.shutdown()
+    assert sorted(smtp_server.recipients) == sorted(addresses)
+
+
+def test_a_message_that_cannot_be_sent_does_not_stop_the_sender(smtp_server, monkeypatch):
+    outbox = email_service.EmailOutbox(senders=1)
+    # Without a From address smtplib cannot build the envelope (IndexError, not an SMTPException)
+    monkeypatch.setattr(email_service, "FROM_EMAIL", "")
+    assert outbox.enqueue(email_service._otp_message("broken@example.com", "123456"))
+    monkeypatch.setattr(email_service, "FROM_EMAIL", "noreply@example.com")
+    addresses = [f"user{i}@example.com" for i in range(10)]
+    for address in addresses:
+        assert outbox.enqueue(email_service._otp_message(address, "123456"))
+    outbox.shutdown()
+    assert sorted(smtp_server.recipients) == sorted(addresses)
+    assert not outbox._pending
+
+
+def test_smtp_requires_a_from_address(monkeypatch):
+    monkeypatch.setattr(email_service, "SMTP_LOGIN", False)
+    monkeypatch.setattr(email_service, "SMTP_SERVER", "localhost")
+    monkeypatch.setattr(email_service, "FROM_EMAIL", "")
+    assert not email_service.smtp_configured()
+    monkeypatch.setattr(email_service, "FROM_EMAIL", "noreply@example.com")
+    assert email_service.smtp_configured()
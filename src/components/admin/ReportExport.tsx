@@ -95,116 +95,36 @@ export function ReportExport() {
     toast({ title: 'CSV Downloaded', description: `${filteredData.length} records exported.` });
   };
 
-  // ─── PDF Export (HTML print) ─────────────────────────────────────────────────
-  const generatePDF = () => {
-    if (filteredData.length === 0) {
-      toast({ title: 'No Data', description: `No entries found for ${selectedYear}.`, variant: 'destructive' });
-      return;
-    }
-
+  // ─── PDF Export (server-rendered HTML, print) ─────────────────────────────────
+  const generatePDF = async () => {
     setIsExporting(true);
-
-    const sectorEmissions = {
-      Electricity: filteredData.reduce((s, d) => s + d.electricityKwh * EF.electricity, 0),
-      Diesel: filteredData.reduce((s, d) => s + d.dieselLiters * EF.diesel, 0),
-      Petrol: filteredData.reduce((s, d) => s + d.petrolLiters * EF.petrol, 0),
-      Waste: filteredData.reduce((s, d) => s + d.wasteKg * EF.waste, 0),
-      Water: filteredData.reduce((s, d) => s + d.waterLiters * EF.water, 0),
-    };
-
-    const monthRows = filteredData.map(d => {
-      const em = calcEmissions(d);
-      const of = calcOffsets(d);
-      return `
-        <tr>
-          <td>${d.month} ${d.year}</td>
-          <td>${d.username || '–'}</td>
-          <td>${d.firmType ? `${d.firmType}${d.firmName ? ` – ${d.firmName}` : ''}` : '–'}</td>
-          <td>${d.electricityKwh}</td>
-          <td>${d.dieselLiters}</td>
-          <td>${d.petrolLiters}</td>
-          <td>${d.wasteKg}</td>
-          <td>${d.waterLiters.toLocaleString()}</td>
-          <td>${d.solarUnits}</td>
-          <td>${d.treesPlanted}</td>
-          ${includeEmissions ? `<td>${em.toFixed(2)}</td>` : ''}
-          ${includeOffsets ? `<td>${of.toFixed(2)}</td>` : ''}
-        </tr>`;
-    }).join('');
-
-    const sectorRows = Object.entries(sectorEmissions).map(([name, val]) =>
-      `<tr><td>${name}</td><td>${val.toFixed(2)} kg CO₂</td><td>${totalEmissions > 0 ? ((val / totalEmissions) * 100).toFixed(1) : '0.0'}%</td></tr>`
-    ).join('');
-
-    const html = `<!DOCTYPE html>
-<html>
-<head>
-<meta charset="utf-8"/>
-<title>Carbon Report – Anjarakandi ${selectedYear}</title>
-<style>
-  * { box-sizing: border-box; margin: 0; padding: 0; }
-  body { font-family: 'Segoe UI', Arial, sans-serif; color: #1a1a1a; padding: 24px; font-size: 11px; }
-  h1 { font-size: 22px; color: #166534; margin-bottom: 4px; }
-  .subtitle { color: #555; margin-bottom: 20px; font-size: 12px; }
-  .summary-grid { display: grid; grid-template-columns: repeat(3, 1fr); gap: 12px; margin-bottom: 24px; }
-  .card { background: #f0fdf4; border: 1px solid #bbf7d0; border-radius: 8px; padding: 12px; }
-  .card h3 { font-size: 10px; text-transform: uppercase; color: #555; margin-bottom: 4px; }
-  .card p { font-size: 18px; font-weight: 700; color: #166534; }
-  .card small { font-size: 10px; color: #888; }
-  h2 { font-size: 14px; color: #166534; border-bottom: 2px solid #bbf7d0; padding-bottom: 4px; margin: 20px 0 10px; }
-  table { width: 100%; border-collapse: collapse; margin-bottom: 16px; }
-  th { background: #166534; color: white; padding: 6px 8px; text-align: left; font-size: 10px; }
-  td { padding: 5px 8px; border-bottom: 1px solid #e5e7eb; }
-  tr:nth-child(even) td { background: #f9fafb; }
-  .status { font-weight: 700; color: ${netFootprint <= 0 ? '#166534' : '#dc2626'}; }
-  .footer { margin-top: 32px; text-align: center; color: #aaa; font-size: 10px; border-top: 1px solid #e5e7eb; padding-top: 12px; }
-  @media print { @page { margin: 10mm; } }
-</style>
-</head>
-<body>
-<h1>🌿 Carbon Footprint Report</h1>
-<p class="subtitle">Gram Panchayat Anjarakandi &nbsp;|&nbsp; Year: ${selectedYear} &nbsp;|&nbsp; Generated: ${new Date().toLocaleDateString('en-IN', { day: 'numeric', month: 'long', year: 'numeric' })}</p>
-
-<div class="summary-grid">
-  <div class="card"><h3>Total Emissions</h3><p>${totalEmissions.toFixed(0)}</p><small>kg CO₂e</small></div>
-  <div class="card"><h3>Total Offsets</h3><p>${totalOffsets.toFixed(0)}</p><small>kg CO₂e</small></div>
-  <div class="card"><h3>Net Footprint</h3><p class="status">${netFootprint.toFixed(0)}</p><small>${netFootprint <= 0 ? '✓ Carbon Neutral' : 'Still Emitting'}</small></div>
-</div>
-
-${includeMonthlyBreakdown || includeEmissions ? `
-<h2>Monthly Data Breakdown</h2>
-<table>
-  <thead><tr>
-    <th>Month</th><th>User</th><th>Organization</th>
-    <th>Electricity</th><th>Diesel</th><th>Petrol</th><th>Waste</th><th>Water</th><th>Solar</th><th>Trees</th>
-    ${includeEmissions ? '<th>Emissions (kg)</th>' : ''}
-    ${includeOffsets ? '<th>Offsets (kg)</th>' : ''}
-  </tr></thead>
-  <tbody>${monthRows}</tbody>
-</table>` : ''}
-
-${includeSectorAnalysis ? `
-<h2>Sector-wise Emissions</h2>
-<table>
-  <thead><tr><th>Sector</th><th>Emissions</th><th>Share</th></tr></thead>
-  <tbody>${sectorRows}</tbody>
-</table>` : ''}
-
-<div class="footer">Report generated by CarbonTrackHub &nbsp;|&nbsp; Powered by GHG Protocol Standards</div>
-</body>
-</html>`;
-
-    // Open in a new tab and trigger print dialog (saves as PDF)
-    const win = window.open('', '_blank');
-    if (win) {
-      win.document.write(html);
-      win.document.close();
-      win.focus();
-      setTimeout(() => { win.print(); }, 500);
+    try {
+      // The backend renders the report from pre-aggregated data and caches it until the data changes
+      const report = await api.getAnnualReport({
+        year: Number(selectedYear),
+        sectors: includeSectorAnalysis,
+        monthly: includeMonthlyBreakdown,
+      });
+      const html = await report.text();
+
+      // Open in a new tab and trigger print dialog (saves as PDF)
+      const win = window.open('', '_blank');
+      if (win) {
+        win.document.write(html);
+        win.document.close();
+        win.focus();
+        setTimeout(() => { win.print(); }, 500);
+      }
+      toast({ title: 'PDF Ready', description: 'Print dialog opened. Choose "Save as PDF" to download.' });
+    } catch (error) {
+      toast({
+        title: 'Export Failed',
+        description: error instanceof Error ? error.message : 'Could not generate the report.',
+        variant: 'destructive',
+      });
+    } finally {
+      setIsExporting(false);
     }
-
-    setIsExporting(false);
-    toast({ title: 'PDF Ready', description: 'Print dialog opened. Choose "Save as PDF" to download.' });
   };
 
   function triggerDownload(content: string, filename: string, type: string) {
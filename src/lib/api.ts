@@ -54,6 +54,23 @@ export interface MonthlyTrend {
   net: number;
 }
 
+// Incremental change pushed by /analytics/stream for one month
+export interface LiveChange {
+  year: number;
+  month: string;
+  record_count: number;
+  total_emissions: number;
+  total_offsets: number;
+  net_footprint: number;
+  sectors: Record<string, number>;
+}
+
+export interface LiveHandlers {
+  onDelta: (changes: LiveChange[]) => void;
+  // Totals can no longer be patched (emission factors changed, or the stream was interrupted)
+  onRefresh: () => void;
+}
+
 export interface ForecastItem {
   month: string;
   year: number;
@@ -311,6 +328,57 @@ class ApiClient {
     }));
   }
 
+  // Report endpoints
+  async getAnnualReport(params: {
+    year: number;
+    panchayatId?: string;
+    format?: 'html' | 'pdf';
+    sectors?: boolean;
+    monthly?: boolean;
+  }): Promise<Blob> {
+    const searchParams = new URLSearchParams({
+      year: params.year.toString(),
+      format: params.format ?? 'html',
+      sectors: String(params.sectors ?? true),
+      monthly: String(params.monthly ?? true),
+    });
+    if (params.panchayatId) {
+      searchParams.append('panchayat_id', params.panchayatId);
+    }
+
+    const response = await fetch(`${this.baseURL}/reports/annual?${searchParams.toString()}`, {
+      headers: this.token ? { Authorization: `Bearer ${this.token}` } : {},
+    });
+    if (!response.ok) {
+      const errorData = await response.json().catch(() => ({ detail: 'Network error' }));
+      throw new Error(errorData.detail || `HTTP ${response.status}: ${response.statusText}`);
+    }
+    return response.blob();
+  }
+
+  // Live dashboard updates (server-sent events); returns a function that closes the stream
+  subscribeToLiveUpdates(handlers: LiveHandlers, params: { panchayatId?: string } = {}): () => void {
+    const searchParams = new URLSearchParams({ token: this.token ?? '' });
+    if (params.panchayatId) {
+      searchParams.append('panchayat_id', params.panchayatId);
+    }
+
+    const source = new EventSource(`${this.baseURL}/analytics/stream?${searchParams.toString()}`);
+    let connected = false;
+    source.addEventListener('ready', () => {
+      // Anything sent while we were disconnected is lost, so refetch after a reconnect
+      if (connected) {
+        handlers.onRefresh();
+      }
+      connected = true;
+    });
+    source.addEventListener('delta', (event) => {
+      handlers.onDelta(JSON.parse((event as MessageEvent).data).changes);
+    });
+    source.addEventListener('refresh', () => handlers.onRefresh());
+    return () => source.close();
+  }
+
   // Health check
   async healthCheck(): Promise<{ status: string; timestamp: string }> {
     return this.request<{ status: string; timestamp: string }>('/health');
@@ -1,14 +1,78 @@
-import { useState, useEffect, useMemo } from 'react';
+import { useState, useEffect, useMemo, useCallback } from 'react';
 import { Cloud, TreePine, Leaf, TrendingDown } from 'lucide-react';
 import { MainLayout } from '@/components/layout/MainLayout';
 import { MetricCard } from '@/components/dashboard/MetricCard';
 import { CarbonStatusBadge } from '@/components/dashboard/CarbonStatusBadge';
 import { EmissionChart } from '@/components/dashboard/EmissionChart';
 import { SectorPieChart } from '@/components/dashboard/SectorPieChart';
-import { api, CarbonMetricsResponse, SectorEmission, MonthlyTrend } from '@/lib/api';
+import { api, CarbonMetricsResponse, SectorEmission, MonthlyTrend, LiveChange } from '@/lib/api';
 import { useAuth } from '@/contexts/AuthContext';
 import { useToast } from '@/hooks/use-toast';
 
+// Same colours the backend assigns in get_sector_emissions
+const SECTOR_COLORS: Record<string, string> = {
+  electricity: '#3b82f6',
+  transport: '#ef4444',
+  waste: '#10b981',
+  water: '#f59e0b',
+};
+
+function applyToMetrics(metrics: CarbonMetricsResponse, changes: LiveChange[]): CarbonMetricsResponse {
+  const updated = { ...metrics };
+  for (const change of changes) {
+    updated.totalEmissions += change.total_emissions;
+    updated.totalOffsets += change.total_offsets;
+    updated.netFootprint += change.net_footprint;
+  }
+  updated.isNeutral = updated.netFootprint <= 0;
+  return updated;
+}
+
+function applyToSectors(sectors: SectorEmission[], changes: LiveChange[]): SectorEmission[] {
+  const totals: Record<string, number> = {};
+  for (const sector of sectors) {
+    totals[sector.sector.toLowerCase()] = sector.emission;
+  }
+  for (const change of changes) {
+    for (const [name, emission] of Object.entries(change.sectors)) {
+      totals[name] = (totals[name] ?? 0) + emission;
+    }
+  }
+  const total = Object.values(totals).reduce((sum, emission) => sum + Math.max(emission, 0), 0);
+  return Object.entries(totals)
+    .filter(([, emission]) => emission > 0)
+    .map(([name, emission]) => ({
+      sector: name.charAt(0).toUpperCase() + name.slice(1),
+      emission,
+      percentage: (emission / total) * 100,
+      color: SECTOR_COLORS[name],
+    }))
+    .sort((a, b) => b.emission - a.emission);
+}
+
+const MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'];
+
+function monthOrder(label: string): number {
+  const [month, year] = label.split(' ');
+  return Number(year) * 12 + MONTHS.indexOf(month);
+}
+
+function applyToTrends(trends: MonthlyTrend[], changes: LiveChange[]): MonthlyTrend[] {
+  const updated = trends.map((month) => ({ ...month }));
+  for (const change of changes) {
+    const label = `${change.month} ${change.year}`;
+    let month = updated.find((m) => m.month === label);
+    if (!month) {
+      month = { month: label, emissions: 0, offsets: 0, net: 0 };
+      updated.push(month);
+    }
+    month.emissions += change.total_emissions;
+    month.offsets += change.total_offsets;
+    month.net += change.net_footprint;
+  }
+  return updated.sort((a, b) => monthOrder(a.month) - monthOrder(b.month));
+}
+
 export default function Dashboard() {
   const { user } = useAuth();
   const { toast } = useToast();
@@ -21,42 +85,58 @@ export default function Dashboard() {
   const [error, setError] = useState<string | null>(null);
 
   // Fetch data from backend
-  useEffect(() => {
-    const fetchDashboardData = async () => {
-      if (!user) return;
+  const fetchDashboardData = useCallback(async (showLoading = true) => {
+    if (!user) return;
 
-      try {
+    try {
+      if (showLoading) {
         setIsLoading(true);
-        setError(null);
-
-        // Fetch all dashboard data in parallel
-        const [metricsData, sectorsData, trendsData] = await Promise.all([
-          api.getAnalyticsMetrics(),
-          api.getAnalyticsSectors(),
-          api.getAnalyticsTrends()
-        ]);
-
-        setMetrics(metricsData);
-        setSectorData(sectorsData);
-        setTrendData(trendsData);
-
-      } catch (error) {
-        console.error('Failed to fetch dashboard data:', error);
-        setError(error instanceof Error ? error.message : 'Failed to load dashboard data');
-
-        toast({
-          title: "Error Loading Dashboard",
-          description: "Could not load dashboard data. Please try again.",
-          variant: "destructive",
-        });
-      } finally {
-        setIsLoading(false);
       }
-    };
+      setError(null);
 
-    fetchDashboardData();
+      // Fetch all dashboard data in parallel
+      const [metricsData, sectorsData, trendsData] = await Promise.all([
+        api.getAnalyticsMetrics(),
+        api.getAnalyticsSectors(),
+        api.getAnalyticsTrends()
+      ]);
+
+      setMetrics(metricsData);
+      setSectorData(sectorsData);
+      setTrendData(trendsData);
+
+    } catch (error) {
+      console.error('Failed to fetch dashboard data:', error);
+      setError(error instanceof Error ? error.message : 'Failed to load dashboard data');
+
+      toast({
+        title: "Error Loading Dashboard",
+        description: "Could not load dashboard data. Please try again.",
+        variant: "destructive",
+      });
+    } finally {
+      setIsLoading(false);
+    }
   }, [user, toast]);
 
+  useEffect(() => {
+    fetchDashboardData();
+  }, [fetchDashboardData]);
+
+  // Apply pushed changes to the loaded totals instead of polling
+  useEffect(() => {
+    if (!user) return;
+
+    return api.subscribeToLiveUpdates({
+      onDelta: (changes) => {
+        setMetrics((current) => current && applyToMetrics(current, changes));
+        setSectorData((current) => applyToSectors(current, changes));
+        setTrendData((current) => applyToTrends(current, changes));
+      },
+      onRefresh: () => fetchDashboardData(false),
+    });
+  }, [user, fetchDashboardData]);
+
   // Show loading state
   if (isLoading) {
     return (